@@ -0,0 +1,78 @@
+'''Measures get_matching_records on a modem ALDB of 1000 records, using the
+indexes and using a scan of every record.
+
+Run from the root of the repository:
+    python benchmarks/aldb_lookup.py
+'''
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from insteon_mngr.modem import Modem_ALDB
+
+RECORD_COUNT = 1000
+REPEATS = 200
+
+SEARCHES = {
+    # ModemGroup.set_state
+    'group': {'controller': True, 'group': 5, 'in_use': True},
+    # ALDBRecord.get_reciprocal_records
+    'reciprocal': {'controller': False, 'group': 7, 'in_use': True,
+                   'dev_addr_hi': 0x10, 'dev_addr_mid': 0x00,
+                   'dev_addr_low': 0x07},
+    # Searching by linked device alone
+    'address': {'dev_addr_hi': 0x10, 'dev_addr_mid': 0x00,
+                'dev_addr_low': 0x07},
+}
+
+
+class Device(object):
+    core = None
+
+    def journal(self, entry):
+        pass
+
+    def mark_dirty(self):
+        pass
+
+
+def build_aldb():
+    '''Returns a modem ALDB linked to RECORD_COUNT // 4 devices, each with
+    a controller and responder record on two groups'''
+    ret = Modem_ALDB(Device())
+    records = {}
+    for number in range(RECORD_COUNT):
+        device = number // 4
+        flags = 0xE2 if number % 2 == 0 else 0xA2
+        group = (number // 2) % 2 + device % 50
+        records[str(number + 1).zfill(4)] = bytes(
+            [flags, group, 0x10, device >> 8, device & 0xFF, 0x00, 0x00,
+             0x00])
+    ret.load_aldb_records(records)
+    return ret
+
+
+def main():
+    aldb = build_aldb()
+    scan = build_aldb()
+    # Disables the indexes
+    scan._index_candidates = lambda attributes: None
+    print('get_matching_records on', RECORD_COUNT, 'records')
+    for name, attributes in SEARCHES.items():
+        assert ([record.key
+                 for record in aldb.get_matching_records(attributes)] ==
+                [record.key
+                 for record in scan.get_matching_records(attributes)])
+        indexed = timeit.timeit(
+            lambda: aldb.get_matching_records(attributes), number=REPEATS)
+        scanned = timeit.timeit(
+            lambda: scan.get_matching_records(attributes), number=REPEATS)
+        print('  %-10s indexed %8.1f us   scan %8.1f us   %d matches' % (
+            name, indexed / REPEATS * 1e6, scanned / REPEATS * 1e6,
+            len(aldb.get_matching_records(attributes))))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+'''Measures how long it takes the core loop to fire a trigger after a message
+arrives from a modem, and how much CPU the core uses while idle.
+
+Run from the root of the repository:
+    python benchmarks/core_latency.py
+'''
+import atexit
+import contextlib
+import io
+import os
+import queue
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from insteon_mngr import Insteon_Core
+from insteon_mngr.modem import Modem
+from insteon_mngr.trigger import PLMTrigger
+
+ITERATIONS = 200
+IDLE_SECONDS = 3
+
+
+class LoopbackModem(Modem):
+    '''A modem without hardware, bytes are fed in directly by the benchmark'''
+
+    def __init__(self, core):
+        super().__init__(core, device_id='AABBCC')
+        self.attribute('type', 'loopback')
+        self._read_queue = queue.Queue()
+
+    def feed(self, data):
+        self._read_queue.put(data)
+        self.wake()
+
+    def _read_from_port(self):
+        while not self._read_queue.empty():
+            self._read_buffer.extend(self._read_queue.get())
+
+    def _write_to_port(self, msg):
+        pass
+
+
+def measure_latency(modem):
+    fired = threading.Event()
+    results = []
+    for _ in range(ITERATIONS):
+        fired.clear()
+        trigger = PLMTrigger(plm=modem, attributes={'plm_cmd': 0x54})
+        trigger.trigger_function = lambda: (
+            results.append(time.perf_counter() - start), fired.set())
+        trigger.name = 'benchmark'
+        trigger.queue()
+        start = time.perf_counter()
+        # A PLM button event
+        modem.feed(bytearray.fromhex('025402'))
+        fired.wait(5)
+        time.sleep(.01)
+    return results
+
+
+def measure_idle_cpu():
+    start_cpu = time.process_time()
+    time.sleep(IDLE_SECONDS)
+    return (time.process_time() - start_cpu) / IDLE_SECONDS
+
+
+def main():
+    config_path = tempfile.mkdtemp()
+    # Registered first so that it runs after the core saves on exit
+    atexit.register(shutil.rmtree, config_path)
+    with contextlib.redirect_stdout(io.StringIO()):
+        core = Insteon_Core(config_path=config_path, web_server=False)
+        modem = LoopbackModem(core)
+        core._modems.append(modem)
+        # Have the core loop start the thread for the new modem now rather
+        # than at its next save
+        core.wake()
+        while modem not in core._modem_events:
+            time.sleep(.01)
+        latencies = measure_latency(modem)
+        idle_cpu = measure_idle_cpu()
+        core.close()
+    latencies = sorted(latency * 1000 for latency in latencies)
+    print('byte arrival -> trigger fired, over', len(latencies), 'messages')
+    print('  min    %7.3f ms' % latencies[0])
+    print('  median %7.3f ms' % statistics.median(latencies))
+    print('  p99    %7.3f ms' % latencies[int(len(latencies) * .99) - 1])
+    print('  max    %7.3f ms' % latencies[-1])
+    print('idle cpu %7.3f %% of one core' % (idle_cpu * 100))
+
+
+if __name__ == '__main__':
+    main()
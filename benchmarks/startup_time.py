@@ -0,0 +1,88 @@
+'''Measures how long it takes to import insteon_mngr and to construct a core
+that loads a saved network, each in a fresh interpreter.
+
+Run from the root of the repository:
+    python benchmarks/startup_time.py
+'''
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from insteon_mngr.storage import JSONStorage
+
+REPEATS = 10
+DEVICE_COUNT = 200
+RECORDS_PER_DEVICE = 40
+
+IMPORT_CODE = '''
+import sys, time
+sys.path.insert(0, %r)
+start = time.perf_counter()
+import insteon_mngr
+print(time.perf_counter() - start)
+'''
+
+CORE_CODE = '''
+import contextlib, io, os, sys, time
+sys.path.insert(0, %r)
+start = time.perf_counter()
+with contextlib.redirect_stdout(io.StringIO()):
+    from insteon_mngr import Insteon_Core
+    core = Insteon_Core(config_path=%r, web_server=False)
+elapsed = time.perf_counter() - start
+queued = sum(len(device.out_queue) for modem in core.get_all_modems()
+             for device in modem.get_all_devices())
+print(elapsed, queued)
+os._exit(0)
+'''
+
+
+def saved_network():
+    '''Returns the state of a PLM with DEVICE_COUNT fully cached devices'''
+    devices = {}
+    for number in range(DEVICE_COUNT):
+        aldb = {}
+        for record in range(RECORDS_PER_DEVICE):
+            key = '{:04X}'.format(0x0FFF - record * 8)
+            aldb[key] = 'E201AABBCC{:02X}1C01'.format(record)
+        devices['{:06X}'.format(0x100000 + number)] = {
+            'engine_version': 2, 'dev_cat': 1, 'sub_cat': 32,
+            'firmware': 65, 'base_group_number': 1, 'aldb': aldb}
+    return {'modems': {'AABBCC': {'type': 'plm', 'port': '/dev/null',
+                                  'devices': devices}}}
+
+
+def run(code):
+    '''Returns the output of code, run in a new interpreter'''
+    output = subprocess.check_output([sys.executable, '-c', code])
+    return output.decode().split()
+
+
+def main():
+    config_path = tempfile.mkdtemp()
+    try:
+        JSONStorage(os.path.join(config_path, 'config.json')).save(
+            saved_network())
+        imports = [float(run(IMPORT_CODE % ROOT)[0])
+                   for _ in range(REPEATS)]
+        cores = [run(CORE_CODE % (ROOT, config_path))
+                 for _ in range(REPEATS)]
+    finally:
+        shutil.rmtree(config_path)
+    print('cold import of insteon_mngr, over', REPEATS, 'runs')
+    print('  median %7.1f ms' % (statistics.median(imports) * 1000))
+    print('core construction with', DEVICE_COUNT, 'devices of',
+          RECORDS_PER_DEVICE, 'records, including the import')
+    print('  median %7.1f ms' %
+          (statistics.median(float(core[0]) for core in cores) * 1000))
+    print('  messages queued at startup', cores[-1][1])
+
+
+if __name__ == '__main__':
+    main()
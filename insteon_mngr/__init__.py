@@ -22,5 +22,15 @@ def ID_STR_TO_BYTES(dev_id_str):
     return ret
 
 from insteon_mngr.core import Insteon_Core
+from insteon_mngr.storage import JSONStorage, SQLiteStorage
 
-__all__ = ['Insteon_Core']
+__all__ = ['Insteon_Core', 'AsyncInsteonCore', 'JSONStorage', 'SQLiteStorage']
+
+def __getattr__(name):
+    # asyncio is slow to import, so AsyncInsteonCore is only imported when
+    # it is first used
+    if name == 'AsyncInsteonCore':
+        from insteon_mngr.async_core import AsyncInsteonCore
+        return AsyncInsteonCore
+    raise AttributeError('module {!r} has no attribute {!r}'.format(__name__,
+                                                                     name))
@@ -1,13 +1,76 @@
 '''The base ALDB Objects'''
+import heapq
+from collections import namedtuple
+
 from insteon_mngr import BYTE_TO_HEX, BYTE_TO_ID
 
 
+# The size of each record in bytes
+RECORD_SIZE = 8
+
+# The attributes of parse_record() covered by each index, see
+# ALDB.get_matching_records()
+_LINK_INDEX = ('in_use', 'controller', 'group', 'address')
+_GROUP_INDEX = ('in_use', 'controller', 'group')
+_ADDRESS_INDEX = ('address',)
+_ADDRESS_BYTES = ('dev_addr_hi', 'dev_addr_mid', 'dev_addr_low')
+
+
+class ParsedRecord(namedtuple('ParsedRecord', (
+        'link_flags', 'in_use', 'controller', 'responder', 'highwater',
+        'group', 'dev_addr_hi', 'dev_addr_mid', 'dev_addr_low', 'data_1',
+        'data_2', 'data_3'))):
+    '''The fields of an ALDB record, returned by parse_record().  The
+    fields can be read as attributes or by name, parsed['group'].'''
+    __slots__ = ()
+
+    @classmethod
+    def from_raw(cls, raw):
+        flags = raw[0]
+        return cls(flags,
+                   bool(flags & 0b10000000),
+                   bool(flags & 0b01000000),
+                   not flags & 0b01000000,
+                   not flags & 0b00000010,
+                   raw[1], raw[2], raw[3], raw[4], raw[5], raw[6], raw[7])
+
+    def __getitem__(self, name):
+        if isinstance(name, str):
+            try:
+                return getattr(self, name)
+            except AttributeError:
+                raise KeyError(name)
+        return super().__getitem__(name)
+
+
 class ALDB(object):
     '''The base ALDB class which is inherited by both the Device and PLM
-    ALDB classes'''
+    ALDB classes.
+
+    The records are stored in a single bytearray, RECORD_SIZE bytes per
+    slot, indexed by the integer position of each record.  ALDBRecord
+    objects are only views of a slot and are created when asked for.
+    Records are identified outside of the database by a key string, see
+    _key_to_position().
+
+    The positions are also indexed by their link, their group and their
+    linked address, so that get_matching_records() only looks at records
+    that may match.  The indexes are updated whenever a slot is written.'''
     def __init__(self, device):
         self._device = device
-        self.aldb = {}
+        self._buffer = bytearray()
+        # Position to slot number, in the order the records were added
+        self._slots = {}
+        self._link_sequences = {}
+        # Position to ParsedRecord, dropped whenever the slot is written
+        self._parsed = {}
+        self._clear_free_slots()
+        # Index key to a dict, used as an ordered set, of positions
+        self._indexes = {_LINK_INDEX: {}, _GROUP_INDEX: {},
+                         _ADDRESS_INDEX: {}}
+
+    def __len__(self):
+        return len(self._slots)
 
     @property
     def core(self):
@@ -17,40 +80,148 @@ class ALDB(object):
     def device(self):
         return self._device
 
+    @property
+    def aldb(self):
+        '''A dict of every record keyed by its key string'''
+        ret = {}
+        for position in self._slots:
+            ret[self._position_to_key(position)] = ALDBRecord(self, position)
+        return ret
+
     def get_record(self, position):
-        if position not in self.aldb:
-            self.aldb[position] = ALDBRecord(self)
-        return self.aldb[position]
+        '''Returns the record at position, either a key string or an
+        integer.  An empty record is created if there is none, it is not
+        saved until it is written.  Use peek_record() to only read.'''
+        position = self._to_position(position)
+        if position not in self._slots:
+            self._add_slot(position, bytes(RECORD_SIZE))
+        return ALDBRecord(self, position)
+
+    def peek_record(self, position):
+        '''Returns the record at position, or None if there is none,
+        without changing anything'''
+        ret = None
+        position = self._to_position(position)
+        if position in self._slots:
+            ret = ALDBRecord(self, position)
+        return ret
+
+    def has_record(self, position):
+        return self._to_position(position) in self._slots
 
     def get_all_records(self):
         ret = {}
-        for key, record in self.aldb.items():
-            ret[key] = record.raw
+        for position in self._slots:
+            ret[self._position_to_key(position)] = self.get_raw(position)
         return ret
 
     def get_all_records_str(self):
         ret = {}
-        for key, record in self.aldb.items():
-            ret[key] = BYTE_TO_HEX(record.raw)
+        for position in self._slots:
+            ret[self._position_to_key(position)] = BYTE_TO_HEX(
+                self.get_raw(position))
         return ret
 
     def load_aldb_records(self, records):
+        '''Loads saved records, each is either a hex string or a view of
+        the record bytes'''
         for key, record in records.items():
-            self.aldb[key] = ALDBRecord(self, bytearray.fromhex(record))
+            if isinstance(record, str):
+                record = bytes.fromhex(record)
+            position = self._key_to_position(key)
+            if position in self._slots:
+                self._write_slot(position, record)
+            else:
+                self._add_slot(position, record)
+        self._links_changed()
+        self._device.mark_dirty()
 
     def clear_all_records(self):
-        self.aldb = {}
+        self.detach()
+        self._buffer = bytearray()
+        self._slots = {}
+        self._link_sequences = {}
+        self._parsed = {}
+        self._clear_free_slots()
+        for index in self._indexes.values():
+            index.clear()
+        self._links_changed()
+        self._device.journal({'op': 'clear_aldb'})
+
+    def truncate(self, key):
+        '''Removes the records below key from the cache, used once a
+        highwater mark has been written at key since the device no longer
+        reads the records past it'''
+        position = self._to_position(key)
+        kept = {}
+        for slot_position in sorted(self._slots, reverse=True):
+            if slot_position >= position:
+                kept[slot_position] = self.get_raw(slot_position)
+        link_sequences = {}
+        for slot_position, sequence in self._link_sequences.items():
+            if slot_position in kept:
+                link_sequences[slot_position] = sequence
+        self.clear_all_records()
+        for slot_position, raw in kept.items():
+            self._add_slot(slot_position, raw)
+            self._journal_record(self._position_to_key(slot_position), raw)
+        self._link_sequences = link_sequences
+
+    def _journal_record(self, key, raw):
+        self._device.journal({'op': 'aldb',
+                              'key': key,
+                              'raw': BYTE_TO_HEX(raw)})
 
     def get_matching_records(self, attributes):
-        '''Returns an array of records that matches ALL attributes'''
+        '''Returns an array of records that matches ALL attributes, in the
+        order the records were added'''
         ret = []
-        for record in self.aldb.values():
-            parsed_record = record.parse_record()
+        candidates = self._index_candidates(attributes)
+        if candidates is None:
+            candidates = self._slots
+        elif len(candidates) > 1:
+            candidates = sorted(candidates, key=self._slots.get)
+        for position in candidates:
+            parsed_record = self.get_parsed(position)
             for attribute, value in attributes.items():
                 if parsed_record[attribute] != value:
                     break
             else:
-                ret.append(record)
+                ret.append(ALDBRecord(self, position))
+        return ret
+
+    def _index_candidates(self, attributes):
+        '''Returns the positions of the records that may match attributes
+        from the most selective index that covers them, or None if no index
+        does'''
+        terms = {}
+        if 'in_use' in attributes:
+            terms['in_use'] = (bool(attributes['in_use']),)
+        if 'controller' in attributes:
+            terms['controller'] = (bool(attributes['controller']),)
+        elif 'responder' in attributes:
+            terms['controller'] = (not attributes['responder'],)
+        if 'group' in attributes:
+            terms['group'] = (attributes['group'],)
+        if all(name in attributes for name in _ADDRESS_BYTES):
+            terms['address'] = (tuple(attributes[name]
+                                      for name in _ADDRESS_BYTES),)
+        ret = None
+        for fields in (_LINK_INDEX, _GROUP_INDEX, _ADDRESS_INDEX):
+            if 'group' in fields and 'group' not in terms:
+                continue
+            if 'address' in fields and 'address' not in terms:
+                continue
+            # The flags not searched for are either value
+            keys = [()]
+            for field in fields:
+                values = terms.get(field, (False, True))
+                keys = [key + (value,) for key in keys for value in values]
+            index = self._indexes[fields]
+            ret = []
+            for key in keys:
+                ret.extend(index.get(key, ()))
+            break
         return ret
 
     def print_records(self):
@@ -59,37 +230,267 @@ class ALDB(object):
             print(key, ":", BYTE_TO_HEX(records[key]))
 
     def get_first_empty_addr(self):
-        records = self.get_all_records()
+        '''Returns the key of the highest empty record, or of the address
+        below the lowest record if none are empty'''
+        ret = self._highest_empty()
+        if ret is None and self._lowest is not None:
+            # Records grow down from the highest address
+            ret = self._lowest - RECORD_SIZE
+        if ret is None:
+            print('aldb is empty, unable to find an address')
+        else:
+            ret = self._position_to_key(ret)
+        return ret
+
+    def get_empty_addrs(self, count):
+        '''Returns the keys of count addresses that new records can be
+        written to.  The empty records from the highest down, followed by
+        the addresses below the lowest record.'''
+        positions = sorted(self._empty, reverse=True)[:count]
+        position = self._lowest
+        while len(positions) < count and position is not None:
+            position -= RECORD_SIZE
+            positions.append(position)
+        return [self._position_to_key(position) for position in positions]
+
+    ###################################################################
+    #
+    # Free slots
+    #
+    ###################################################################
+
+    def _clear_free_slots(self):
+        # The empty positions, and a max heap of them which may also hold
+        # positions that have since been used
+        self._empty = set()
+        self._empty_heap = []
+        self._lowest = None
+        self._highest = None
+
+    def _highest_empty(self):
         ret = None
-        lowest = None
-        for key in sorted(records, reverse=True):
-            lowest = key
-            if self.aldb[key].is_empty_aldb():
-                ret = key
+        while self._empty_heap:
+            if -self._empty_heap[0] in self._empty:
+                ret = -self._empty_heap[0]
                 break
+            heapq.heappop(self._empty_heap)
+        return ret
+
+    def _track_free_slot(self, position, in_use):
+        if in_use:
+            self._empty.discard(position)
+        elif position not in self._empty:
+            self._empty.add(position)
+            heapq.heappush(self._empty_heap, -position)
+        if self._lowest is None or position < self._lowest:
+            self._lowest = position
+        if self._highest is None or position > self._highest:
+            self._highest = position
+
+    ###################################################################
+    #
+    # Slot access, used by ALDBRecord
+    #
+    ###################################################################
+
+    def get_raw(self, position):
+        '''Returns a copy of the bytes of the record at position'''
+        offset = self._slots[position] * RECORD_SIZE
+        return self._buffer[offset:offset + RECORD_SIZE]
+
+    def get_parsed(self, position):
+        '''Returns the ParsedRecord of the record at position'''
+        ret = self._parsed.get(position)
         if ret is None:
-            msb = int(lowest[0:2], 16)
-            lsb = int(lowest[2:4], 16)
-            if lsb >= 8:
-                lsb = lsb - 8
-            else:
-                msb = msb - 1
-            ret = ('{:02x}'.format(msb, 'x').upper() +
-                   '{:02x}'.format(lsb, 'x').upper())
+            ret = ParsedRecord.from_raw(self.get_raw(position))
+            self._parsed[position] = ret
+        return ret
+
+    def get_byte(self, position, byte_pos):
+        return self._buffer[self._slots[position] * RECORD_SIZE + byte_pos]
+
+    def set_raw(self, position, raw):
+        self._write_slot(position, raw)
+        self._links_changed()
+        self._journal_record(self._position_to_key(position), raw)
+
+    def set_byte(self, position, byte_pos, byte):
+        '''Stores one byte of the record at position, see
+        record_bytes_stored()'''
+        self._unindex(position)
+        self._buffer[self._slots[position] * RECORD_SIZE + byte_pos] = byte
+        self._parsed.pop(position, None)
+        self._index(position)
+        self._journal_record(self._position_to_key(position),
+                             self.get_raw(position))
+
+    def _add_slot(self, position, raw):
+        if len(raw) != RECORD_SIZE:
+            raise ValueError('an aldb record is {} bytes'.format(RECORD_SIZE))
+        self._slots[position] = len(self._slots)
+        self._buffer.extend(raw)
+        self._index(position)
+
+    def _write_slot(self, position, raw):
+        if len(raw) != RECORD_SIZE:
+            # Anything else would shift every following slot
+            raise ValueError('an aldb record is {} bytes'.format(RECORD_SIZE))
+        self._unindex(position)
+        offset = self._slots[position] * RECORD_SIZE
+        self._buffer[offset:offset + RECORD_SIZE] = raw
+        self._parsed.pop(position, None)
+        self._index(position)
+
+    def _index_keys(self, position):
+        offset = self._slots[position] * RECORD_SIZE
+        flags = self._buffer[offset]
+        in_use = bool(flags & 0b10000000)
+        controller = bool(flags & 0b01000000)
+        group = self._buffer[offset + 1]
+        address = tuple(self._buffer[offset + 2:offset + 5])
+        return ((_LINK_INDEX, (in_use, controller, group, address)),
+                (_GROUP_INDEX, (in_use, controller, group)),
+                (_ADDRESS_INDEX, (address,)))
+
+    def _link_key(self, position):
+        '''Returns the linked address and group of the record'''
+        offset = self._slots[position] * RECORD_SIZE
+        return (tuple(self._buffer[offset + 2:offset + 5]),
+                self._buffer[offset + 1])
+
+    def _index(self, position):
+        for fields, key in self._index_keys(position):
+            self._indexes[fields].setdefault(key, {})[position] = None
+        self._track_free_slot(position,
+                              not ALDBRecord(self, position).is_empty_aldb())
+        link_index = self._link_index()
+        if link_index is not None:
+            link_index.add(*self._link_key(position), self, position)
+
+    def _unindex(self, position):
+        for fields, key in self._index_keys(position):
+            positions = self._indexes[fields][key]
+            del positions[position]
+            if not positions:
+                del self._indexes[fields][key]
+        link_index = self._link_index()
+        if link_index is not None:
+            link_index.discard(*self._link_key(position), self, position)
+
+    def _link_index(self):
+        ret = None
+        if self.core is not None:
+            ret = self.core.link_index
+        return ret
+
+    def record_bytes_stored(self):
+        '''Called once a record being read byte by byte is complete, so that
+        it counts as a single link change rather than one per byte'''
+        self._links_changed()
+
+    def _links_changed(self):
+        if self.core is not None:
+            self.core.links_changed()
+
+    def detach(self):
+        '''Removes the records from the link index of the core, used when
+        the device is deleted'''
+        link_index = self._link_index()
+        if link_index is not None:
+            for position in self._slots:
+                link_index.discard(*self._link_key(position), self, position)
+
+    def get_link_sequence(self, position):
+        return self._link_sequences.get(position)
+
+    def set_link_sequence(self, position, sequence):
+        if sequence is None:
+            self._link_sequences.pop(position, None)
+        else:
+            self._link_sequences[position] = sequence
+
+    ###################################################################
+    #
+    # Keys
+    #
+    ###################################################################
+
+    def _to_position(self, position):
+        if isinstance(position, str):
+            position = self._key_to_position(position)
+        return position
+
+    def _key_to_position(self, key):
+        '''Device records are keyed by the hex address of their last byte'''
+        # pylint: disable=R0201
+        return int(key, 16)
+
+    def _position_to_key(self, position):
+        # pylint: disable=R0201
+        return '{:04X}'.format(position)
+
+
+class LinkIndex(object):
+    '''An index of the records of every ALDB in the core by the address
+    and group they link to, so that the records on other devices which
+    reference a device can be found without searching every ALDB.  Kept up
+    to date by each ALDB as its records change.'''
+
+    def __init__(self):
+        # (address, group) to a dict, used as an ordered set, of
+        # (database, position)
+        self._records = {}
+
+    def add(self, address, group, database, position):
+        self._records.setdefault((address, group), {})[
+            (database, position)] = None
+
+    def discard(self, address, group, database, position):
+        records = self._records.get((address, group))
+        if records is not None:
+            records.pop((database, position), None)
+            if not records:
+                del self._records[(address, group)]
+
+    def get_records(self, address, group):
+        '''Returns the records, in any ALDB, which link to group on the
+        device at address, a tuple of the three address bytes'''
+        ret = []
+        for database, position in self._records.get((address, group), ()):
+            ret.append(ALDBRecord(database, position))
         return ret
 
 
 class ALDBRecord(object):
-    '''The base ALDB class which is inherited by both the Device and PLM
-    ALDB classes'''
-    def __init__(self, database, raw=None):
-        if raw is None:
-            raw = bytearray(8)
-        self._raw = raw
+    '''A view of a single record in an ALDB.  Holds nothing but the
+    database and position, so any number of views of a record may exist
+    and all of them see the same data.'''
+    __slots__ = ('_database', '_position')
+
+    def __init__(self, database, position):
         self._database = database
-        self._core = self._database.core
-        self._device = self._database.device
-        self._link_sequence = None
+        self._position = position
+
+    def __eq__(self, other):
+        return (isinstance(other, ALDBRecord) and
+                self._database is other._database and
+                self._position == other._position)
+
+    def __hash__(self):
+        return hash((id(self._database), self._position))
+
+    @property
+    def _device(self):
+        return self._database.device
+
+    @property
+    def _core(self):
+        return self._database.core
+
+    @property
+    def position(self):
+        '''The integer position of the record in the database'''
+        return self._position
 
     @property
     def device(self):
@@ -111,53 +512,35 @@ class ALDBRecord(object):
 
     @property
     def key(self):
-        ret = None
-        for key, record in self._database.aldb.items():
-            if record == self:
-                ret = key
-                break
-        return ret
+        return self._database._position_to_key(self._position)
 
     @property
     def raw(self):
-        return self._raw
+        '''A copy of the bytes of the record, assign to change them'''
+        return self._database.get_raw(self._position)
 
     @raw.setter
     def raw(self, value):
-        self._raw = value
+        self._database.set_raw(self._position, value)
 
     @property
     def link_sequence(self):
-        return self._link_sequence
+        return self._database.get_link_sequence(self._position)
 
     @link_sequence.setter
     def link_sequence(self, sequence):
-        self._link_sequence = sequence
+        self._database.set_link_sequence(self._position, sequence)
 
     def delete(self):
         '''Removes the record from the device and the cache'''
         ret = self._database.device.send_handler.delete_record(key=self.key)
         ret.start()
-        self._link_sequence = ret
+        self.link_sequence = ret
 
     def parse_record(self):
-        parsed = {
-            'link_flags': self.raw[0],
-            'in_use':  self.raw[0] & 0b10000000,
-            'controller':  self.raw[0] & 0b01000000,
-            'responder': ~self.raw[0] & 0b01000000,
-            'highwater': ~self.raw[0] & 0b00000010,
-            'group': self.raw[1],
-            'dev_addr_hi': self.raw[2],
-            'dev_addr_mid': self.raw[3],
-            'dev_addr_low': self.raw[4],
-            'data_1': self.raw[5],
-            'data_2': self.raw[6],
-            'data_3': self.raw[7],
-        }
-        for attr in ('in_use', 'controller', 'responder', 'highwater'):
-            parsed[attr] = bool(parsed[attr])
-        return parsed
+        '''Returns the ParsedRecord of this record, cached by the database
+        until the record changes'''
+        return self._database.get_parsed(self._position)
 
     @property
     def linked_device(self):
@@ -188,13 +571,13 @@ class ALDBRecord(object):
 
     def is_last_aldb(self):
         ret = True
-        if self.raw[0] & 0b00000010:
+        if self._database.get_byte(self._position, 0) & 0b00000010:
             ret = False
         return ret
 
     def is_empty_aldb(self):
         ret = True
-        if self.raw[0] & 0b10000000:
+        if self._database.get_byte(self._position, 0) & 0b10000000:
             ret = False
         return ret
 
@@ -207,43 +590,38 @@ class ALDBRecord(object):
     def is_a_defined_link(self):
         '''Returns True if link key of this link is associated with a defined
         user_link'''
-        ret = False
-        if self.is_controller():
-            user_links = self._core.get_user_links_for_this_controller(self.group_obj)
-            for user_link in user_links.values():
-                if user_link.controller_key == self.key:
-                    ret = True
-                    break
-        else:
-            user_links = self.device.root.get_all_user_links()
-            for user_link in user_links.values():
-                if user_link.responder_key == self.key:
-                    ret = True
-                    break
-        return ret
+        return self.get_defined_link() is not None
 
     def get_defined_link(self):
         '''Returns the user link associated with the link key or None if doesnt
         exist'''
         ret = None
-        if self.is_controller():
-            user_links = self._core.get_user_links_for_this_controller(self.group_obj)
-            for user_link in user_links.values():
-                if user_link.controller_key == self.key:
-                    ret = user_link
-                    break
+        address = self.device.root.dev_addr_str
+        if self._core is None:
+            # Not part of a network, so there are no user links
+            pass
+        elif self.is_controller():
+            group = self.group_obj
+            if group is not None:
+                ret = self._core.user_links.get_by_controller_key(
+                    address, group.group_number, self.key)
         else:
-            user_links = self.device.root.get_all_user_links()
-            for user_link in user_links.values():
-                if user_link.responder_key == self.key:
-                    ret = user_link
-                    break
+            ret = self._core.user_links.get_by_responder_key(address,
+                                                             self.key)
         return ret
 
     def status(self):
         '''Returns the status of the link as a string'''
+        if self._core is not None:
+            ret = self._core.link_status.status(self)
+        else:
+            ret = self.classify(self.get_defined_link())
+        return ret
+
+    def classify(self, user_link):
+        '''Returns the status of the link as a string, given user_link, the
+        user link associated with this record or None'''
         ret = ''
-        user_link = self.get_defined_link()
         if self.is_empty_aldb():
             ret = 'emtpy'
         elif self._is_i2_modem_link():
@@ -326,7 +704,7 @@ class ALDBRecord(object):
         self.raw = record
 
     def edit_record_byte(self, byte_pos, byte):
-        self.raw[byte_pos] = byte
+        self._database.set_byte(self._position, byte_pos, byte)
 
     def json(self):
         '''Returns a dict to be used as a json reprentation of the link'''
@@ -0,0 +1,144 @@
+'''An asyncio based alternative to the threaded Insteon_Core'''
+import asyncio
+import time
+
+from insteon_mngr.core import Insteon_Core
+from insteon_mngr.storage import JSONStorage
+
+
+class AsyncInsteonCore(Insteon_Core):
+    '''Provides the same global management functions as Insteon_Core, but
+    rather than running a core thread, each modem is processed by its own
+    task on an asyncio event loop.  Nothing is processed until run() is
+    awaited:
+
+        core = AsyncInsteonCore()
+        asyncio.get_event_loop().create_task(core.run())
+
+    send_command, set_state and query_aldb return futures which resolve to
+    True once the command is acked, or False if it fails.  They must be
+    called from the thread running the event loop.'''
+
+    def __init__(self, config_path=None, storage_class=JSONStorage,
+                 web_server=True):
+        self._loop = None
+        self._core_event = None
+        super().__init__(config_path=config_path, storage_class=storage_class,
+                         web_server=web_server)
+
+    def _start(self):
+        # Processing starts when run() is awaited
+        pass
+
+    async def run(self):
+        '''Processes all modems until close() is called'''
+        self._loop = asyncio.get_running_loop()
+        self._core_event = asyncio.Event()
+        server = self._start_web_server()
+        tasks = {}
+        try:
+            while self._exit is False:
+                self._core_event.clear()
+                for modem in self._modems:
+                    if modem not in tasks:
+                        tasks[modem] = self._loop.create_task(
+                            self._modem_loop(modem))
+                self._save_state()
+                await self._wait(self._core_event, self._next_save_time())
+        finally:
+            for task in tasks.values():
+                task.cancel()
+            self._stop_web_server(server)
+
+    async def _modem_loop(self, modem):
+        '''The task that processes a single modem'''
+        event = asyncio.Event()
+        self._modem_events[modem] = event
+        while self._exit is False:
+            event.clear()
+            self._process_modem(modem)
+            await self._wait(event, modem.next_deadline())
+
+    async def _wait(self, event, deadline):
+        '''Waits until the event is set or the deadline passes.  A deadline
+        of None waits only for the event.'''
+        timeout = None
+        if deadline is not None:
+            timeout = max(deadline - time.time(), 0)
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def wake(self, modem=None):
+        '''Wakes the task processing modem, or every task if modem is None.
+        Safe to call from any thread.'''
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._set_events, modem)
+
+    def _set_events(self, modem):
+        if modem is None:
+            self._core_event.set()
+            for event in self._modem_events.values():
+                event.set()
+        elif modem in self._modem_events:
+            self._modem_events[modem].set()
+        else:
+            # A new modem, the core task will start its loop
+            self._core_event.set()
+
+    ###################################################################
+    #
+    # Awaitable commands
+    #
+    ###################################################################
+
+    def send_command(self, device, command_name):
+        '''Queues command_name to be sent to device, which may be a modem.
+        Returns a future which resolves when the command is acked.'''
+        message = device.create_message(command_name)
+        if message is not None:
+            device.queue_device_msg(message)
+        return self._message_future(message)
+
+    def set_state(self, group, state):
+        '''Sets the state of group.  Returns a future which resolves when the
+        device acks the change.'''
+        return self._message_future(group.set_state(state))
+
+    def query_aldb(self, device):
+        '''Rescans the all link database of device.  Returns a future which
+        resolves when the scan is complete.'''
+        future = self._loop.create_future()
+        device.query_aldb(success=lambda: self._resolve(future, True),
+                          failure=lambda: self._resolve(future, False))
+        return future
+
+    def _message_future(self, message):
+        '''Returns a future that resolves when message is acked by the
+        device, or by the PLM if message is not an insteon message'''
+        future = self._loop.create_future()
+        if message is None:
+            future.set_result(False)
+            return future
+        if message.insteon_msg:
+            insteon_msg = message.insteon_msg
+            prior_success = insteon_msg.device_success_callback
+            insteon_msg.device_success_callback = lambda: (
+                prior_success(), self._resolve(future, True))
+        else:
+            prior_success = message.plm_success_callback
+            message.plm_success_callback = lambda: (
+                prior_success(), self._resolve(future, True))
+        prior_failure = message.msg_failure_callback
+        message.msg_failure_callback = lambda: (
+            prior_failure(), self._resolve(future, False))
+        return future
+
+    def _resolve(self, future, result):
+        self._loop.call_soon_threadsafe(self._set_result, future, result)
+
+    @staticmethod
+    def _set_result(future, result):
+        if not future.done():
+            future.set_result(result)
@@ -2,6 +2,7 @@ import time
 
 from insteon_mngr import ID_STR_TO_BYTES, BYTE_TO_HEX
 from insteon_mngr.user_link import UserLink
+from insteon_mngr.scheduler import message_priority, PRIORITY_INTERACTIVE
 from insteon_mngr.sequences import (WriteALDBRecordi2, WriteALDBRecordi1)
 
 class Common(object):
@@ -21,14 +22,38 @@ class Common(object):
         to the nature of device. This includes dev_cat and related items as well
         as the object state.  Attribute excludes things like whether the object is a
         responder or is_deaf, these are features.'''
-        if value is not None:
+        if value is not None and self._attributes.get(attr) != value:
             self._attributes[attr] = value
+            self._attribute_changed(attr, value)
         try:
             ret = self._attributes[attr]
         except KeyError:
             ret = None
         return ret
 
+    def update_attributes(self, values):
+        '''Sets each attribute in the dict values, the changes are saved
+        together'''
+        changed = {}
+        for attr, value in values.items():
+            if value is not None and self._attributes.get(attr) != value:
+                self._attributes[attr] = value
+                changed[attr] = value
+        if changed:
+            self._attributes_changed(changed)
+
+    def mark_dirty(self):
+        '''Flags the object as changed so that the core saves it'''
+        pass
+
+    def _attribute_changed(self, attr, value):
+        # pylint: disable=W0613
+        self.mark_dirty()
+
+    def _attributes_changed(self, changed):
+        for attr, value in changed.items():
+            self._attribute_changed(attr, value)
+
     def get_attributes(self):
         ret = self._attributes.copy()
         return ret
@@ -42,8 +67,8 @@ class Group(Common):
     '''The Group class for all groups.  Specialized functions should be done
     in the send_handler or functions.'''
     def __init__(self, device, **kwargs):
-        super().__init__(**kwargs)
         self._device = device
+        super().__init__(**kwargs)
         self._type = 'relay'
         self._update_callbacks = []
         self._delete_callbacks = []
@@ -53,6 +78,29 @@ class Group(Common):
         '''Returns the type of device group that this group is.'''
         return self._type
 
+    def mark_dirty(self):
+        self._device.mark_dirty()
+
+    def _attribute_changed(self, attr, value):
+        group_number = self.group_number
+        if group_number is None:
+            # Still being created, the group is saved with its device
+            self.mark_dirty()
+        else:
+            self._device.journal({'op': 'group_attr',
+                                  'group': group_number,
+                                  'name': attr,
+                                  'value': value})
+
+    def _attributes_changed(self, changed):
+        group_number = self.group_number
+        if group_number is None:
+            self.mark_dirty()
+        else:
+            self._device.journal({'op': 'group_attr',
+                                  'group': group_number,
+                                  'values': changed})
+
     @property
     def group_number(self):
         ret = self._device.get_group_number_by_object(self)
@@ -72,8 +120,7 @@ class Group(Common):
     def set_cached_state(self, value):
         '''Update the internal tracking state of the device, likely you don't
         want to call this'''
-        self.attribute(attr='state', value=value)
-        self.attribute(attr='state_time', value=time.time())
+        self.update_attributes({'state': value, 'state_time': time.time()})
         self._do_update_callback()
 
     def _state_commands(self):
@@ -84,14 +131,19 @@ class Group(Common):
         return ret
 
     def set_state(self, state):
+        '''Queues the message to change the state of the group, returns the
+        message or None if the state is unknown'''
         commands = self._state_commands()
         state = str(state)
+        msg = None
         try:
             msg = commands[state.upper()]
         except KeyError:
             print('This group doesn\'t know the state', state)
         else:
+            msg.state_group = self
             self.device.queue_device_msg(msg)
+        return msg
 
     @property
     def state_age(self):
@@ -250,8 +302,10 @@ class BaseSendHandler(object):
         to the device'''
         return NotImplemented
 
-    def query_aldb(self, success=None, failure=None):
-        '''Initiates the process to query the all link database on the device'''
+    def query_aldb(self, success=None, failure=None, incremental=False):
+        '''Initiates the process to query the all link database on the
+        device.  If incremental is true only the records that may have
+        changed since it was cached are read.'''
         return NotImplemented
 
 
@@ -264,12 +318,12 @@ class Root(Common):
         self._user_links = {}
         self._core = core
         self._plm = plm
-        super().__init__(**kwargs)
-        self._out_history = []
         self._id_bytes = bytearray(3)
-        self.send_handler = BaseSendHandler(self)
         if 'device_id' in kwargs:
             self._id_bytes = ID_STR_TO_BYTES(kwargs['device_id'])
+        super().__init__(**kwargs)
+        self._out_history = []
+        self.send_handler = BaseSendHandler(self)
         if self.attribute('base_group_number') is None:
             self.attribute('base_group_number', 0x00)
 
@@ -326,6 +380,28 @@ class Root(Common):
     def core(self):
         return self._core
 
+    def mark_dirty(self):
+        if self._core is not None:
+            self._core.mark_dirty(self)
+
+    def journal(self, entry):
+        '''Records a change to the saved state of this device'''
+        if self._core is not None:
+            self._core.journal(self, entry)
+
+    def journal_user_link(self, user_link, op='link'):
+        '''Records that user_link was saved, or deleted if op is
+        delete_link'''
+        if self._core is not None:
+            self._core.links_changed()
+        self.journal({'op': op,
+                      'controller': user_link.controller_id,
+                      'group': user_link.controller_group_number,
+                      'data': user_link.data})
+
+    def _attribute_changed(self, attr, value):
+        self.journal({'op': 'attr', 'name': attr, 'value': value})
+
     @property
     def plm(self):
         return self._plm
@@ -336,6 +412,32 @@ class Root(Common):
 
     def _resend_msg(self, message):
         self.out_queue.insert(0, message)
+        self.plm.scheduler.update(self)
+        self.plm.wake()
+
+    def _replace_superseded_msgs(self, message):
+        '''Replaces the unsent messages that set the state of the same group
+        as message, only the latest state needs to be sent.  message takes
+        the place in the queue of the first of them and the others are
+        removed.  The callbacks of the replaced messages are moved to
+        message.  Returns the number of messages replaced'''
+        ret = 0
+        if message.state_group is not None:
+            remaining = []
+            for pending in self.out_queue:
+                if pending.state_group is message.state_group:
+                    message.inherit_callbacks(pending)
+                    if ret == 0:
+                        remaining.append(message)
+                    ret += 1
+                else:
+                    remaining.append(pending)
+            if ret:
+                self.out_queue[:] = remaining
+                print('dropped', ret, 'superseded messages for',
+                      self.dev_addr_str, 'group',
+                      message.state_group.group_number)
+        return ret
 
     def update_message_history(self, msg):
         # Remove old messages first
@@ -367,6 +469,8 @@ class Root(Common):
                         None
                     )
                     self._user_links[user_link.uid] = user_link
+                    self.core.user_links.add(user_link)
+                    self.core.links_changed()
 
     def save_user_links(self):
         '''Constructs a dictionary for saving the user links to the config
@@ -404,7 +508,18 @@ class Root(Common):
     ##################################
 
     def queue_device_msg(self, message):
-        self.out_queue.append(message)
+        '''Queues message to be sent.  Returns the number of pending
+        messages that were dropped because message supersedes them, message
+        then keeps the place of the first of them'''
+        ret = self._replace_superseded_msgs(message)
+        if ret == 0:
+            self.out_queue.append(message)
+        if message_priority(message) == PRIORITY_INTERACTIVE:
+            # The user is waiting on this device, initialize it next
+            self.plm.init_scheduler.touch(self)
+        self.plm.scheduler.update(self)
+        self.plm.wake()
+        return ret
 
     def add_user_link(self, controller_group, data, uid):
         controller_id = controller_group.device.dev_addr_str
@@ -427,6 +542,8 @@ class Root(Common):
                 uid
             )
             self._user_links[new_user_link.uid] = new_user_link
+            self.core.user_links.add(new_user_link)
+            self.journal_user_link(new_user_link)
 
     def get_all_user_links(self):
         return self._user_links.copy()
@@ -434,17 +551,16 @@ class Root(Common):
     def delete_user_link(self, uid):
         ret = True
         try:
-            del self._user_links[uid]
+            user_link = self._user_links.pop(uid)
         except KeyError:
             ret = False
+        else:
+            self.core.user_links.remove(user_link)
+            self.journal_user_link(user_link, 'delete_link')
         return ret
 
     def find_user_link(self, search_uid):
-        ret = None
-        for link_uid in self._user_links:
-            if search_uid == link_uid:
-                ret = self._user_links[link_uid]
-        return ret
+        return self._user_links.get(search_uid)
 
     def search_last_sent_msg(self, **kwargs):
         '''Return the most recently sent message of this type
@@ -516,7 +632,13 @@ class Root(Common):
         return self._groups.values()
 
     def set_dev_addr(self, addr):
+        old_addr = self.dev_addr_str
         self._id_bytes = ID_STR_TO_BYTES(addr)
+        if self is self.plm and old_addr != self.dev_addr_str:
+            # Modems are saved under their address
+            self.journal({'op': 'rename_modem', 'old': old_addr})
+        if self._core is not None:
+            self._core.links_changed()
         return
 
     def set_dev_version(self, dev_cat=None, sub_cat=None, firmware=None):
@@ -536,5 +658,6 @@ class Root(Common):
     def send_command(self, command_name, state=''):
         return self.send_handler.send_command(command_name)
 
-    def query_aldb(self, success=None, failure=None):
-        return self.send_handler.query_aldb(success=success, failure=failure)
+    def query_aldb(self, success=None, failure=None, incremental=False):
+        return self.send_handler.query_aldb(success=success, failure=failure,
+                                            incremental=incremental)
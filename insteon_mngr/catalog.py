@@ -0,0 +1,51 @@
+'''The catalog of known device categories and models.'''
+import json
+import pkgutil
+import re
+
+
+class DeviceCatalog(object):
+    '''Describes devices by their dev_cat and sub_cat.  The data files are
+    not read until the catalog is first used, the keys are then parsed once
+    into an index so that each lookup is a single dict access.'''
+
+    def __init__(self):
+        self._categories = None
+        self._models = None
+        self._category_index = None
+        self._model_index = None
+
+    @property
+    def categories(self):
+        '''The raw category data, keyed by the dev_cat as a hex string'''
+        if self._categories is None:
+            self._categories = self._read('device_categories.json')
+        return self._categories
+
+    @property
+    def models(self):
+        '''The raw model data, keyed by "dev_cat:sub_cat" as hex strings'''
+        if self._models is None:
+            self._models = self._read('device_models.json')
+        return self._models
+
+    def category(self, dev_cat):
+        '''Returns the dict describing dev_cat, or None if it is unknown'''
+        if self._category_index is None:
+            self._category_index = {
+                int(key, 16): value for key, value in self.categories.items()}
+        return self._category_index.get(dev_cat)
+
+    def model(self, dev_cat, sub_cat):
+        '''Returns the dict describing the model, or None if it is unknown'''
+        if self._model_index is None:
+            self._model_index = {}
+            for key, value in self.models.items():
+                cat, sub = re.split('[^0-9A-Fa-f]', key)
+                self._model_index[(int(cat, 16), int(sub, 16))] = value
+        return self._model_index.get((dev_cat, sub_cat))
+
+    @staticmethod
+    def _read(name):
+        data = pkgutil.get_data(__package__, 'data/' + name)
+        return json.loads(data.decode())
@@ -1,19 +1,19 @@
+import os
 import threading
 import json
 import re
-import pkg_resources
 
 from bottle import (route, run, Bottle, response, get, post, put, delete,
                     request, error, static_file, view, TEMPLATE_PATH,
-                    WSGIRefServer, redirect)
+                    WSGIRefServer, redirect, install)
 
 from insteon_mngr import BYTE_TO_ID
 from insteon_mngr.sequences import DeleteLinkPair
 
 core = None
 
-STATIC_PATH = pkg_resources.resource_filename(__name__, '/web/static')
-ROOT_PATH = pkg_resources.resource_filename(__name__, '/web')
+ROOT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'web')
+STATIC_PATH = os.path.join(ROOT_PATH, 'static')
 
 def start(passed_core):
     global core      # pylint: disable=W0603
@@ -25,6 +25,16 @@ def start(passed_core):
 def stop(server):
     server.shutdown()
 
+def lock_core(callback):
+    '''Bottle plugin, holds the core lock while answering a request so that
+    the modem threads do not change the core mid request'''
+    def wrapper(*args, **kwargs):
+        with core.lock:
+            return callback(*args, **kwargs)
+    return wrapper
+
+install(lock_core)
+
 ###################################################################
 ##
 # API Responses
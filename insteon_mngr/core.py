@@ -1,22 +1,41 @@
+import copy
 import json
 import time
 import atexit
 import threading
 import random
 import os
-import pkg_resources
 
 from insteon_mngr.plm import PLM
 from insteon_mngr.hub import Hub
-from insteon_mngr.config_server import start, stop
+from insteon_mngr.catalog import DeviceCatalog
+from insteon_mngr.aldb import LinkIndex
+from insteon_mngr.link_status import LinkStatusEngine
+from insteon_mngr.user_link_registry import UserLinkRegistry
+from insteon_mngr.storage import JSONStorage, StorageWriter
 from insteon_mngr.base_objects import Group
 from insteon_mngr.devices import DimmerGroup
 
+# The longest the core and modem loops will sleep without being woken.  Bounds
+# how long it takes to notice that the main thread has exited.
+MAX_IDLE_WAIT = 1.0
+
+# The state is saved, and the journal compacted, every SNAPSHOT_INTERVAL
+# seconds or sooner once the journal holds more than COMPACT_ENTRIES entries.
+# Changes are never lost in between as each is appended to the journal.
+SNAPSHOT_INTERVAL = 600
+COMPACT_ENTRIES = 1000
+
 
 class Insteon_Core(object):
     '''Provides global management functions'''
 
-    def __init__(self, config_path=None):
+    def __init__(self, config_path=None, storage_class=JSONStorage,
+                 web_server=True):
+        '''config_path is the directory holding the saved state.
+        storage_class selects how it is stored, JSONStorage or
+        SQLiteStorage.  The web interface is only loaded and started if
+        web_server is True.'''
         if config_path is None:
             os.makedirs(os.path.join(os.path.expanduser("~"),'.insteon_mngr'),
                         exist_ok=True)
@@ -26,85 +45,187 @@ class Insteon_Core(object):
         else:
             self._config_path = os.path.join(config_path, 'config.json')
         self._modems = []
+        self._web_server = web_server
+        # Read on first use, most startups never need it
+        self.device_catalog = DeviceCatalog()
+        # Every ALDB record in the network by the address and group it
+        # links to, kept up to date by the ALDBs
+        self.link_index = LinkIndex()
+        # Every user link in the network, kept up to date by the devices
+        # holding them
+        self.user_links = UserLinkRegistry()
+        # Advanced by links_changed(), the link statuses are only worked
+        # out again once it has moved
+        self.link_generation = 0
+        self.link_status = LinkStatusEngine(self)
         self._group_callbacks = []
         self._last_saved_time = 0
+        self._wake_event = threading.Event()
+        self._modem_events = {}
+        # Held while processing a modem or answering a web request, so that
+        # state shared between modems, such as user links, stays consistent
+        self.lock = threading.RLock()
+        self._storage = storage_class(self._config_path)
+        self._writer = StorageWriter(self._storage)
+        # Devices changed since the last save, and the snapshot of every
+        # device taken when it was last saved
+        self._dirty = set()
+        self._saved_devices = {}
+        # Nothing is journaled while the state is being loaded
+        self._loading = True
         self._load_state()
+        self._loading = False
+        self._dirty.clear()
         self._exit = False
-        threading.Thread(target=self._core_loop).start()
+        self._start()
         # Be sure to save before exiting
         atexit.register(self._save_state, True)
 
-        # Load device data
-        json_cats = pkg_resources.resource_string(__name__, "/data/device_categories.json")
-        self.device_categories = json.loads(json_cats.decode())
+    @property
+    def device_categories(self):
+        return self.device_catalog.categories
 
-        json_models = pkg_resources.resource_string(__name__, "/data/device_models.json")
-        self.device_models = json.loads(json_models.decode())
+    @property
+    def device_models(self):
+        return self.device_catalog.models
 
     def _get_all_user_links(self):
-        ret = {}
-        for modem in self.get_all_modems():
-            ret.update(modem.get_all_user_links())
-            for device in modem.get_all_devices():
-                ret.update(device.get_all_user_links())
-        return ret
+        return self.user_links.get_all()
 
     def get_new_user_link_unique_id(self):
         '''Returns an integer between 100,000 and 999,999 that is not used by
         an existing user_link as a uid'''
         rand = random.randint(100000,999999)
-        all_links = self._get_all_user_links()
-        while rand in all_links:
+        while self.user_links.find(rand) is not None:
             rand = random.randint(100000,999999)
         return rand
 
+    def get_records_linked_to(self, group):
+        '''Returns the records in any ALDB which link to group'''
+        device = group.device
+        return self.link_index.get_records(
+            (device.dev_addr_hi, device.dev_addr_mid, device.dev_addr_low),
+            group.group_number)
+
     def get_user_links_for_this_controller(self, controller_group):
-        all_links = self._get_all_user_links()
-        ret = {}
-        for uid, link in all_links.items():
-            if controller_group == link.controller_group:
-                ret[uid] = link
-        return ret
+        return self.user_links.get_by_controller_group(
+            controller_group.device.root.dev_addr_str,
+            controller_group.group_number)
 
     def get_user_links_for_this_controller_device(self, controller_device):
-        all_links = self._get_all_user_links()
-        ret = {}
-        for uid, link in all_links.items():
-            if controller_device == link.controller_device:
-                ret[uid] = link
-        return ret
+        return self.user_links.get_by_controller_device(
+            controller_device.dev_addr_str)
 
     def find_user_link(self, search_uid):
-        ret = None
-        all_links = self._get_all_user_links()
-        for link_uid in all_links:
-            if search_uid == link_uid:
-                ret = all_links[link_uid]
-        return ret
+        return self.user_links.find(search_uid)
 
     def get_matching_aldb_records(self, attributes):
+        '''Returns the records in any ALDB that match ALL attributes.  If
+        the group and linked address are both given, only the records
+        linking to them are checked.'''
         ret = []
+        address_names = ('dev_addr_hi', 'dev_addr_mid', 'dev_addr_low')
+        if ('group' in attributes and
+                all(name in attributes for name in address_names)):
+            address = tuple(attributes[name] for name in address_names)
+            for record in self.link_index.get_records(address,
+                                                      attributes['group']):
+                parsed_record = record.parse_record()
+                for attribute, value in attributes.items():
+                    if parsed_record[attribute] != value:
+                        break
+                else:
+                    ret.append(record)
+            return ret
         for modem in self.get_all_modems():
             ret.extend(modem.aldb.get_matching_records(attributes))
             for device in modem.get_all_devices():
                 ret.extend(device.aldb.get_matching_records(attributes))
         return ret
 
+    def _start(self):
+        '''Starts the thread running the core loop'''
+        threading.Thread(target=self._core_loop).start()
+
+    def wake(self, modem=None):
+        '''Wakes the loop processing modem so that new input or newly queued
+        messages are processed immediately.  If modem is None, wakes all of
+        the loops.  Safe to call from any thread.'''
+        if modem is None:
+            self._wake_event.set()
+            for event in list(self._modem_events.values()):
+                event.set()
+        elif modem in self._modem_events:
+            self._modem_events[modem].set()
+        else:
+            # A new modem, the core loop will start a thread for it
+            self._wake_event.set()
+
     def _core_loop(self):
-        server = start(self)
+        '''Starts a thread for each modem and periodically saves the state
+        of the core'''
+        server = self._start_web_server()
         while threading.main_thread().is_alive() and self._exit is False:
-            self._loop_once()
-            time.sleep(.05)
-        stop(server)
+            # Clear before processing so that a wake arriving mid loop is
+            # not lost
+            self._wake_event.clear()
+            for modem in self._modems:
+                if modem not in self._modem_events:
+                    self._modem_events[modem] = threading.Event()
+                    threading.Thread(target=self._modem_loop,
+                                     args=[modem]).start()
+            self._save_state()
+            self._wake_event.wait(
+                self._timeout_until(self._next_save_time()))
+        self.wake()
+        self._stop_web_server(server)
 
-    def _loop_once(self):
-        '''Perform one loop of processing the data waiting to be
-        handled by the Insteon Core'''
-        for modem in self._modems:
+    def _start_web_server(self):
+        '''Starts the web interface if it is enabled, returns the server or
+        None'''
+        ret = None
+        if self._web_server:
+            # Imported here so that bottle is only loaded when it is used
+            from insteon_mngr import config_server
+            ret = config_server.start(self)
+        return ret
+
+    def _stop_web_server(self, server):
+        # pylint: disable=R0201
+        if server is not None:
+            from insteon_mngr import config_server
+            config_server.stop(server)
+
+    def _modem_loop(self, modem):
+        '''Processes a single modem, each modem runs in its own thread so
+        that a slow modem does not delay the others'''
+        event = self._modem_events[modem]
+        while threading.main_thread().is_alive() and self._exit is False:
+            event.clear()
+            self._process_modem(modem)
+            event.wait(self._timeout_until(modem.next_deadline()))
+
+    def _process_modem(self, modem):
+        '''Perform one loop of processing the data waiting to be handled by
+        the modem'''
+        with self.lock:
             modem.process_input()
-            modem.process_unacked_msg()
             modem.process_queue()
-        self._save_state()
+            modem.process_timers()
+
+    def _timeout_until(self, deadline):
+        '''Converts a deadline into a number of seconds to wait, never less
+        than zero nor more than MAX_IDLE_WAIT.  A deadline of None waits for
+        MAX_IDLE_WAIT.'''
+        # pylint: disable=R0201
+        if deadline is None:
+            deadline = time.time() + MAX_IDLE_WAIT
+        timeout = deadline - time.time()
+        if timeout < 0:
+            timeout = 0
+        elif timeout > MAX_IDLE_WAIT:
+            timeout = MAX_IDLE_WAIT
+        return timeout
 
     def _save_device(self, device):
         ret = device._attributes.copy()
@@ -113,41 +234,85 @@ class Insteon_Core(object):
         ret['user_links'] = device.save_user_links()
         return ret
 
+    def mark_dirty(self, device):
+        '''Flags device, a modem or insteon device, as changed so that it is
+        included in the next save.  Safe to call from any thread.'''
+        with self.lock:
+            self._dirty.add(device)
+
+    def links_changed(self):
+        '''Advances link_generation.  Called on every change that can alter
+        the status of a link: a record written, a user link added, deleted
+        or changed, a group created or a device added or deleted.'''
+        self.link_generation += 1
+
+    def journal(self, device, entry):
+        '''Appends entry, a dict describing a change to device, to the
+        journal and flags device as changed.  See storage.replay_journal
+        for the entries.  Safe to call from any thread, the lock is taken so
+        that the entry is never split from the snapshot it belongs after.'''
+        with self.lock:
+            self.mark_dirty(device)
+            if not self._loading:
+                entry = entry.copy()
+                entry['modem'] = device.plm.dev_addr_str
+                entry['device'] = None
+                if device is not device.plm:
+                    entry['device'] = device.dev_addr_str
+                self._writer.append(json.dumps(entry,
+                                               sort_keys=True,
+                                               ensure_ascii=False))
+
+    def _next_save_time(self):
+        '''Returns the time at which _save_state should next be called'''
+        # The length of the journal is checked every MAX_IDLE_WAIT
+        return min(self._last_saved_time + SNAPSHOT_INTERVAL,
+                   time.time() + MAX_IDLE_WAIT)
+
     def _save_state(self, is_exit=False):
         # Saves the config of the entire core to a file
-        if self._last_saved_time < time.time() - 60 or is_exit:
-            # Save once a minute, on on exit
-            out_data = {'modems': {}}
-            for modem in self._modems:
-                out_data['modems'][modem.dev_addr_str] = self._save_device(modem)
-                out_data['modems'][modem.dev_addr_str]['devices'] = {}
-                for address, device in modem._devices.items():
-                    out_data['modems'][modem.dev_addr_str]['devices'][address] = \
-                        self._save_device(device)
-            try:
-                json_string = json.dumps(out_data,
-                                         sort_keys=True,
-                                         indent=4,
-                                         ensure_ascii=False)
-            except Exception:
-                print('error writing config to file')
-            else:
-                outfile = open(self._config_path, 'w')
-                outfile.write(json_string)
-                outfile.close()
-            self._saved_state = out_data
+        if (self._last_saved_time < time.time() - SNAPSHOT_INTERVAL or
+                self._writer.journal_length > COMPACT_ENTRIES or is_exit):
+            # Save every SNAPSHOT_INTERVAL, when the journal grows long or
+            # on exit, if anything has changed
+            with self.lock:
+                dirty, self._dirty = self._dirty, set()
+                if dirty:
+                    # Submitted under the lock so that the snapshot
+                    # includes every entry journaled before it
+                    self._writer.submit(self._snapshot_state(dirty))
+            if is_exit:
+                self._writer.flush()
             self._last_saved_time = time.time()
 
+    def _snapshot_state(self, dirty):
+        '''Returns a copy of the config of the entire core.  Only the
+        devices in dirty are copied, the prior snapshot of the others is
+        reused.  Must be called while holding the lock.'''
+        out_data = {'modems': {}}
+        saved_devices = {}
+        for modem in self._modems:
+            modem_data = self._snapshot_device(modem, dirty, saved_devices)
+            modem_data = modem_data.copy()
+            modem_data['devices'] = {}
+            for address, device in modem._devices.items():
+                modem_data['devices'][address] = self._snapshot_device(
+                    device, dirty, saved_devices)
+            out_data['modems'][modem.dev_addr_str] = modem_data
+        # Deleted devices are dropped from the cache
+        self._saved_devices = saved_devices
+        return out_data
+
+    def _snapshot_device(self, device, dirty, saved_devices):
+        ret = self._saved_devices.get(device)
+        if ret is None or device in dirty:
+            # Copied so the writer thread never sees later changes
+            ret = copy.deepcopy(self._save_device(device))
+        saved_devices[device] = ret
+        return ret
+
     def _load_state(self):
-        try:
-            with open(self._config_path, 'r') as infile:
-                read_data = infile.read()
-            read_data = json.loads(read_data)
-        except FileNotFoundError:
-            read_data = {}
-        except ValueError:
-            read_data = {}
-            print('unable to read config file, skipping')
+        read_data = self._storage.load()
         if 'modems' in read_data:
             for modem_id, modem_data in read_data['modems'].items():
                 if modem_data['type'] == 'plm':
@@ -158,6 +323,7 @@ class Insteon_Core(object):
     def do_group_callback(self, group):
         '''Causes the group callback to be called. Likely should only be done,
         by the group object.'''
+        self.links_changed()
         for callback in self._group_callbacks:
             callback({group.type: [{
                 'device': group.device.dev_addr_str,
@@ -198,6 +364,8 @@ class Insteon_Core(object):
             ret = Hub(self, **kwargs)
             if ret is not None:
                 self._modems.append(ret)
+                self.links_changed()
+                self.wake()
         return ret
 
     def add_plm(self, **kwargs):
@@ -223,6 +391,8 @@ class Insteon_Core(object):
             print('you need to define a port for this plm')
         if ret is not None:
             self._modems.append(ret)
+            self.links_changed()
+            self.wake()
         return ret
 
     def get_device_by_addr(self, addr):
@@ -249,6 +419,7 @@ class Insteon_Core(object):
         '''Shutdown the core loop thread.'''
         self._exit = True
         self._save_state
+        self.wake()
 
     def add_group_callback(self, callback):
         '''Registers a function to be called when a group is added to any
@@ -261,32 +261,46 @@ class GenericRcvdHandler(object):
             msg_lsb = msg.get_byte_by_name('usr_4')
             if ((req_lsb == msg_lsb and req_msb == msg_msb) or
                     (req_lsb == 0x00 and req_msb == 0x00)):
-                aldb_entry = bytearray([
-                    msg.get_byte_by_name('usr_6'),
-                    msg.get_byte_by_name('usr_7'),
-                    msg.get_byte_by_name('usr_8'),
-                    msg.get_byte_by_name('usr_9'),
-                    msg.get_byte_by_name('usr_10'),
-                    msg.get_byte_by_name('usr_11'),
-                    msg.get_byte_by_name('usr_12'),
-                    msg.get_byte_by_name('usr_13')
-                ])
-                record = self._device.aldb.get_record(
-                    self._device.aldb.get_aldb_key(
-                        msg_msb,
-                        msg_lsb
-                    )
-                )
-                record.edit_record(aldb_entry)
+                self._store_ext_aldb_record(msg)
                 self._device.last_sent_msg.insteon_msg.device_ack = True
+        elif self._device.aldb.stream_handler is not None:
+            self._ext_aldb_streamed(msg)
         else:
             msg.allow_trigger = False
             print('received spurious ext_aldb record')
 
+    def _ext_aldb_streamed(self, msg):
+        '''Stores a record that the device sent unprompted, after being
+        asked to send all of its records'''
+        msg.allow_trigger = False
+        if msg.get_byte_by_name('usr_2') == 0x01:
+            self._store_ext_aldb_record(msg)
+
+    def _store_ext_aldb_record(self, msg):
+        aldb_entry = bytearray([
+            msg.get_byte_by_name('usr_6'),
+            msg.get_byte_by_name('usr_7'),
+            msg.get_byte_by_name('usr_8'),
+            msg.get_byte_by_name('usr_9'),
+            msg.get_byte_by_name('usr_10'),
+            msg.get_byte_by_name('usr_11'),
+            msg.get_byte_by_name('usr_12'),
+            msg.get_byte_by_name('usr_13')
+        ])
+        aldb_key = self._device.aldb.get_aldb_key(
+            msg.get_byte_by_name('usr_3'),
+            msg.get_byte_by_name('usr_4')
+        )
+        record = self._device.aldb.get_record(aldb_key)
+        record.edit_record(aldb_entry)
+        if self._device.aldb.stream_handler is not None:
+            self._device.aldb.stream_handler(aldb_key)
+
     def _ack_set_msb(self, msg):
         '''Returns true if the MSB Byte returned matches what we asked for'''
         if (self._device.last_sent_msg.get_byte_by_name('cmd_2') ==
                 msg.get_byte_by_name('cmd_2')):
+            self._device.aldb.address_msb = msg.get_byte_by_name('cmd_2')
             ret = True
         else:
             ret = False
@@ -296,9 +310,7 @@ class GenericRcvdHandler(object):
         '''Parses out the single ALDB byte and determines the MSB and LSB of the
         Byte.  Calls aldb function to store it'''
         lsb = self._device.last_sent_msg.get_byte_by_name('cmd_2')
-        msb_msg = self._device.search_last_sent_msg(
-            insteon_cmd='set_address_msb')
-        msb = msb_msg.get_byte_by_name('cmd_2')
+        msb = self._device.aldb.address_msb
         byte = msg.get_byte_by_name('cmd_2')
         self._device.aldb.store_peeked_byte(msb, lsb, byte)
         return True  # Is there a scenario in which we return False?
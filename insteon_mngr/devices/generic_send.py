@@ -46,8 +46,10 @@ class GenericSendHandler(BaseSendHandler):
     #
     #################################################################
 
-    def get_status(self):
+    def get_status(self, success=None, failure=None):
         status_sequence = StatusRequest(group=self._device.base_group)
+        status_sequence.add_success_callback(success)
+        status_sequence.add_failure_callback(failure)
         status_sequence.start()
 
     def get_engine_version(self):
@@ -56,11 +58,13 @@ class GenericSendHandler(BaseSendHandler):
     def get_device_version(self):
         self.send_command('id_request')
 
-    def query_aldb(self, success=None, failure=None):
+    def query_aldb(self, success=None, failure=None, incremental=False):
         if self._device.attribute('engine_version') == 0:
-            scan_object = ScanDeviceALDBi1(device=self._device)
+            scan_object = ScanDeviceALDBi1(device=self._device,
+                                           incremental=incremental)
         else:
-            scan_object = ScanDeviceALDBi2(device=self._device)
+            scan_object = ScanDeviceALDBi2(device=self._device,
+                                           incremental=incremental)
         scan_object.add_success_callback(success)
         scan_object.add_failure_callback(failure)
         scan_object.start()
@@ -99,6 +103,17 @@ class GenericSendHandler(BaseSendHandler):
         link_sequence.in_use = False
         return link_sequence
 
+    def write_record(self, key=None, raw=None):
+        '''Returns a sequence which writes the bytes raw to the record at
+        key, it needs to be started'''
+        if self._device.engine_version > 0x00:
+            link_sequence = WriteALDBRecordi2(group=self._device.base_group)
+        else:
+            link_sequence = WriteALDBRecordi1(group=self._device.base_group)
+        link_sequence.key = key
+        link_sequence.raw = raw
+        return link_sequence
+
     #################################################################
     #
     # Message Schema
@@ -1,6 +1,6 @@
 from insteon_mngr.base_objects import BaseSendHandler
 from insteon_mngr.plm_message import PLM_Message
-from insteon_mngr.sequences import WriteALDBRecordModem
+from insteon_mngr.sequences import WriteALDBRecordModem, ReadModemALDB
 
 class ModemSendHandler(BaseSendHandler):
     '''Provides the generic command handling for the Modem.  This is a
@@ -24,8 +24,19 @@ class ModemSendHandler(BaseSendHandler):
         link_sequence.in_use = False
         return link_sequence
 
-    def query_aldb(self, success=None, failure=None):
+    def query_aldb(self, success=None, failure=None, incremental=False):
         '''Queries the PLM for a list of the link records saved on
-        the PLM and stores them in the cache'''
-        self._device.aldb.clear_all_records()
-        self.send_command('all_link_first_rec')
+        the PLM and stores them in the cache.  The PLM is always read in
+        full, incremental is ignored.  Returns a future that resolves once
+        the read is complete, see ReadModemALDB.'''
+        # pylint: disable=W0613
+        # A read already underway is shared
+        reader = self._device.aldb_reader
+        running = reader is not None
+        if not running:
+            reader = ReadModemALDB(modem=self._device)
+        reader.add_success_callback(success)
+        reader.add_failure_callback(failure)
+        if not running:
+            reader.start()
+        return reader.future
@@ -3,13 +3,13 @@ import time
 import threading
 import queue
 
-import requests
-
 from insteon_mngr import BYTE_TO_HEX
 from insteon_mngr.plm import Modem
 
 
 def hub_thread(hub):
+    # Imported here as it is slow to import and only needed by hubs
+    import requests
     prev_end_pos = -1
     last_bytestring = ''
 
@@ -53,6 +53,7 @@ def hub_thread(hub):
                 hex_string = bytestring[-new_length:]
                 hex_data = bytearray.fromhex(hex_string)
                 hub._read_queue.put(bytearray(hex_data))
+                hub.wake()
 
         last_bytestring = bytestring[-10:]
         prev_end_pos = current_end_pos
@@ -144,7 +145,7 @@ class Hub(Modem):
         return self.attribute('password')
 
     def _read_from_port(self):
-        if not self._read_queue.empty():
+        while not self._read_queue.empty():
             self._read_buffer.extend(self._read_queue.get())
 
     def _write_to_port(self, msg):
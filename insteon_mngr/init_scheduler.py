@@ -0,0 +1,147 @@
+'''Staggers the initialization of the devices of a modem.'''
+import time
+
+from insteon_mngr.sequences import InitializeDevice
+
+# The number of devices each modem initializes at once
+MAX_CONCURRENT_INITS = 2
+
+# Seconds before an unfinished initialization is given up on, so that a
+# device which never answers does not hold a slot
+INIT_TIMEOUT = 60
+
+# Devices whose aldb_delta was confirmed within this many seconds are not
+# initialized again at startup
+REVALIDATE_AGE = 6 * 60 * 60
+
+# Waiting devices are initialized in this order, oldest first within each
+INIT_TOUCHED = 0
+INIT_UNKNOWN = 1
+INIT_STALE = 2
+
+
+class InitScheduler(object):
+    '''Runs the InitializeDevice sequence of the devices of a modem in the
+    background, no more than MAX_CONCURRENT_INITS at a time.
+
+    A device loaded from the saved state is usable immediately with its
+    cached values, but is stale until it has been initialized again.
+    Devices with nothing cached are initialized before stale ones, and
+    devices the user sends commands to are moved to the front.  A device
+    which takes longer than INIT_TIMEOUT gives up its slot, but is still
+    no longer stale if it finishes afterwards.
+
+    Must be called with the core lock held, or while the state is being
+    loaded.'''
+
+    def __init__(self, modem):
+        self._modem = modem
+        # Dicts are used as ordered sets of the waiting devices
+        self._waiting = {INIT_TOUCHED: {}, INIT_UNKNOWN: {}, INIT_STALE: {}}
+        self._running = {}
+        # Devices which timed out, whose initialization may still finish
+        self._late = {}
+
+    def __len__(self):
+        '''The number of devices waiting to be initialized'''
+        return sum(len(devices) for devices in self._waiting.values())
+
+    @property
+    def running(self):
+        '''The devices currently being initialized'''
+        return list(self._running)
+
+    def add(self, device):
+        '''Schedules device to be initialized.  Returns False if it was
+        validated recently enough that it does not need to be.'''
+        ret = True
+        if self._is_cached(device):
+            checked = device.attribute('aldb_delta_checked')
+            if checked is not None and time.time() - checked < REVALIDATE_AGE:
+                device.stale = False
+                ret = False
+            else:
+                self._waiting[INIT_STALE][device] = None
+        else:
+            self._waiting[INIT_UNKNOWN][device] = None
+        if ret:
+            self._start_next()
+        return ret
+
+    def touch(self, device):
+        '''Moves device to the front of the line if it is still waiting'''
+        for priority in (INIT_UNKNOWN, INIT_STALE):
+            if device in self._waiting[priority]:
+                del self._waiting[priority][device]
+                self._waiting[INIT_TOUCHED][device] = None
+                break
+
+    def discard(self, device):
+        '''Stops initializing device, used when it is deleted'''
+        for devices in self._waiting.values():
+            devices.pop(device, None)
+        self._late.pop(device, None)
+        timer = self._running.pop(device, None)
+        if timer is not None:
+            self._modem.timers.cancel(timer)
+            self._start_next()
+
+    def _start_next(self):
+        while len(self._running) < MAX_CONCURRENT_INITS:
+            device = self._pop_next()
+            if device is None:
+                break
+            self._running[device] = self._modem.timers.schedule(
+                time.time() + INIT_TIMEOUT,
+                lambda device=device: self._timed_out(device))
+            sequence = InitializeDevice(device=device)
+            sequence.add_success_callback(
+                lambda device=device: self._finished(device, True))
+            sequence.add_failure_callback(
+                lambda device=device: self._finished(device, False))
+            sequence.start()
+
+    def _pop_next(self):
+        ret = None
+        for priority in sorted(self._waiting):
+            devices = self._waiting[priority]
+            if devices:
+                ret = next(iter(devices))
+                del devices[ret]
+                break
+        return ret
+
+    def _timed_out(self, device):
+        '''Frees the slot of device, its initialization is left to finish
+        on its own'''
+        del self._running[device]
+        self._late[device] = None
+        print('timed out initializing', device.dev_addr_str)
+        self._start_next()
+
+    def _finished(self, device, success):
+        timer = self._running.pop(device, None)
+        if timer is not None:
+            self._modem.timers.cancel(timer)
+            self._record(device, success)
+            self._start_next()
+        elif device in self._late:
+            # A late answer, its slot has already been given to another
+            del self._late[device]
+            self._record(device, success)
+        # Otherwise the device has been deleted
+
+    @staticmethod
+    def _record(device, success):
+        if success:
+            device.stale = False
+            device.attribute('aldb_delta_checked', int(time.time()))
+        else:
+            print('unable to initialize', device.dev_addr_str)
+
+    @staticmethod
+    def _is_cached(device):
+        return (device.attribute('engine_version') is not None and
+                device.dev_cat is not None and
+                device.sub_cat is not None and
+                device.firmware is not None)
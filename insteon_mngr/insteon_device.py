@@ -6,7 +6,7 @@ from insteon_mngr.aldb import ALDB
 from insteon_mngr.base_objects import Root, Group
 from insteon_mngr.devices import (GenericRcvdHandler, GenericSendHandler,
                              GenericFunctions, select_classes)
-from insteon_mngr.sequences import InitializeDevice, _ALDBSequence
+from insteon_mngr.sequences import _ALDBSequence
 
 
 class Device_ALDB(ALDB):
@@ -14,6 +14,12 @@ class Device_ALDB(ALDB):
     def __init__(self, parent):
         super().__init__(parent)
         self.aldb_sequence = _ALDBSequence(device=self._device)
+        # Called with the key of each record stored while the device is
+        # streaming its records, see ScanDeviceALDBi2
+        self.stream_handler = None
+        # The MSB of the address the device reads and writes bytes at, as
+        # last acknowledged, see ScanDeviceALDBi1
+        self.address_msb = None
 
     def get_aldb_key(self, msb, lsb):
         offset = 7 - (lsb % 8)
@@ -26,7 +32,7 @@ class Device_ALDB(ALDB):
         if self._device.attribute('engine_version') == 0x00:
             ret['msb'] = msb
             aldb_key = self.get_aldb_key(msb, lsb)
-            if self.aldb[aldb_key].is_empty_aldb():
+            if self.get_record(aldb_key).is_empty_aldb():
                 ret['lsb'] = lsb - (8 + (lsb % 8))
             elif (lsb % 8) == 7: # End of Entry
                 ret['lsb'] = lsb - 15
@@ -71,8 +77,9 @@ class InsteonDevice(Root):
             self._rcvd_handler = GenericRcvdHandler(self)
             self.send_handler = GenericSendHandler(self)
             self.functions = GenericFunctions(self)
-        init_sequence = InitializeDevice(device=self)
-        init_sequence.start()
+        # Cached values are used until the device has been initialized again
+        self._stale = True
+        self.plm.init_scheduler.add(self)
 
     def _load_attributes(self, attributes):
         for name, value in attributes.items():
@@ -96,6 +103,15 @@ class InsteonDevice(Root):
             avg = 3
         return math.ceil(avg)
 
+    @property
+    def stale(self):
+        '''True until the device has been initialized since it was loaded'''
+        return self._stale
+
+    @stale.setter
+    def stale(self, boolean):
+        self._stale = boolean
+
     @property
     def engine_version(self):
         return self.attribute('engine_version')
@@ -135,7 +151,8 @@ class InsteonDevice(Root):
             hop_array = self.attribute('hop_array')
             if hop_array is None:
                 hop_array = []
-            hop_array.append(hops_used)
+            # A new list, so that the attribute is seen to have changed
+            hop_array = hop_array + [hops_used]
             extra_data = len(hop_array) - 10
             if extra_data > 0:
                 hop_array = hop_array[extra_data:]
@@ -152,7 +169,6 @@ class InsteonDevice(Root):
     def _is_duplicate(self, msg):
         '''Checks to see if this is a duplicate message'''
         ret = None
-        self._clear_stale_dupes()
         if self._is_msg_in_recent(msg):
             ret = True
         else:
@@ -160,15 +176,6 @@ class InsteonDevice(Root):
             ret = False
         return ret
 
-    def _clear_stale_dupes(self):
-        current_time = time.time()
-        msgs_to_delete = []
-        for msg, wait_time in self._recent_inc_msgs.items():
-            if wait_time < current_time:
-                msgs_to_delete.append(msg)
-        for msg in msgs_to_delete:
-            del self._recent_inc_msgs[msg]
-
     def _get_search_key(self, msg):
         # Zero out max_hops and hops_left
         # arguable whether this should be done in the Insteon_Message class
@@ -178,7 +185,9 @@ class InsteonDevice(Root):
 
     def _is_msg_in_recent(self, msg):
         search_key = self._get_search_key(msg)
-        if search_key in self._recent_inc_msgs:
+        timer = self._recent_inc_msgs.get(search_key)
+        # The expiry timer may not have fired yet
+        if timer is not None and timer.deadline >= time.time():
             return True
 
     def _store_msg_in_recent(self, msg):
@@ -187,7 +196,9 @@ class InsteonDevice(Root):
         hop_delay = 87 if msg.insteon_msg.msg_length == 'standard' else 183
         total_delay = hop_delay * msg.insteon_msg.hops_left
         expire_time = time.time() + (total_delay / 1000)
-        self._recent_inc_msgs[search_key] = expire_time
+        self.plm.timers.cancel(self._recent_inc_msgs.get(search_key))
+        self._recent_inc_msgs[search_key] = self.plm.timers.schedule(
+            expire_time, lambda: self._recent_inc_msgs.pop(search_key, None))
 
     def remove_cleanup_msgs(self, msg):
         cmd_1 = msg.get_byte_by_name('cmd_1')
@@ -201,6 +212,7 @@ class InsteonDevice(Root):
             i += 1
         for position in reversed(to_delete):
             del self.out_queue[position]
+        self.plm.scheduler.update(self)
 
     ###################################################################
     #
@@ -248,4 +260,9 @@ class InsteonDevice(Root):
     def get_features_and_attributes(self):
         ret = self.get_attributes()
         ret.update(self.functions.get_features())
+        # Whether the values served are still those cached from the state
+        ret['stale'] = self.stale
+        catalog = self.core.device_catalog
+        ret['category'] = catalog.category(self.dev_cat)
+        ret['model'] = catalog.model(self.dev_cat, self.sub_cat)
         return ret
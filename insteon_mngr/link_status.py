@@ -0,0 +1,47 @@
+'''Classifies the status of every ALDB record in the network.'''
+
+
+class LinkStatusEngine(object):
+    '''Works out the status, see ALDBRecord.status(), of every record in
+    every ALDB of the core in a single pass and keeps the results until the
+    network changes.
+
+    The core counts changes in link_generation, see
+    Insteon_Core.links_changed(), which changes of state or of other
+    attributes do not advance.  The statuses are only worked out again once
+    the generation has moved on, so asking for the status of a record is
+    otherwise a dict lookup.'''
+
+    def __init__(self, core):
+        self._core = core
+        self._generation = None
+        self._statuses = {}
+
+    def status(self, record):
+        '''Returns the status of record'''
+        self._refresh()
+        ret = self._statuses.get(record)
+        if ret is None:
+            # Not part of the core, work it out alone
+            ret = record.classify(record.get_defined_link())
+        return ret
+
+    def get_statuses(self):
+        '''Returns a dict of every record in the network and its status'''
+        self._refresh()
+        return self._statuses.copy()
+
+    def _refresh(self):
+        generation = self._core.link_generation
+        if generation == self._generation:
+            return
+        statuses = {}
+        for modem in self._core.get_all_modems():
+            for root in [modem] + modem.get_all_devices():
+                for record in root.aldb.aldb.values():
+                    # The same lookup, through core.user_links, as the
+                    # record uses on its own
+                    statuses[record] = record.classify(
+                        record.get_defined_link())
+        self._statuses = statuses
+        self._generation = generation
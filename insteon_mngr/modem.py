@@ -7,11 +7,14 @@ from insteon_mngr.insteon_device import InsteonDevice
 from insteon_mngr.base_objects import Root, Group
 from insteon_mngr.aldb import ALDB
 from insteon_mngr.trigger import Trigger_Manager
+from insteon_mngr.scheduler import MessageScheduler
+from insteon_mngr.init_scheduler import InitScheduler
+from insteon_mngr.timer import TimerWheel
 from insteon_mngr.plm_message import PLM_Message
 from insteon_mngr.plm_schema import PLM_SCHEMA
 from insteon_mngr.devices import ModemSendHandler
 from insteon_mngr.modem_rcvd import ModemRcvdHandler
-from insteon_mngr.sequences import WriteALDBRecordModem
+from insteon_mngr.sequences import WriteALDBRecordModem, CompactALDBs
 
 
 class Modem_ALDB(ALDB):
@@ -29,33 +32,58 @@ class Modem_ALDB(ALDB):
                                            parsed_record['dev_addr_mid'],
                                            parsed_record['dev_addr_low']))
 
+    def add_records(self, records):
+        '''Appends records, a list of the raw bytes of each record in the
+        order they were read from the modem.  Each linked device is added
+        once, rather than once for every record linking to it.'''
+        addresses = {}
+        position = 1
+        if self._highest is not None:
+            position = self._highest + 1
+        for raw in records:
+            self._add_slot(position, raw)
+            self._journal_record(self._position_to_key(position), raw)
+            addresses[bytes(raw[2:5])] = None
+            position += 1
+        for address in addresses:
+            self._device.add_device(BYTE_TO_ID(*address))
+
     def get_first_empty_addr(self):
         return self._get_next_position()
 
     def _get_next_position(self):
-        position = 0
-        records = self.get_all_records()
-        for key in records.keys():
-            if int(key) > position:
-                position = int(key)
-        position += 1
-        position = str(position).zfill(4)
-        return position
+        position = 1
+        if self._highest is not None:
+            position = self._highest + 1
+        return self._position_to_key(position)
 
     def have_aldb_cache(self):
         # TODO This will return false for an empty aldb as well, do we care?
         ret = True
-        if len(self.aldb) == 0:
+        if len(self) == 0:
             ret = False
         return ret
 
+    def _key_to_position(self, key):
+        '''The records of a modem are numbered in the order they are read,
+        the keys are decimal'''
+        return int(key)
+
+    def _position_to_key(self, position):
+        return str(position).zfill(4)
+
 
 class Modem(Root):
 
     def __init__(self, core, **kwargs):
         self._devices = {}
         self.aldb = Modem_ALDB(self)
+        self.timers = TimerWheel()
         self.trigger_mngr = Trigger_Manager(self)
+        self.scheduler = MessageScheduler()
+        self.init_scheduler = InitScheduler(self)
+        # The ReadModemALDB reading the ALDB, if one is
+        self.aldb_reader = None
         super().__init__(core, self, **kwargs)
         self._rcvd_handler = ModemRcvdHandler(self)
         self.send_handler = ModemSendHandler(self)
@@ -66,6 +94,8 @@ class Modem(Root):
         self._last_sent_msg = None
         self._msg_queue = []
         self._wait_to_send = 0
+        self._wait_timer = None
+        self._ack_timer = None
         self.port_active = True
         self.ack_time = 75
         self.attribute('base_group_number', 0x01)
@@ -104,6 +134,14 @@ class Modem(Root):
         self.ack_time = milliseconds
         return
 
+    def compact_aldbs(self):
+        '''Compacts the ALDB of every device of the modem in the background,
+        so that scanning them reads fewer records.  Returns the sequence,
+        which has already been started.'''
+        ret = CompactALDBs(modem=self)
+        ret.start()
+        return ret
+
     @property
     def type(self):
         return self.attribute('type')
@@ -115,6 +153,8 @@ class Modem(Root):
                                                      self,
                                                      device_id=device_id,
                                                      **kwargs)
+            self._devices[device_id].journal({'op': 'add_device'})
+            self.core.links_changed()
         return self._devices[device_id]
 
     def delete_device(self, device_id):
@@ -124,6 +164,13 @@ class Modem(Root):
             device = self.core.get_device_by_addr(device_id)
             for group in device.get_all_groups():
                 group.do_delete_callback()
+            self.scheduler.discard(device)
+            self.init_scheduler.discard(device)
+            for user_link in device.get_all_user_links().values():
+                self.core.user_links.remove(user_link)
+            device.aldb.detach()
+            device.journal({'op': 'delete_device'})
+            self.core.links_changed()
             del self._devices[device_id]
 
     def port(self):
@@ -138,6 +185,10 @@ class Modem(Root):
         if self._wait_to_send < time.time():
             self._wait_to_send = time.time()
         self._wait_to_send += value
+        # Wake up to send any queued messages once the wait is over
+        self.timers.cancel(self._wait_timer)
+        self._wait_timer = self.timers.schedule(self._wait_to_send,
+                                                self.wake)
 
     def get_device_by_addr(self, addr):
         ret = None
@@ -176,59 +227,114 @@ class Modem(Root):
 
     def process_input(self):
         '''Called by the core loop. Reads available bytes from PLM, then parses
-        the bytes into a message.  Do not call directly.'''
+        the bytes into messages.  Do not call directly.'''
         self._read_from_port()
-        self._advance_to_msg_start()
-        read_bytes = self._parse_read_buffer()
-        if read_bytes:
-            self._process_inc_msg(read_bytes)
+        while True:
+            self._advance_to_msg_start()
+            buffer_length = len(self._read_buffer)
+            read_bytes = self._parse_read_buffer()
+            if read_bytes:
+                self._process_inc_msg(read_bytes)
+            elif len(self._read_buffer) == buffer_length:
+                # Nothing left but a partial message
+                break
+
+    def process_timers(self):
+        '''Called by the core loop. Schedules the ack timer for the last sent
+        message and fires any timers that are due.  Do not call directly.'''
+        self._update_ack_timer()
+        self.timers.advance()
+
+    def _update_ack_timer(self):
+        '''Keeps the ack timer in step with the ack deadline of the last
+        sent message, which moves as the message is acked.'''
+        deadline = None
+        if self._is_ack_pending():
+            deadline = self._ack_deadline(self._last_sent_msg)
+        if (self._ack_timer is not None and
+                self._ack_timer.deadline != deadline):
+            self.timers.cancel(self._ack_timer)
+            self._ack_timer = None
+        if deadline is not None and self._ack_timer is None:
+            self._ack_timer = self.timers.schedule(deadline,
+                                                   self._ack_timer_expired)
+
+    def _ack_timer_expired(self):
+        self._ack_timer = None
+        self.process_unacked_msg()
+        # The next message may now be sent
+        self.wake()
 
     def process_unacked_msg(self):
-        '''Called by the core loop. Checks for unacked messages and queues them
-        for resending.  Do not call directly.'''
+        '''Called by the ack timer. Checks for unacked messages and queues
+        them for resending.  Do not call directly.'''
         if self._is_ack_pending():
             msg = self._last_sent_msg
         else:
             return
         now = datetime.datetime.now().strftime("%M:%S.%f")
-        # allow 75 milliseconds for the PLM to ack a message
-        if msg.plm_ack is False:
-            if msg.time_due < time.time() - (self.ack_time / 1000):
-                print(now, 'PLM failed to ack the last message')
-                if msg.plm_retry >= 3:
-                    print(now, 'PLM retries exceeded, abandoning this message')
-                    msg.failed = True
-                else:
-                    msg.plm_retry += 1
-                    self._resend_failed_msg()
-            return
-        if msg.seq_lock:
-            if msg.time_sent < time.time() - msg.seq_time:
-                print(now, 'PLM sequence lock expired, moving on')
-                msg.seq_lock = False
+        if time.time() <= self._ack_deadline(msg):
             return
-        if msg.insteon_msg and msg.insteon_msg.device_ack is False:
-            total_hops = msg.insteon_msg.max_hops * 2
-            hop_delay = 75 if msg.insteon_msg.msg_length == 'standard' else 200
-            # Increase delay on each subsequent retry
-            hop_delay = (msg.insteon_msg.device_retry + 1) * hop_delay
-            # Add 1 additional second based on trial and error, perhaps
-            # to allow device to 'think'
-            total_delay = (total_hops * hop_delay / 1000) + 1
-            if msg.time_plm_ack < time.time() - total_delay:
+        if msg.plm_ack is False:
+            print(now, 'PLM failed to ack the last message')
+            if msg.plm_retry >= 3:
+                print(now, 'PLM retries exceeded, abandoning this message')
+                msg.failed = True
+            else:
+                msg.plm_retry += 1
+                self._resend_failed_msg()
+        elif msg.seq_lock:
+            print(now, 'PLM sequence lock expired, moving on')
+            msg.seq_lock = False
+        elif msg.insteon_msg and msg.insteon_msg.device_ack is False:
+            print(
+                now,
+                'device failed to ack a message, total delay =',
+                self._device_ack_delay(msg), 'total hops=',
+                msg.insteon_msg.max_hops * 2)
+            if msg.insteon_msg.device_retry >= 3:
                 print(
                     now,
-                    'device failed to ack a message, total delay =',
-                    total_delay, 'total hops=', total_hops)
-                if msg.insteon_msg.device_retry >= 3:
-                    print(
-                        now,
-                        'device retries exceeded, abandoning this message')
-                    msg.failed = True
-                else:
-                    msg.insteon_msg.device_retry += 1
-                    self._resend_failed_msg()
-            return
+                    'device retries exceeded, abandoning this message')
+                msg.failed = True
+            else:
+                msg.insteon_msg.device_retry += 1
+                self._resend_failed_msg()
+
+    def _ack_deadline(self, msg):
+        '''Returns the time after which the pending ack of msg is considered
+        to have failed.'''
+        if msg.plm_ack is False:
+            # allow ack_time milliseconds for the PLM to ack a message
+            ret = msg.time_due + (self.ack_time / 1000)
+        elif msg.seq_lock:
+            ret = msg.time_sent + msg.seq_time
+        else:
+            ret = msg.time_plm_ack + self._device_ack_delay(msg)
+        return ret
+
+    def _device_ack_delay(self, msg):
+        '''Returns the number of seconds to wait for a device to ack msg
+        after the PLM has acked it.'''
+        total_hops = msg.insteon_msg.max_hops * 2
+        hop_delay = 75 if msg.insteon_msg.msg_length == 'standard' else 200
+        # Increase delay on each subsequent retry
+        hop_delay = (msg.insteon_msg.device_retry + 1) * hop_delay
+        # Add 1 additional second based on trial and error, perhaps
+        # to allow device to 'think'
+        return (total_hops * hop_delay / 1000) + 1
+
+    def next_deadline(self):
+        '''Returns the time at which this modem next needs to be processed
+        or None if there is nothing to do until new input arrives or a new
+        message is queued.  Used by the core loop to decide how long it
+        can sleep.'''
+        return self.timers.next_deadline()
+
+    def wake(self):
+        '''Wakes the loop processing this modem.  Called whenever new bytes
+        arrive from the port or a message is queued.'''
+        self.core.wake(self)
 
     def process_queue(self):
         '''Called by the core loop. Determines and sends the next message.
@@ -239,24 +345,11 @@ class Modem(Root):
             send_msg = None
             if self._last_sent_msg:
                 last_device = self._last_sent_msg.device
-            if (last_device is not None and
-                    len(last_device.out_queue) > 0):
-                send_msg = last_device.out_queue.pop(0)
-            else:
-                devices = [self, ]
-                msg_time = 0
-                sending_device = None
-                for device in self._devices.values():
-                    devices.append(device)
-                for device in devices:
-                    if len(device.out_queue) > 0:
-                        dev_msg_time = device.out_queue[0].creation_time
-                        if dev_msg_time and (msg_time == 0 or
-                                             dev_msg_time < msg_time):
-                            sending_device = device
-                            msg_time = dev_msg_time
-                if sending_device is not None:
+            sending_device = self.scheduler.next_device(last_device)
+            if sending_device is not None:
+                if len(sending_device.out_queue) > 0:
                     send_msg = sending_device.out_queue.pop(0)
+                self.scheduler.update(sending_device)
             if send_msg is not None:
                 if send_msg.insteon_msg:
                     device = send_msg.device
@@ -337,7 +430,6 @@ class Modem(Root):
         msg = PLM_Message(self, raw_data=raw_msg, is_incomming=True)
         self._msg_dispatcher(msg)
         self.trigger_mngr.test_triggers(msg)
-        # TODO clean up expired triggers?
 
     def _msg_dispatcher(self, msg):
         if msg.plm_resp_ack:
@@ -361,6 +453,17 @@ class Modem(Root):
         elif 'recv_act' in msg.plm_schema:
             msg.plm_schema['recv_act'](self, msg)
 
+    def send_immediately(self, msg):
+        '''Sends msg now if the modem is free to send, otherwise puts it
+        first in the queue of the modem.  Used to keep a run of messages,
+        such as reading the ALDB, going without waiting for their turn.'''
+        if not self._is_ack_pending() and time.time() > self.wait_to_send:
+            self._send_msg(msg)
+        else:
+            self.out_queue.insert(0, msg)
+            self.scheduler.update(self)
+            self.wake()
+
     def _send_msg(self, msg):
         self._last_sent_msg = msg
         self._write(msg)
@@ -439,6 +542,7 @@ class ModemGroup(Group):
 
     def set_state(self, state):
         commands = self._state_commands()
+        message = None
         try:
             message = commands[state.upper()]
         except KeyError:
@@ -457,7 +561,9 @@ class ModemGroup(Group):
             wait_time = (len(records) + 1) * (87 / 1000 * 18)
             message.seq_time = wait_time
             message.extra_ack_time = wait_time
+            message.state_group = self
             self.device.plm.queue_device_msg(message)
+        return message
 
     def get_features(self):
         '''Returns the intrinsic parameters of a device, these are not user
@@ -86,8 +86,11 @@ class ModemRcvdHandler(object):
                 self._device._last_sent_msg.plm_prelim_ack is True):
             self._device._last_sent_msg.plm_ack = True
             self._device._last_sent_msg.time_plm_ack = time.time()
-            self._device.aldb.add_record(msg.raw_msg[2:])
-            self._device.send_command('all_link_next_rec')
+            if self._device.aldb_reader is not None:
+                self._device.aldb_reader.record_received(msg.raw_msg[2:])
+            else:
+                self._device.aldb.add_record(msg.raw_msg[2:])
+                self._device.send_command('all_link_next_rec')
         else:
             msg.allow_trigger = False
             print('received spurious plm aldb record')
@@ -96,6 +99,8 @@ class ModemRcvdHandler(object):
         # pylint: disable=W0613
         self._device._last_sent_msg.plm_ack = True
         print('reached the end of the PLMs ALDB')
+        if self._device.aldb_reader is not None:
+            self._device.aldb_reader.end_received()
         # Reassign the PLM ALDB keys, they are not permanent
         for link in self._device.get_all_user_links().values():
             if link._adoptable_responder_key() is not None:
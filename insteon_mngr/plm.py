@@ -1,14 +1,34 @@
+import threading
+import queue
+
 import serial
 
 from insteon_mngr.modem import Modem
 
 
+def plm_thread(plm):
+    '''Blocks on the serial port and hands any bytes read to the PLM, waking
+    the core loop so that incoming messages are processed immediately.'''
+    while threading.main_thread().is_alive() and plm.port_active:
+        try:
+            # Timeout on the port allows us to notice the main thread exiting
+            data = plm._serial.read(max(1, plm._serial.in_waiting))
+        except serial.serialutil.SerialException:
+            print('lost connection to port', plm.port)
+            plm.port_active = False
+        else:
+            if data:
+                plm._read_queue.put(data)
+                plm.wake()
+
+
 class PLM(Modem):
 
     def __init__(self, core, **kwargs):
-        super().__init__(core, self, **kwargs)
+        super().__init__(core, **kwargs)
         self.set_ack_time(75)
         self.attribute('type', 'plm')
+        self._read_queue = queue.Queue()
         port = ''
         if 'attributes' in kwargs:
             port = kwargs['attributes']['port']
@@ -24,11 +44,13 @@ class PLM(Modem):
                 parity=serial.PARITY_NONE,
                 stopbits=serial.STOPBITS_ONE,
                 bytesize=serial.EIGHTBITS,
-                timeout=0
+                timeout=1
             )
         except serial.serialutil.SerialException:
             print('unable to connect to port', port)
             self.port_active = False
+        else:
+            threading.Thread(target=plm_thread, args=[self]).start()
         self._setup()
 
     @property
@@ -36,10 +58,9 @@ class PLM(Modem):
         return self.attribute('port')
 
     def _read_from_port(self):
-        '''Reads bytes from PLM and loads them into a buffer'''
-        if self.port_active:
-            while self._serial.inWaiting() > 0:
-                self._read_buffer.extend(self._serial.read())
+        '''Moves the bytes read by the plm_thread into the buffer'''
+        while not self._read_queue.empty():
+            self._read_buffer.extend(self._read_queue.get())
 
     def _write_to_port(self, msg):
         self._serial.write(msg)
@@ -23,6 +23,8 @@ class PLM_Message(object):
         self._insteon_msg = None
         self._insteon_attr = {}
         self._creation_time = time.time()
+        self._priority = None
+        self._state_group = None
         self._time_sent = 0
         self._plm_success_callback = lambda: None
         self._msg_failed_callback = lambda: None
@@ -46,6 +48,26 @@ class PLM_Message(object):
     def creation_time(self):
         return self._creation_time
 
+    @property
+    def priority(self):
+        '''The priority class used to schedule the message, if None the
+        class is derived from the command.'''
+        return self._priority
+
+    @priority.setter
+    def priority(self, value):
+        self._priority = value
+
+    @property
+    def state_group(self):
+        '''The group whose state this message sets.  A pending message for
+        the same group is dropped when a newer one is queued.'''
+        return self._state_group
+
+    @state_group.setter
+    def state_group(self, value):
+        self._state_group = value
+
     @property
     def time_sent(self):
         return self._time_sent
@@ -306,3 +328,22 @@ class PLM_Message(object):
     @msg_failure_callback.setter
     def msg_failure_callback(self, value):
         self._msg_failed_callback = value
+
+    def inherit_callbacks(self, message):
+        '''Chains the callbacks of message, which this message supersedes,
+        so that they run when this message succeeds or fails'''
+        self.plm_success_callback = self._chain(
+            message.plm_success_callback, self.plm_success_callback)
+        self.msg_failure_callback = self._chain(
+            message.msg_failure_callback, self.msg_failure_callback)
+        if self.insteon_msg and message.insteon_msg:
+            self.insteon_msg.device_success_callback = self._chain(
+                message.insteon_msg.device_success_callback,
+                self.insteon_msg.device_success_callback)
+
+    @staticmethod
+    def _chain(first, second):
+        def chained():
+            first()
+            second()
+        return chained
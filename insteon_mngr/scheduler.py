@@ -0,0 +1,128 @@
+'''The scheduler used by a modem to select the next message to send.'''
+import heapq
+import itertools
+import threading
+
+# Priority classes, lower values are sent first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_STATUS = 1
+PRIORITY_BACKGROUND = 2
+
+# Seconds added to the creation time of a message to rank it.  A message
+# waiting longer than the difference between two classes outranks newly
+# queued messages of the more important class, so no class is starved.
+PRIORITY_DELAY = {
+    PRIORITY_INTERACTIVE: 0,
+    PRIORITY_STATUS: 2,
+    PRIORITY_BACKGROUND: 10,
+}
+
+STATUS_COMMANDS = (
+    'light_status_request', 'get_engine_version', 'id_request',
+    'product_data_request', 'plm_info'
+)
+
+BACKGROUND_COMMANDS = (
+    'read_aldb', 'write_aldb', 'peek_one_byte', 'poke_one_byte',
+    'set_address_msb', 'enter_link_mode', 'all_link_start',
+    'all_link_first_rec', 'all_link_next_rec', 'all_link_manage_rec'
+)
+
+
+def message_priority(msg):
+    '''Returns the priority class of the message.  Uses the priority set on
+    the message if there is one, otherwise derives it from the command.'''
+    ret = msg.priority
+    if ret is None:
+        if msg.insteon_msg:
+            command = msg.insteon_msg.device_cmd_name
+        else:
+            command = msg.plm_cmd_type
+        ret = PRIORITY_INTERACTIVE
+        if command in STATUS_COMMANDS:
+            ret = PRIORITY_STATUS
+        elif command in BACKGROUND_COMMANDS:
+            ret = PRIORITY_BACKGROUND
+    return ret
+
+
+class MessageScheduler(object):
+    '''Tracks the devices of a modem that have messages waiting to be sent.
+    Each device is ranked by the first message in its out_queue, messages
+    within a device are always sent in order.  Devices are kept in a heap
+    so selecting the next device is O(log n).
+
+    update() must be called whenever the first message in the out_queue of
+    a device may have changed.  Replaced heap entries are not removed, they
+    are skipped when they reach the top of the heap.'''
+
+    def __init__(self):
+        self._heap = []
+        self._entries = {}
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def update(self, device):
+        '''Reranks device based on the first message in its out_queue'''
+        with self._lock:
+            if len(device.out_queue) > 0:
+                rank = self._rank(device.out_queue[0])
+                entry = self._entries.get(device)
+                if entry is None or entry[0] != rank:
+                    entry = (rank, next(self._counter))
+                    self._entries[device] = entry
+                    heapq.heappush(self._heap, entry + (device,))
+            else:
+                self._entries.pop(device, None)
+
+    def discard(self, device):
+        '''Stops scheduling any messages from device'''
+        with self._lock:
+            self._entries.pop(device, None)
+
+    def has_messages(self):
+        '''Returns True if any device has a message waiting'''
+        return len(self._entries) > 0
+
+    def next_device(self, last_device=None):
+        '''Returns the device whose message should be sent next or None.
+        The last_device, the device the previous message was sent to, is
+        kept if its next message is in the same priority class as the best
+        message waiting, so that sequences of messages are not interleaved
+        with other devices unnecessarily.'''
+        with self._lock:
+            best = self._peek()
+            ret = None
+            if best is not None:
+                ret = best[2]
+            if (last_device is not None and last_device is not ret and
+                    last_device in self._entries and
+                    len(last_device.out_queue) > 0):
+                if (best is None or
+                        self._entries[last_device][0] <= best[0] or
+                        self._same_class(last_device, best[2])):
+                    ret = last_device
+            return ret
+
+    def _peek(self):
+        '''Returns the best current heap entry, discarding replaced ones'''
+        ret = None
+        while self._heap:
+            rank, count, device = self._heap[0]
+            if self._entries.get(device) == (rank, count):
+                ret = self._heap[0]
+                break
+            heapq.heappop(self._heap)
+        return ret
+
+    @staticmethod
+    def _same_class(device, other_device):
+        ret = False
+        if len(other_device.out_queue) > 0:
+            ret = (message_priority(device.out_queue[0]) ==
+                   message_priority(other_device.out_queue[0]))
+        return ret
+
+    @staticmethod
+    def _rank(msg):
+        return msg.creation_time + PRIORITY_DELAY[message_priority(msg)]
@@ -2,6 +2,8 @@ from insteon_mngr.sequences.i1_device import ScanDeviceALDBi1, WriteALDBRecordi1
 from insteon_mngr.sequences.i2_device import ScanDeviceALDBi2, WriteALDBRecordi2
 from insteon_mngr.sequences.common import (StatusRequest, WriteALDBRecord,
     SetALDBDelta, AddPLMtoDevice, InitializeDevice)
-from insteon_mngr.sequences.modem import WriteALDBRecordModem
+from insteon_mngr.sequences.modem import WriteALDBRecordModem, ReadModemALDB
 from insteon_mngr.sequences.link_management import DeleteLinkPair
 from insteon_mngr.sequences.aldb import _ALDBSequence
+from insteon_mngr.sequences.compaction import (CompactDeviceALDB,
+    CompactALDBs)
@@ -3,19 +3,24 @@
 from insteon_mngr.sequences.common import (BaseSequence, SetALDBDelta,
     StatusRequest)
 from insteon_mngr.sequences.i1_device import WriteALDBRecordi1, _WriteMSBi1
+from insteon_mngr.sequences.write_planner import ALDBWritePlanner
 
 class _ALDBSequence(BaseSequence):
     '''This is a specialized sequence that queues and manages all aldb sequences
     for a device.  Only one of these sequences should exist for each device
     which is automatically created and stored in the device aldb object. You
-    should not need to ever interact directly with this class.'''
+    should not need to ever interact directly with this class.
+
+    Before each step the sequences still queued are planned again by
+    ALDBWritePlanner, which drops, merges and orders them.  Sequences whose
+    condition no longer holds, see WriteALDBRecord.condition, fail
+    without being written.'''
     def __init__(self, device=None):
         super().__init__()
         self._device = device
         self._queue = []
         self._running = False
         self._failure = False
-        self._msb = 0x00
 
     def add_sequence(self, sequence):
         '''Appends an aldb link sequnce onto the queue'''
@@ -28,16 +33,29 @@ class _ALDBSequence(BaseSequence):
             self._startup()
 
     def _msb_set(self, msb):
-        self._msb = msb
+        self._device.aldb.address_msb = msb
         self._step_complete()
 
     def _step_complete(self):
+        msb = self._device.aldb.address_msb
+        planner = ALDBWritePlanner(self._device.aldb)
+        finished = True
+        while finished:
+            for sequence in self._queue[:]:
+                if not sequence.is_writable():
+                    # Only this sequence fails, the rest are still written
+                    self._queue.remove(sequence)
+                    sequence._on_failure()
+            self._queue, finished = planner.plan(self._queue, msb)
+            for sequence in finished:
+                # Nothing needs to be written, which may queue more
+                sequence._on_success()
         if len(self._queue) == 0:
             self._finish()
         else:
             next_seq = self._queue[0]
             if (isinstance(next_seq, WriteALDBRecordi1) and
-                    next_seq.msb != self._msb):
+                    next_seq.msb != msb):
                 next_msb = next_seq.msb
                 sequence = _WriteMSBi1(device=self._device)
                 sequence.msb = next_msb
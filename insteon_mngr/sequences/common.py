@@ -46,6 +46,74 @@ class BaseSequence(object):
         return NotImplemented
 
 
+# What an incremental rescan does after reading a record, see ALDBRescan
+RESCAN_CONTINUE = 0
+RESCAN_DONE = 1
+RESCAN_FULL = 2
+
+
+class ALDBRescan(object):
+    '''Decides how much of a device ALDB has to be read again after its
+    aldb_delta changed, by comparing what is read against the cache.
+
+    Devices store a new link in the first record that is not in use, or at
+    the highwater mark if there is none.  The rescan therefore starts at the
+    first empty record in the cache and reads on from there.  Once a changed
+    record has been read the rescan continues past every other empty record
+    in the cache and the cached highwater mark, as more than one link may
+    have been added, and ends at the first unchanged record after them, or
+    at the highwater mark.  If the first record read is unchanged the change
+    is somewhere else in the database and the whole of it has to be read.'''
+    def __init__(self, aldb):
+        self._aldb = aldb
+        self._cached = aldb.get_all_records()
+        self._changed = False
+        # The positions of the empty records in the cache down to, and
+        # including, the highwater mark
+        highwater = None
+        for key, raw in self._cached.items():
+            if not raw[0] & 0b00000010:
+                position = int(key, 16)
+                if highwater is None or position > highwater:
+                    highwater = position
+        self._holes = [int(key, 16) for key, raw in self._cached.items()
+                       if not raw[0] & 0b10000000 and
+                       (highwater is None or int(key, 16) >= highwater)]
+        self.start_key = None
+        if len(self._cached) > 0:
+            self.start_key = aldb.get_first_empty_addr()
+
+    @property
+    def possible(self):
+        '''Returns true if there is a cache to compare against'''
+        return self.start_key is not None
+
+    def record_read(self, key):
+        '''Called once the record at key has been read, returns one of
+        RESCAN_CONTINUE, RESCAN_DONE or RESCAN_FULL'''
+        record = self._aldb.get_record(key)
+        if record.raw != self._cached.get(key):
+            self._changed = True
+            if record.is_last_aldb():
+                ret = RESCAN_DONE
+            else:
+                ret = RESCAN_CONTINUE
+        elif not self._changed:
+            ret = RESCAN_FULL
+        elif record.is_last_aldb() or not self._holes_below(key):
+            ret = RESCAN_DONE
+        else:
+            ret = RESCAN_CONTINUE
+        return ret
+
+    def _holes_below(self, key):
+        '''Returns true if an empty record in the cache, or the cached
+        highwater mark, is still to be read.  Records are read down from the
+        highest address.'''
+        position = int(key, 16)
+        return any(hole < position for hole in self._holes)
+
+
 class StatusRequest(BaseSequence):
     '''Used to request the status of a device.  The neither cmd_1 nor cmd_2 of the
     return message can be predicted so we just hope it is the next direct_ack that
@@ -78,7 +146,8 @@ class StatusRequest(BaseSequence):
         if self._group.device.attribute('aldb_delta') != aldb_delta:
             print('aldb has changed, rescanning')
             self._group.device.query_aldb(success=self._on_success,
-                                          failure=self._on_failure)
+                                          failure=self._on_failure,
+                                          incremental=True)
         else:
             self._on_success()
 
@@ -109,6 +178,8 @@ class WriteALDBRecord(BaseSequence):
         self._d3 = None
         self._address = None
         self._in_use = True
+        self._raw = None
+        self._condition = None
 
     @property
     def in_use(self):
@@ -170,6 +241,36 @@ class WriteALDBRecord(BaseSequence):
     def data3(self, byte):
         self._d3 = byte
 
+    @property
+    def raw(self):
+        '''The bytes of the record to write.  If set they are written as
+        they are, rather than built from the other attributes, which is used
+        to copy a record.  Defaults to None.'''
+        return self._raw
+
+    @raw.setter
+    def raw(self, raw):
+        self._raw = bytes(raw)
+
+    @property
+    def condition(self):
+        '''A function called once it is the turn of this sequence to be
+        written, after the status of the device has been checked.  The
+        record is only written if it returns true, otherwise the sequence
+        fails.  Defaults to None, always write.'''
+        return self._condition
+
+    @condition.setter
+    def condition(self, function):
+        self._condition = function
+
+    def is_writable(self):
+        '''Returns false if the condition of the sequence no longer holds'''
+        ret = True
+        if self._condition is not None:
+            ret = self._condition()
+        return ret
+
     @property
     def key(self):
         # pylint: disable=E1305
@@ -205,12 +306,33 @@ class WriteALDBRecord(BaseSequence):
     def msb(self):
         return self.address[0]
 
+    def record_bytes(self):
+        '''Returns the bytes of the record that this sequence writes'''
+        record = self._record_attributes()
+        return bytes([record['link_flags'],
+                      record['group'],
+                      record['dev_addr_hi'],
+                      record['dev_addr_mid'],
+                      record['dev_addr_low'],
+                      record['data_1'],
+                      record['data_2'],
+                      record['data_3']])
+
     def _compiled_record(self):
         msg_attributes = {
             'msb': self.address[0],
             'lsb': self.address[1]
         }
-        if not self.in_use:
+        msg_attributes.update(self._record_attributes())
+        return msg_attributes
+
+    def _record_attributes(self):
+        msg_attributes = {}
+        if self._raw is not None:
+            names = ('link_flags', 'group', 'dev_addr_hi', 'dev_addr_mid',
+                     'dev_addr_low', 'data_1', 'data_2', 'data_3')
+            msg_attributes = dict(zip(names, self._raw))
+        elif not self.in_use:
             msg_attributes['link_flags'] = 0x02
             msg_attributes['group'] = 0x00
             msg_attributes['data_1'] = 0x00
@@ -243,7 +365,7 @@ class WriteALDBRecord(BaseSequence):
 
     def start(self):
         '''Starts the sequence to write the aldb record'''
-        if self.linked_group is None and self.in_use:
+        if self.linked_group is None and self.in_use and self._raw is None:
             print('error no linked_group defined')
         else:
             self._group.device.aldb.aldb_sequence.add_sequence(self)
@@ -307,7 +429,8 @@ class AddPLMtoDevice(BaseSequence):
     def _add_plm_to_dev_link_step4(self):
         print('plm->device link created')
         self._device.query_aldb(success=self._on_success,
-                                failure=self._on_failure)
+                                failure=self._on_failure,
+                                incremental=True)
 
     def _add_plm_to_dev_link_fail(self):
         print('Error, unable to create plm->device link')
@@ -344,10 +467,14 @@ class InitializeDevice(BaseSequence):
             }
             trigger = InsteonTrigger(device=self._device,
                                      attributes=trigger_attributes)
-            trigger.trigger_function = lambda: self._device.send_handler.get_status()
+            trigger.trigger_function = lambda: self._init_step_3()
             trigger.name = self._device.dev_addr_str + 'init_step_2'
             trigger.queue()
             self._device.send_handler.get_device_version()
         else:
-            # TODO this is really only necessary to check aldb delta
-            self._device.send_handler.get_status()
+            self._init_step_3()
+
+    def _init_step_3(self):
+        # TODO this is really only necessary to check aldb delta
+        self._device.send_handler.get_status(success=self._on_success,
+                                             failure=self._on_failure)
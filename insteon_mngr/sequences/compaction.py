@@ -0,0 +1,193 @@
+'''Contains the classes used to compact the ALDB of devices.'''
+import time
+
+from insteon_mngr.sequences.common import BaseSequence
+
+# Seconds waited after each write of a compaction, so that compacting does
+# not crowd out the other traffic to the device
+COMPACTION_WRITE_INTERVAL = 5
+
+
+class ALDBCompactionPlan(object):
+    '''The writes needed to compact the ALDB of a device.
+
+    Deleted records are not in use but are still read by every scan, as a
+    scan only stops at the highwater mark.  The plan moves the lowest
+    records in use up into the deleted records above them, then writes the
+    highwater mark just below the last record in use, so that the records
+    past it are no longer read.
+
+    moves is a list of (from key, to key) tuples, in the order to make
+    them.  highwater is the key to write the highwater mark at, or None if
+    the highwater mark is already in place.'''
+
+    def __init__(self, aldb):
+        self.highwater = None
+        records = []
+        for key, raw in sorted(aldb.get_all_records().items(),
+                               key=lambda item: int(item[0], 16),
+                               reverse=True):
+            if not raw[0] & 0b00000010:
+                # The highwater mark, the device reads no further
+                break
+            records.append((key, bool(raw[0] & 0b10000000)))
+        in_use = [key for key, used in records if used]
+        # The records in use end up in the highest len(in_use) records
+        targets = [key for key, used in records[:len(in_use)]]
+        holes = [key for key, used in records[:len(in_use)] if not used]
+        sources = [key for key in in_use if key not in targets]
+        self.moves = list(zip(sources, holes))
+        if len(records) > len(in_use):
+            self.highwater = records[len(in_use)][0]
+
+    @property
+    def is_needed(self):
+        '''Returns true if there is anything to write'''
+        return len(self.moves) > 0 or self.highwater is not None
+
+
+class CompactDeviceALDB(BaseSequence):
+    '''Compacts the ALDB of a device, see ALDBCompactionPlan.
+
+    The records are written one at a time, COMPACTION_WRITE_INTERVAL
+    seconds apart, through the aldb_sequence of the device like any other
+    write.  Once a record has been copied the user_links which used it are
+    changed to the copy.  The records left below the highwater mark are
+    then removed from the cache.
+
+    The status of the device is checked before the plan is made, which
+    rescans the ALDB if it has changed since it was cached.  Devices put a
+    new link into the first record not in use, which the plan would
+    otherwise write over.  Each write is also given a condition, see
+    WriteALDBRecord.condition, so the record is checked again once the
+    write comes up, after the write queue has checked the status.  If a
+    record has been changed by something else in the meantime the
+    compaction stops, and fails, rather than overwrite it.'''
+    def __init__(self, device=None):
+        super().__init__()
+        self._device = device
+        self._plan = None
+        self._moves = []
+        self._moved = {}
+
+    @property
+    def plan(self):
+        '''The ALDBCompactionPlan being carried out, None until started'''
+        return self._plan
+
+    def start(self):
+        self._device.send_handler.get_status(success=self._make_plan,
+                                             failure=self._on_failure)
+
+    def _make_plan(self):
+        self._plan = ALDBCompactionPlan(self._device.aldb)
+        self._moves = list(self._plan.moves)
+        self._next_write()
+
+    def _next_write(self):
+        aldb = self._device.aldb
+        if len(self._moves) > 0:
+            source, target = self._moves.pop(0)
+            raw = aldb.get_record(source).raw
+            if aldb.get_record(source).is_empty_aldb():
+                print('aldb changed, unable to compact',
+                      self._device.dev_addr_str)
+                self._on_failure()
+            elif self._can_move(source, target, raw):
+                self._moved[source] = raw
+                self._write(target, raw,
+                            lambda: self._record_moved(source, target),
+                            lambda: self._can_move(source, target, raw))
+            else:
+                self._on_failure()
+        elif self._plan.highwater is not None:
+            if not self._is_highwater_safe():
+                self._on_failure()
+            else:
+                # Only the flags byte has to change
+                raw = bytearray(aldb.get_record(self._plan.highwater).raw)
+                raw[0] = 0x00
+                self._write(self._plan.highwater, raw,
+                            self._highwater_written,
+                            self._is_highwater_safe)
+        else:
+            self._on_success()
+
+    def _write(self, key, raw, callback, condition):
+        sequence = self._device.send_handler.write_record(key=key, raw=raw)
+        sequence.condition = condition
+        sequence.add_success_callback(callback)
+        sequence.add_failure_callback(self._on_failure)
+        sequence.start()
+
+    def _wait(self):
+        self._device.plm.timers.schedule(
+            time.time() + COMPACTION_WRITE_INTERVAL, self._next_write)
+
+    def _record_moved(self, source, target):
+        for user_link in self._device.get_all_user_links().values():
+            if user_link.responder_key == source:
+                user_link.set_responder_key(target)
+        core = self._device.core
+        links = core.get_user_links_for_this_controller_device(self._device)
+        for user_link in links.values():
+            if user_link.controller_key == source:
+                user_link.set_controller_key(target)
+        self._wait()
+
+    def _can_move(self, source, target, raw):
+        '''Returns true if target is still not in use and source still
+        holds raw'''
+        aldb = self._device.aldb
+        ret = (aldb.get_record(target).is_empty_aldb() and
+               aldb.get_record(source).raw == raw)
+        if not ret:
+            print('aldb changed, unable to compact',
+                  self._device.dev_addr_str)
+        return ret
+
+    def _is_highwater_safe(self):
+        '''Returns true if the only records in use past the highwater mark
+        are unchanged records which have been moved'''
+        ret = True
+        position = int(self._plan.highwater, 16)
+        for key, raw in self._device.aldb.get_all_records().items():
+            if (int(key, 16) <= position and raw[0] & 0b10000000 and
+                    self._moved.get(key) != raw):
+                print('aldb changed, unable to compact',
+                      self._device.dev_addr_str)
+                ret = False
+                break
+        return ret
+
+    def _highwater_written(self):
+        self._device.aldb.truncate(self._plan.highwater)
+        self._on_success()
+
+
+class CompactALDBs(BaseSequence):
+    '''Compacts the ALDB of each device of a modem in turn, skipping those
+    which do not need it.  A device which fails is left as it is and the
+    next device is compacted.  Succeeds once every device has been tried.'''
+    def __init__(self, modem=None):
+        super().__init__()
+        self._modem = modem
+        self._devices = []
+
+    def start(self):
+        self._devices = self._modem.get_all_devices()
+        self._next_device()
+
+    def _next_device(self):
+        device = None
+        while len(self._devices) > 0 and device is None:
+            device = self._devices.pop(0)
+            if not ALDBCompactionPlan(device.aldb).is_needed:
+                device = None
+        if device is None:
+            self._on_success()
+        else:
+            sequence = CompactDeviceALDB(device=device)
+            sequence.add_success_callback(self._next_device)
+            sequence.add_failure_callback(self._next_device)
+            sequence.start()
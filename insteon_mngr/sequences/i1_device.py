@@ -1,15 +1,58 @@
 from insteon_mngr.trigger import InsteonTrigger
-from insteon_mngr.sequences.common import SetALDBDelta, BaseSequence, WriteALDBRecord
+from insteon_mngr.sequences.common import (SetALDBDelta, BaseSequence,
+                                           WriteALDBRecord, ALDBRescan,
+                                           RESCAN_CONTINUE, RESCAN_DONE,
+                                           RESCAN_FULL)
 
 
 class ScanDeviceALDBi1(BaseSequence):
-    def __init__(self, device=None):
+    '''Sequence object used for scanning the All link database of an i1
+    device one byte at a time.  If incremental is true only the records
+    which may have changed since the cache was filled are read, see
+    ALDBRescan.
+
+    The link flags of each record are read first, the rest of a record
+    which is not in use is skipped and the scan ends at the highwater mark.
+    The address being read is tracked here, and the MSB is only sent to the
+    device when it changes.'''
+    def __init__(self, device=None, incremental=False):
         super().__init__()
         self._device = device
+        self._rescan = None
+        if incremental:
+            self._rescan = ALDBRescan(device.aldb)
+        self._msb = None
+        self._lsb = None
+        self._records_read = 0
+        self._peeks_sent = 0
+        self._progress_callback = []
+
+    def add_progress_callback(self, callback):
+        '''Add a callback to be called after each record is read, with
+        the number of records and of bytes read so far'''
+        if callback is not None:
+            self._progress_callback.append(callback)
 
     def start(self):
+        if self._rescan is not None and self._rescan.possible:
+            key = self._rescan.start_key
+            # i1 records are read from their lowest byte
+            self._read_byte(int(key[:2], 16), int(key[2:], 16) - 0x07)
+        else:
+            self._full_scan()
+
+    def _full_scan(self):
+        self._rescan = None
         self._device.aldb.clear_all_records()
-        self._i1_start_aldb_entry_query(0x0F, 0xF8)
+        self._read_byte(0x0F, 0xF8)
+
+    def _read_byte(self, msb, lsb):
+        self._lsb = lsb
+        if msb == self._device.aldb.address_msb:
+            self._send_peek_request(lsb)
+        else:
+            self._i1_start_aldb_entry_query(msb, lsb)
+        self._msb = msb
 
     def _i1_start_aldb_entry_query(self, msb, lsb):
         trigger_attributes = {'cmd_2': msb}
@@ -24,28 +67,38 @@ class ScanDeviceALDBi1(BaseSequence):
         self._device.queue_device_msg(message)
 
     def _get_byte_address(self):
-        lsb = self._device.last_sent_msg.get_byte_by_name('cmd_2')
-        msb_msg = self._device.search_last_sent_msg(
-            insteon_cmd='set_address_msb')
-        msb = msb_msg.get_byte_by_name('cmd_2')
-        aldb_key = self._device.aldb.get_aldb_key(msb, lsb)
-        # TODO is this right?  Don't we need to wait until the end of the record?
-        if self._device.aldb.get_record(aldb_key).is_last_aldb():
-            self._device.aldb.print_records()
-            aldb_sequence = SetALDBDelta(group=self._device.base_group)
-            aldb_sequence.add_success_callback(lambda: self._on_success())
-            aldb_sequence.add_failure_callback(lambda: self._on_failure())
-            aldb_sequence.start()
+        aldb_key = self._device.aldb.get_aldb_key(self._msb, self._lsb)
+        record = self._device.aldb.get_record(aldb_key)
+        offset = self._lsb % 8
+        if offset == 0 and record.is_last_aldb():
+            self._record_read(aldb_key, True)
+        elif offset == 7 or (offset == 0 and record.is_empty_aldb()):
+            self._record_read(aldb_key, False)
         else:
-            dev_bytes = self._device.aldb.get_next_aldb_address(msb, lsb)
-            send_handler = self._device.send_handler
-            if msb != dev_bytes['msb']:
-                send_handler.i1_start_aldb_entry_query(dev_bytes['msb'],
-                                                       dev_bytes['lsb'])
-            else:
-                self._send_peek_request(dev_bytes['lsb'])
+            self._read_byte(self._msb, self._lsb + 1)
+
+    def _record_read(self, aldb_key, last):
+        self._device.aldb.record_bytes_stored()
+        self._records_read += 1
+        for callback in self._progress_callback:
+            callback(self._records_read, self._peeks_sent)
+        result = RESCAN_DONE if last else RESCAN_CONTINUE
+        if self._rescan is not None:
+            result = self._rescan.record_read(aldb_key)
+        if result == RESCAN_DONE:
+            self._finish()
+        elif result == RESCAN_FULL:
+            print('aldb changed elsewhere, reading all of it')
+            self._full_scan()
+        elif self._lsb >= 0x08:
+            self._read_byte(self._msb, self._lsb - (self._lsb % 8) - 0x08)
+        elif self._msb > 0x00:
+            self._read_byte(self._msb - 1, 0xF8)
+        else:
+            self._finish()
 
     def _send_peek_request(self, lsb):
+        self._peeks_sent += 1
         trigger = InsteonTrigger(device=self._device,
                                  command_name='peek_one_byte')
         trigger.trigger_function = lambda: self._get_byte_address()
@@ -55,6 +108,15 @@ class ScanDeviceALDBi1(BaseSequence):
         message.insert_bytes_into_raw({'lsb': lsb})
         self._device.queue_device_msg(message)
 
+    def _finish(self):
+        print('read', self._records_read, 'aldb records with',
+              self._peeks_sent, 'peeks')
+        self._device.aldb.print_records()
+        aldb_sequence = SetALDBDelta(group=self._device.base_group)
+        aldb_sequence.add_success_callback(lambda: self._on_success())
+        aldb_sequence.add_failure_callback(lambda: self._on_failure())
+        aldb_sequence.start()
+
 class _WriteMSBi1(BaseSequence):
     def __init__(self, device=None):
         super().__init__()
@@ -144,16 +206,7 @@ class WriteALDBRecordi1(WriteALDBRecord):
         self._on_failure()
 
     def _write_complete(self):
-        aldb_entry = bytearray([
-            self._compiled_record()['link_flags'],
-            self._compiled_record()['group'],
-            self._compiled_record()['dev_addr_hi'],
-            self._compiled_record()['dev_addr_mid'],
-            self._compiled_record()['dev_addr_low'],
-            self._compiled_record()['data_1'],
-            self._compiled_record()['data_2'],
-            self._compiled_record()['data_3']
-        ])
+        aldb_entry = self.record_bytes()
         record = self._group.device.aldb.get_record(
             self._group.device.aldb.get_aldb_key(
                 self.address[0],
@@ -1,16 +1,54 @@
+import time
+
 from insteon_mngr.trigger import InsteonTrigger
-from insteon_mngr.sequences.common import SetALDBDelta, BaseSequence, WriteALDBRecord
+from insteon_mngr.sequences.common import (SetALDBDelta, BaseSequence,
+                                           WriteALDBRecord, ALDBRescan,
+                                           RESCAN_DONE, RESCAN_FULL)
+
+# The first record of a device ALDB, records are read down from here
+FIRST_RECORD = 0x0FFF
+
+# Once a streamed record has not arrived for this many seconds, the
+# records still missing are requested one at a time
+STREAM_IDLE_TIMEOUT = 3
 
 
 class ScanDeviceALDBi2(BaseSequence):
     '''Sequence object used for scanning the All link database of an i2
-    device'''
-    def __init__(self, device=None):
+    device.  If incremental is true only the records which may have changed
+    since the cache was filled are read, see ALDBRescan.
+
+    If bulk is true a full scan asks the device to stream every record
+    back, rather than requesting each record in turn.  Records lost in the
+    stream, or the whole stream if the device does not support it, are then
+    requested one at a time.'''
+    def __init__(self, device=None, incremental=False, bulk=True):
         super().__init__()
         self._device = device
+        self._rescan = None
+        if incremental:
+            self._rescan = ALDBRescan(device.aldb)
+        self._bulk = bulk
+        self._streamed = set()
+        self._highwater = None
+        self._missing = []
+        self._idle_timer = None
 
     def start(self):
+        if self._rescan is not None and self._rescan.possible:
+            key = self._rescan.start_key
+            self._request_record({'msb': int(key[:2], 16),
+                                  'lsb': int(key[2:], 16)},
+                                 self._i2_rescan_aldb)
+        else:
+            self._full_scan()
+
+    def _full_scan(self):
+        self._rescan = None
         self._device.aldb.clear_all_records()
+        if self._bulk:
+            self._bulk_scan()
+            return
         dev_bytes = {'msb': 0x00, 'lsb': 0x00}
         message = self._device.create_message('read_aldb')
         message.insert_bytes_into_raw(dev_bytes)
@@ -31,26 +69,105 @@ class ScanDeviceALDBi2(BaseSequence):
         lsb = self._device.last_rcvd_msg.get_byte_by_name('usr_4')
         aldb_key = self._device.aldb.get_aldb_key(msb, lsb)
         if self._device.aldb.get_record(aldb_key).is_last_aldb():
-            self._device.aldb.print_records()
-            aldb_sequence = SetALDBDelta(group=self._device.base_group)
-            aldb_sequence.add_success_callback(lambda: self._on_success())
-            aldb_sequence.add_failure_callback(lambda: self._on_failure())
-            aldb_sequence.start()
+            self._finish()
         else:
             dev_bytes = self._device.aldb.get_next_aldb_address(msb, lsb)
-            self._device.send_handler.i2_get_aldb(dev_bytes)
-            trigger_attributes = {
-                'usr_3': dev_bytes['msb'],
-                'usr_4': dev_bytes['lsb'],
-                'msg_type': 'direct'
-            }
-            # pylint: disable=W0108
-            trigger = InsteonTrigger(device=self._device,
-                                     command_name='read_aldb',
-                                     attributes=trigger_attributes)
-            trigger.trigger_function = lambda: self._i2_next_aldb()
-            trigger.name = self._device.dev_addr_str + 'query_aldb'
-            trigger.queue()
+            self._request_record(dev_bytes, self._i2_next_aldb)
+
+    def _i2_rescan_aldb(self):
+        msb = self._device.last_rcvd_msg.get_byte_by_name('usr_3')
+        lsb = self._device.last_rcvd_msg.get_byte_by_name('usr_4')
+        result = self._rescan.record_read(
+            self._device.aldb.get_aldb_key(msb, lsb))
+        if result == RESCAN_DONE:
+            self._finish()
+        elif result == RESCAN_FULL:
+            print('aldb changed elsewhere, reading all of it')
+            self._full_scan()
+        else:
+            dev_bytes = self._device.aldb.get_next_aldb_address(msb, lsb)
+            self._request_record(dev_bytes, self._i2_rescan_aldb)
+
+    def _bulk_scan(self):
+        self._device.aldb.stream_handler = self._record_streamed
+        message = self._device.create_message('read_aldb')
+        message.insert_bytes_into_raw({'msb': 0x00,
+                                       'lsb': 0x00,
+                                       'num_records': 0x00})
+        self._device.queue_device_msg(message)
+        self._reset_idle_timer()
+
+    def _reset_idle_timer(self):
+        timers = self._device.plm.timers
+        timers.cancel(self._idle_timer)
+        self._idle_timer = timers.schedule(time.time() + STREAM_IDLE_TIMEOUT,
+                                           self._stream_ended)
+
+    def _record_streamed(self, key):
+        position = int(key, 16)
+        self._streamed.add(position)
+        if self._device.aldb.get_record(key).is_last_aldb():
+            self._highwater = position
+            self._stream_ended()
+        else:
+            self._reset_idle_timer()
+
+    def _stream_ended(self):
+        if self._device.aldb.stream_handler is None:
+            return
+        self._device.aldb.stream_handler = None
+        self._device.plm.timers.cancel(self._idle_timer)
+        self._idle_timer = None
+        lowest = self._highwater
+        if lowest is None and self._streamed:
+            lowest = min(self._streamed)
+        if lowest is not None:
+            self._missing = [position
+                             for position in range(FIRST_RECORD, lowest, -8)
+                             if position not in self._streamed]
+        if self._missing:
+            print('missed', len(self._missing), 'streamed records')
+        self._request_missing()
+
+    def _request_missing(self):
+        if self._missing:
+            position = self._missing.pop(0)
+            self._request_record({'msb': position >> 8,
+                                  'lsb': position & 0xFF},
+                                 self._request_missing)
+        elif self._highwater is not None:
+            self._finish()
+        else:
+            # The end of the database was never streamed, read on from the
+            # lowest record received
+            position = FIRST_RECORD
+            if self._streamed:
+                position = min(self._streamed) - 8
+            self._request_record({'msb': position >> 8,
+                                  'lsb': position & 0xFF},
+                                 self._i2_next_aldb)
+
+    def _request_record(self, dev_bytes, callback):
+        self._device.send_handler.i2_get_aldb(dev_bytes)
+        trigger_attributes = {
+            'usr_3': dev_bytes['msb'],
+            'usr_4': dev_bytes['lsb'],
+            'msg_type': 'direct'
+        }
+        # pylint: disable=W0108
+        trigger = InsteonTrigger(device=self._device,
+                                 command_name='read_aldb',
+                                 attributes=trigger_attributes)
+        trigger.trigger_function = lambda: callback()
+        trigger.name = self._device.dev_addr_str + 'query_aldb'
+        trigger.queue()
+
+    def _finish(self):
+        self._device.aldb.print_records()
+        aldb_sequence = SetALDBDelta(group=self._device.base_group)
+        aldb_sequence.add_success_callback(lambda: self._on_success())
+        aldb_sequence.add_failure_callback(lambda: self._on_failure())
+        aldb_sequence.start()
 
 
 class WriteALDBRecordi2(WriteALDBRecord):
@@ -73,16 +190,7 @@ class WriteALDBRecordi2(WriteALDBRecord):
         self._group.device.queue_device_msg(msg)
 
     def _save_record(self):
-        aldb_entry = bytearray([
-            self._compiled_record()['link_flags'],
-            self._compiled_record()['group'],
-            self._compiled_record()['dev_addr_hi'],
-            self._compiled_record()['dev_addr_mid'],
-            self._compiled_record()['dev_addr_low'],
-            self._compiled_record()['data_1'],
-            self._compiled_record()['data_2'],
-            self._compiled_record()['data_3']
-        ])
+        aldb_entry = self.record_bytes()
         record = self._group.device.aldb.get_record(
             self._group.device.aldb.get_aldb_key(
                 self.address[0],
@@ -1,5 +1,59 @@
+from concurrent.futures import Future
+
 from insteon_mngr.trigger import PLMTrigger
-from insteon_mngr.sequences.common import WriteALDBRecord
+from insteon_mngr.sequences.common import BaseSequence, WriteALDBRecord
+
+
+class ReadModemALDB(BaseSequence):
+    '''Reads every record in the ALDB of a modem.  Each all_link_next_rec
+    is sent as soon as the previous record arrives, ahead of anything
+    queued, and the records are only added to the cache once all of them
+    have been read.
+
+    start() returns a concurrent.futures.Future, also available as future,
+    which resolves to True once the whole ALDB has been read or to False
+    if the read fails.'''
+    def __init__(self, modem=None):
+        super().__init__()
+        self._modem = modem
+        self._records = []
+        self.future = Future()
+
+    def start(self):
+        self._modem.aldb_reader = self
+        self._send('all_link_first_rec')
+        return self.future
+
+    def record_received(self, raw):
+        '''Called by the modem with each record as it arrives'''
+        self._records.append(bytes(raw))
+        self._send('all_link_next_rec')
+
+    def end_received(self):
+        '''Called by the modem once it has no more records'''
+        self._modem.aldb_reader = None
+        self._modem.aldb.clear_all_records()
+        self._modem.aldb.add_records(self._records)
+        print('read', len(self._records), 'records from the modem')
+        self._on_success()
+
+    def _send(self, command):
+        message = self._modem.create_message(command)
+        message.msg_failure_callback = self._send_failed
+        self._modem.send_immediately(message)
+
+    def _send_failed(self):
+        self._modem.aldb_reader = None
+        print('unable to read the aldb of the modem')
+        self._on_failure()
+
+    def _on_success(self):
+        self.future.set_result(True)
+        super()._on_success()
+
+    def _on_failure(self):
+        self.future.set_result(False)
+        super()._on_failure()
 
 
 class WriteALDBRecordModem(WriteALDBRecord):
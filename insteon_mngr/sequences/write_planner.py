@@ -0,0 +1,106 @@
+'''Contains the ALDBWritePlanner class.'''
+
+
+class ALDBWritePlanner(object):
+    '''Plans the pending record writes and deletes of a device, see
+    WriteALDBRecord, so that they take as few messages as possible.
+
+    A write whose record already holds the same bytes, or a delete of a
+    record that is not in use, is not sent at all.  A new record which
+    matches a record already on the device adopts it.  Other new records
+    are written over records being deleted, which then need no write of
+    their own, then into the empty records below the highwater mark, and
+    only then past it.  The writes are grouped by MSB, so that i1 devices
+    only need to be sent each MSB once.'''
+
+    def __init__(self, aldb):
+        self._aldb = aldb
+
+    def plan(self, sequences, msb=None):
+        '''Returns a tuple of the sequences that still need to run, in the
+        order to run them, and the sequences that are not needed.  The
+        caller should call _on_success() of the latter.  msb is the MSB the
+        device is currently set to, if known.'''
+        needed = []
+        finished = []
+        new_records = []
+        for sequence in sequences:
+            if sequence.key is None and sequence.in_use:
+                new_records.append(sequence)
+            elif self._is_written(sequence):
+                finished.append(sequence)
+            else:
+                needed.append(sequence)
+        reserved = set(sequence.key for sequence in needed)
+        unplaced = []
+        for sequence in new_records:
+            key = self._adoptable_key(sequence, reserved)
+            if key is None:
+                unplaced.append(sequence)
+            else:
+                sequence.key = key
+                reserved.add(key)
+                finished.append(sequence)
+        self._place(unplaced, needed, reserved)
+        needed.extend(unplaced)
+        # Stable, so writes to the same record stay in order
+        needed.sort(key=lambda sequence: self._order(sequence, msb))
+        return needed, finished
+
+    @staticmethod
+    def _order(sequence, msb):
+        ret = (True, 0)
+        if sequence.key is not None:
+            ret = (sequence.msb != msb, -sequence.msb)
+        return ret
+
+    def _is_written(self, sequence):
+        '''Returns true if the device already holds what sequence would
+        write'''
+        ret = False
+        record = self._aldb.peek_record(sequence.key)
+        if record is not None:
+            if sequence.in_use:
+                ret = record.raw == sequence.record_bytes()
+            else:
+                ret = record.is_empty_aldb()
+        return ret
+
+    def _adoptable_key(self, sequence, reserved):
+        '''Returns the key of a record on the device that already holds the
+        new record written by sequence, or None'''
+        ret = None
+        raw = sequence.record_bytes()
+        attributes = {
+            'link_flags': raw[0],
+            'group': raw[1],
+            'dev_addr_hi': raw[2],
+            'dev_addr_mid': raw[3],
+            'dev_addr_low': raw[4],
+            'data_1': raw[5],
+            'data_2': raw[6],
+            'data_3': raw[7]
+        }
+        for record in self._aldb.get_matching_records(attributes):
+            if record.key not in reserved:
+                ret = record.key
+                break
+        return ret
+
+    def _place(self, sequences, needed, reserved):
+        '''Chooses the keys that the new records of sequences are written
+        to'''
+        deletes = [sequence for sequence in needed
+                   if not sequence.in_use]
+        empty = self._aldb.get_empty_addrs(len(sequences) + len(reserved))
+        empty = [key for key in empty if key not in reserved]
+        for sequence in sequences:
+            if deletes:
+                # Writing the new record deletes the old one
+                delete = deletes.pop(0)
+                needed.remove(delete)
+                sequence.key = delete.key
+                sequence.add_success_callback(delete._on_success)
+                sequence.add_failure_callback(delete._on_failure)
+            elif empty:
+                sequence.key = empty.pop(0)
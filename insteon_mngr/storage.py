@@ -0,0 +1,764 @@
+'''Persistence of the core state to disk'''
+import json
+import os
+import sqlite3
+import struct
+import tempfile
+import threading
+
+ALDB_MAGIC = b'ALDB\x01'
+# Modem address, device address and the number of records that follow
+ALDB_DEVICE_HEADER = struct.Struct('>3s3sI')
+# Position followed by the 8 record bytes
+ALDB_RECORD = struct.Struct('>H8s')
+
+
+def _find_link(links, entry):
+    '''Returns the list holding the user link described by entry and the
+    index of the link in it, the index is None if the link is not there'''
+    group_links = links.setdefault(entry['controller'], {}).setdefault(
+        str(entry['group']), [])
+    index = None
+    for position, data in enumerate(group_links):
+        if (data['data_1'] == entry['data']['data_1'] and
+                data['data_2'] == entry['data']['data_2'] and
+                data['data_3'] == entry['data']['data_3']):
+            index = position
+            break
+    return group_links, index
+
+
+def _group_values(entry):
+    '''Returns the attributes set by a group_attr entry, which holds either
+    a name and value or a dict of values'''
+    ret = entry.get('values')
+    if ret is None:
+        ret = {entry['name']: entry['value']}
+    return ret
+
+
+def _position_to_key(position, is_modem):
+    # Modems number their records, devices use the memory address
+    if is_modem:
+        ret = str(position).zfill(4)
+    else:
+        ret = '{:04X}'.format(position)
+    return ret
+
+
+def _key_to_position(key, is_modem):
+    if is_modem:
+        ret = int(key)
+    else:
+        ret = int(key, 16)
+    return ret
+
+
+def pack_aldb(modem_id, device_id, aldb):
+    '''Returns the records of a device, a dict of hex strings keyed by
+    position, packed into the binary ALDB format'''
+    is_modem = modem_id == device_id
+    ret = bytearray(ALDB_DEVICE_HEADER.pack(bytes.fromhex(modem_id),
+                                            bytes.fromhex(device_id),
+                                            len(aldb)))
+    for key, raw in aldb.items():
+        if isinstance(raw, str):
+            raw = bytes.fromhex(raw)
+        ret.extend(ALDB_RECORD.pack(_key_to_position(key, is_modem), raw))
+    return ret
+
+
+def unpack_aldb(buffer):
+    '''Returns the records in buffer, which must start with ALDB_MAGIC, as
+    a dict keyed by (modem_id, device_id) of dicts keyed by position.  The
+    records are views into buffer, nothing is copied.'''
+    ret = {}
+    view = memoryview(buffer)
+    offset = len(ALDB_MAGIC)
+    while offset + ALDB_DEVICE_HEADER.size <= len(view):
+        modem, device, count = ALDB_DEVICE_HEADER.unpack_from(view, offset)
+        offset += ALDB_DEVICE_HEADER.size
+        modem_id = modem.hex().upper()
+        device_id = device.hex().upper()
+        is_modem = modem_id == device_id
+        records = {}
+        for _ in range(count):
+            position = int.from_bytes(view[offset:offset + 2], 'big')
+            key = _position_to_key(position, is_modem)
+            records[key] = view[offset + 2:offset + ALDB_RECORD.size]
+            offset += ALDB_RECORD.size
+        ret[(modem_id, device_id)] = records
+    return ret
+
+
+def replay_journal(data, entries):
+    '''Applies the journal entries to data, a state loaded from the config
+    file.  Each entry sets a value, so replaying an entry that is already
+    part of data changes nothing.'''
+    modems = data.setdefault('modems', {})
+    for entry in entries:
+        if entry['op'] == 'rename_modem':
+            if entry['old'] in modems:
+                modems[entry['modem']] = modems.pop(entry['old'])
+            continue
+        modem = modems.setdefault(entry['modem'], {})
+        devices = modem.setdefault('devices', {})
+        if entry['op'] == 'delete_device':
+            devices.pop(entry['device'], None)
+            continue
+        if entry['device'] is None:
+            target = modem
+        else:
+            target = devices.setdefault(entry['device'], {})
+        _replay_entry(target, entry)
+    return data
+
+
+def _replay_entry(target, entry):
+    '''Applies entry to target, the data of the device it names'''
+    if entry['op'] == 'attr':
+        target[entry['name']] = entry['value']
+    elif entry['op'] == 'group_attr':
+        groups = target.setdefault('groups', {})
+        group = groups.setdefault(str(entry['group']), {})
+        group.update(_group_values(entry))
+    elif entry['op'] == 'aldb':
+        target.setdefault('aldb', {})[entry['key']] = entry['raw']
+    elif entry['op'] == 'clear_aldb':
+        target['aldb'] = {}
+    elif entry['op'] == 'link':
+        group_links, index = _find_link(
+            target.setdefault('user_links', {}), entry)
+        if index is None:
+            group_links.append(entry['data'])
+        else:
+            group_links[index] = entry['data']
+    elif entry['op'] == 'delete_link':
+        group_links, index = _find_link(
+            target.setdefault('user_links', {}), entry)
+        if index is not None:
+            del group_links[index]
+    # 'add_device' needs nothing more than creating the device
+
+
+class JSONStorage(object):
+    '''Stores the state of the core as a json file, plus a journal of the
+    changes made since the file was written.  The journal holds one json
+    entry per line and is only ever appended to, until the state is saved
+    again.  Files are replaced atomically, so a crash while saving leaves
+    the prior files intact.'''
+
+    def __init__(self, path):
+        self._path = path
+        self._journal_path = os.path.splitext(path)[0] + '.journal'
+        # The ALDB records are kept separately in a packed binary file
+        self._aldb_path = os.path.splitext(path)[0] + '.aldb'
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def journal_path(self):
+        return self._journal_path
+
+    @property
+    def aldb_path(self):
+        return self._aldb_path
+
+    def load(self):
+        '''Returns the saved state with the journal replayed on top of it,
+        or an empty dict if there is none'''
+        try:
+            with open(self._path, 'r') as infile:
+                read_data = infile.read()
+            ret = json.loads(read_data)
+        except FileNotFoundError:
+            ret = {}
+        except ValueError:
+            ret = {}
+            print('unable to read config file, skipping')
+        self._attach_aldb(ret)
+        entries = self._read_journal()
+        if entries:
+            replay_journal(ret, entries)
+        return ret
+
+    def _attach_aldb(self, data):
+        '''Adds the records in the ALDB file to the devices in data.  The file
+        is read straight into a bytearray, so each record is a writable view
+        into it which the ALDB copies into its own buffer as it is loaded.'''
+        try:
+            with open(self._aldb_path, 'rb') as infile:
+                contents = bytearray(os.fstat(infile.fileno()).st_size)
+                infile.readinto(contents)
+        except FileNotFoundError:
+            return
+        if contents[:len(ALDB_MAGIC)] != ALDB_MAGIC:
+            if contents:
+                print('unable to read aldb file, skipping')
+            return
+        aldbs = unpack_aldb(contents)
+        for modem_id, modem in data.get('modems', {}).items():
+            targets = [(modem_id, modem)]
+            targets.extend(modem.get('devices', {}).items())
+            for device_id, device in targets:
+                # Records still in the json were saved by an older version
+                if (modem_id, device_id) in aldbs and 'aldb' not in device:
+                    device['aldb'] = aldbs[(modem_id, device_id)]
+
+    def _split_aldb(self, data):
+        '''Returns a copy of data without the ALDB records, and the records
+        packed into the binary format'''
+        ret = dict(data)
+        packed = bytearray(ALDB_MAGIC)
+        if 'modems' in data:
+            ret['modems'] = {}
+            for modem_id, modem in data['modems'].items():
+                modem = self._without_aldb(modem_id, modem_id, modem, packed)
+                if 'devices' in modem:
+                    modem['devices'] = {
+                        device_id: self._without_aldb(modem_id, device_id,
+                                                      device, packed)
+                        for device_id, device in modem['devices'].items()}
+                ret['modems'][modem_id] = modem
+        return ret, packed
+
+    @staticmethod
+    def _without_aldb(modem_id, device_id, device, packed):
+        ret = device.copy()
+        if 'aldb' not in ret:
+            return ret
+        try:
+            packed.extend(pack_aldb(modem_id, device_id, ret['aldb']))
+        except (ValueError, struct.error):
+            # Left in the json if it can not be packed
+            print('unable to pack aldb of', device_id)
+        else:
+            ret.pop('aldb', None)
+        return ret
+
+    def _read_journal(self):
+        ret = []
+        try:
+            with open(self._journal_path, 'r', encoding='utf-8') as infile:
+                for line in infile:
+                    try:
+                        ret.append(json.loads(line))
+                    except ValueError:
+                        # A partial line left by a crash while appending
+                        print('skipping unreadable journal entry')
+        except FileNotFoundError:
+            pass
+        return ret
+
+    def save(self, data, journal_lines=()):
+        '''Writes data to a temporary file in the same directory, then
+        renames it over the config file.  The journal is then replaced with
+        journal_lines, the entries that are not yet part of data.'''
+        try:
+            data, packed_aldb = self._split_aldb(data)
+            json_string = json.dumps(data,
+                                     sort_keys=True,
+                                     indent=4,
+                                     ensure_ascii=False)
+        except Exception:
+            print('error writing config to file')
+            return
+        # The journal still covers both files until it is replaced, so
+        # stopping between them loses nothing
+        if (self._replace(self._aldb_path, packed_aldb) and
+                self._replace(self._path, json_string)):
+            self._replace(self._journal_path,
+                          ''.join(line + '\n' for line in journal_lines))
+
+    def append(self, journal_lines):
+        '''Appends journal_lines to the journal and waits for them to reach
+        the disk'''
+        try:
+            with open(self._journal_path, 'a', encoding='utf-8') as outfile:
+                for line in journal_lines:
+                    outfile.write(line + '\n')
+                outfile.flush()
+                os.fsync(outfile.fileno())
+        except OSError as error:
+            print('error writing journal to file', error)
+
+    def _replace(self, path, contents):
+        '''Atomically replaces the file at path with contents, a string or
+        bytes, returns True on success'''
+        ret = False
+        directory = os.path.dirname(os.path.abspath(path))
+        handle, temp_path = tempfile.mkstemp(dir=directory,
+                                             prefix='.config-',
+                                             suffix='.tmp')
+        if isinstance(contents, str):
+            contents = contents.encode('utf-8')
+        try:
+            with os.fdopen(handle, 'wb') as outfile:
+                outfile.write(contents)
+                outfile.flush()
+                os.fsync(outfile.fileno())
+            os.replace(temp_path, path)
+            ret = True
+        except OSError as error:
+            print('error writing config to file', error)
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+        return ret
+
+
+class StorageWriter(object):
+    '''Writes journal entries and snapshots handed to it by the core on a
+    background thread, so that serializing and writing the state never
+    delays the modems.  Only the most recent snapshot is written, older
+    ones still waiting are skipped.'''
+
+    def __init__(self, storage):
+        self._storage = storage
+        self._pending = None
+        self._pending_seq = 0
+        self._new_lines = []
+        # Lines in the journal file, kept so that the journal can be
+        # rewritten without the entries covered by a snapshot
+        self._journal = []
+        self._seq = 0
+        self._writing = False
+        self._condition = threading.Condition()
+        thread = threading.Thread(target=self._writer_loop)
+        # The core saves on exit by calling flush() from an atexit handler,
+        # by then non daemon threads have already been joined
+        thread.daemon = True
+        thread.start()
+
+    @property
+    def journal_length(self):
+        '''The number of entries in the journal, including those not yet
+        written'''
+        with self._condition:
+            return len(self._journal) + len(self._new_lines)
+
+    def append(self, line):
+        '''Queues line, a serialized journal entry, to be appended to the
+        journal'''
+        with self._condition:
+            self._seq += 1
+            self._new_lines.append((self._seq, line))
+            self._condition.notify_all()
+
+    def submit(self, data):
+        '''Queues data to be written, replacing any snapshot not yet written.
+        data must include every entry appended so far.'''
+        with self._condition:
+            self._pending = data
+            self._pending_seq = self._seq
+            self._condition.notify_all()
+
+    def flush(self, timeout=10):
+        '''Waits until everything submitted has been written'''
+        with self._condition:
+            self._condition.wait_for(
+                lambda: (self._pending is None and not self._new_lines and
+                         not self._writing),
+                timeout)
+
+    def _writer_loop(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: self._pending is not None or self._new_lines)
+                data = self._pending
+                data_seq = self._pending_seq
+                new_lines = self._new_lines
+                self._pending = None
+                self._new_lines = []
+                self._writing = True
+            try:
+                if new_lines:
+                    self._storage.append([line for _, line in new_lines])
+                    self._journal.extend(new_lines)
+                if data is not None:
+                    self._journal = [(seq, line) for seq, line in self._journal
+                                     if seq > data_seq]
+                    self._storage.save(
+                        data, [line for _, line in self._journal])
+            finally:
+                with self._condition:
+                    self._writing = False
+                    self._condition.notify_all()
+
+
+class SQLiteStorage(object):
+    '''Stores the state of the core in a SQLite database, config.db, next to
+    the config.json file at path.  Journal entries are applied directly as
+    row level updates, so nothing is rewritten as the network grows.  If
+    the database does not exist yet, the state is migrated from the json
+    config on the first load.'''
+
+    SCHEMA = (
+        '''CREATE TABLE IF NOT EXISTS modems (
+               modem_id TEXT PRIMARY KEY,
+               attributes TEXT NOT NULL)''',
+        '''CREATE TABLE IF NOT EXISTS devices (
+               modem_id TEXT NOT NULL,
+               device_id TEXT NOT NULL,
+               attributes TEXT NOT NULL,
+               PRIMARY KEY (modem_id, device_id))''',
+        # The device_id of rows belonging to the modem itself is ''
+        '''CREATE TABLE IF NOT EXISTS groups (
+               modem_id TEXT NOT NULL,
+               device_id TEXT NOT NULL,
+               group_number INTEGER NOT NULL,
+               attributes TEXT NOT NULL,
+               PRIMARY KEY (modem_id, device_id, group_number))''',
+        '''CREATE TABLE IF NOT EXISTS aldb_records (
+               modem_id TEXT NOT NULL,
+               device_id TEXT NOT NULL,
+               key TEXT NOT NULL,
+               raw TEXT NOT NULL,
+               link_flags INTEGER NOT NULL,
+               group_number INTEGER NOT NULL,
+               linked_id TEXT NOT NULL,
+               PRIMARY KEY (modem_id, device_id, key))''',
+        '''CREATE INDEX IF NOT EXISTS aldb_linked_id
+               ON aldb_records (linked_id)''',
+        '''CREATE INDEX IF NOT EXISTS aldb_group
+               ON aldb_records (modem_id, device_id, group_number)''',
+        '''CREATE TABLE IF NOT EXISTS user_links (
+               modem_id TEXT NOT NULL,
+               device_id TEXT NOT NULL,
+               controller_id TEXT NOT NULL,
+               group_number INTEGER NOT NULL,
+               data_1 INTEGER NOT NULL,
+               data_2 INTEGER NOT NULL,
+               data_3 INTEGER NOT NULL,
+               controller_key TEXT,
+               responder_key TEXT,
+               PRIMARY KEY (modem_id, device_id, controller_id,
+                            group_number, data_1, data_2, data_3))''',
+    )
+
+    DEVICE_TABLES = ('devices', 'groups', 'aldb_records', 'user_links')
+
+    def __init__(self, path):
+        self._json_path = path
+        self._path = os.path.splitext(path)[0] + '.db'
+        self._connection = None
+        # The device data last written by save() and a copy of it which is
+        # kept in step with the journal entries applied since.  Unchanged
+        # devices are passed in again as the same object, or equal to the
+        # copy, and are skipped.
+        self._written = {}
+
+    @property
+    def path(self):
+        return self._path
+
+    def _connect(self):
+        if self._connection is None:
+            is_new = not os.path.exists(self._path)
+            # Loaded by the core thread, then only used by the writer thread
+            self._connection = sqlite3.connect(self._path,
+                                               check_same_thread=False)
+            with self._connection:
+                for statement in self.SCHEMA:
+                    self._connection.execute(statement)
+            if is_new:
+                self._migrate()
+        return self._connection
+
+    def _migrate(self):
+        '''Copies the state from the json config, if there is one'''
+        if os.path.exists(self._json_path):
+            print('migrating', self._json_path, 'to', self._path)
+            data = JSONStorage(self._json_path).load()
+            with self._connection:
+                self._write_state(data)
+
+    def load(self):
+        '''Returns the saved state in the same form as JSONStorage.load()'''
+        connection = self._connect()
+        modems = {}
+        for modem_id, attributes in connection.execute(
+                'SELECT modem_id, attributes FROM modems'):
+            modems[modem_id] = self._new_device(attributes)
+            modems[modem_id]['devices'] = {}
+        for modem_id, in connection.execute(
+                'SELECT DISTINCT modem_id FROM devices'):
+            if modem_id not in modems:
+                raise ValueError('devices of modem ' + modem_id + ' in ' +
+                                 self._path + ' but not the modem itself')
+        for modem_id, modem in modems.items():
+            if 'type' not in modem:
+                raise ValueError('modem ' + modem_id + ' in ' + self._path +
+                                 ' has no type')
+        for modem_id, device_id, attributes in connection.execute(
+                'SELECT modem_id, device_id, attributes FROM devices'):
+            modems[modem_id]['devices'][device_id] = self._new_device(
+                attributes)
+        for modem_id, device_id, group_number, attributes in connection.execute(
+                'SELECT modem_id, device_id, group_number, attributes '
+                'FROM groups'):
+            target = self._find(modems, modem_id, device_id)
+            if target is not None:
+                target['groups'][str(group_number)] = json.loads(attributes)
+        for modem_id, device_id, key, raw in connection.execute(
+                'SELECT modem_id, device_id, key, raw FROM aldb_records'):
+            target = self._find(modems, modem_id, device_id)
+            if target is not None:
+                target['aldb'][key] = raw
+        for row in connection.execute(
+                'SELECT modem_id, device_id, controller_id, group_number, '
+                'data_1, data_2, data_3, controller_key, responder_key '
+                'FROM user_links'):
+            target = self._find(modems, row[0], row[1])
+            if target is not None:
+                controller = target['user_links'].setdefault(row[2], {})
+                controller.setdefault(str(row[3]), []).append({
+                    'data_1': row[4],
+                    'data_2': row[5],
+                    'data_3': row[6],
+                    'controller_key': row[7],
+                    'responder_key': row[8]})
+        ret = {}
+        if modems:
+            ret['modems'] = modems
+        return ret
+
+    @staticmethod
+    def _new_device(attributes):
+        ret = json.loads(attributes)
+        ret['aldb'] = {}
+        ret['groups'] = {}
+        ret['user_links'] = {}
+        return ret
+
+    @staticmethod
+    def _find(modems, modem_id, device_id):
+        ret = modems.get(modem_id)
+        if ret is not None and device_id:
+            ret = ret['devices'].get(device_id)
+        return ret
+
+    def append(self, journal_lines):
+        '''Applies the journal entries to the database in one transaction'''
+        connection = self._connect()
+        try:
+            with connection:
+                self._apply_entries(journal_lines)
+        except sqlite3.Error as error:
+            print('error writing journal to database', error)
+
+    def save(self, data, journal_lines=()):
+        '''Writes the devices in data that have changed since the last save,
+        then reapplies journal_lines, the entries made since data was
+        taken.'''
+        connection = self._connect()
+        try:
+            with connection:
+                self._write_state(data)
+                self._apply_entries(journal_lines)
+        except (sqlite3.Error, TypeError, ValueError) as error:
+            print('error writing config to database', error)
+            self._written = {}
+
+    ###################################################################
+    #
+    # Writing whole devices
+    #
+    ###################################################################
+
+    def _write_state(self, data):
+        saved = set()
+        written = {}
+        for modem_id, modem_data in data.get('modems', {}).items():
+            modem_data = modem_data.copy()
+            devices = modem_data.pop('devices', {})
+            self._write_device(modem_id, '', modem_data, written)
+            saved.add((modem_id, ''))
+            for device_id, device_data in devices.items():
+                self._write_device(modem_id, device_id, device_data, written)
+                saved.add((modem_id, device_id))
+        # Remove anything no longer in the state
+        stored = set(self._connection.execute(
+            'SELECT modem_id, device_id FROM devices'))
+        stored.update((modem_id, '') for modem_id, in self._connection.execute(
+            'SELECT modem_id FROM modems'))
+        for modem_id, device_id in stored - saved:
+            self._delete_device(modem_id, device_id)
+        self._written = written
+
+    def _write_device(self, modem_id, device_id, device_data, written):
+        last_written = self._written.get((modem_id, device_id))
+        # A new copy of the modem is made for each snapshot
+        unchanged = last_written is not None and (
+            last_written[0] is device_data or last_written[1] == device_data)
+        if unchanged:
+            written[(modem_id, device_id)] = last_written
+            return
+        written[(modem_id, device_id)] = (device_data,
+                                          self._copy_device(device_data))
+        self._delete_device(modem_id, device_id)
+        attributes = device_data.copy()
+        aldb = attributes.pop('aldb', {})
+        groups = attributes.pop('groups', {})
+        user_links = attributes.pop('user_links', {})
+        self._set_attributes(modem_id, device_id, attributes)
+        for group_number, group_attributes in groups.items():
+            self._connection.execute(
+                'INSERT INTO groups VALUES (?, ?, ?, ?)',
+                (modem_id, device_id, int(group_number),
+                 json.dumps(group_attributes, sort_keys=True)))
+        for key, raw in aldb.items():
+            self._set_aldb_record(modem_id, device_id, key, raw)
+        for controller_id, controller_groups in user_links.items():
+            for group_number, all_data in controller_groups.items():
+                for link_data in all_data:
+                    self._set_user_link(modem_id, device_id, controller_id,
+                                        group_number, link_data)
+
+    @staticmethod
+    def _copy_device(device_data):
+        ret = json.loads(json.dumps(
+            {name: value for name, value in device_data.items()
+             if name != 'aldb'}))
+        # The records are views into the ALDB file of JSONStorage when
+        # migrating
+        ret['aldb'] = {}
+        for key, raw in device_data.get('aldb', {}).items():
+            if not isinstance(raw, str):
+                raw = bytes(raw).hex().upper()
+            ret['aldb'][key] = raw
+        return ret
+
+    def _delete_device(self, modem_id, device_id):
+        for table in self.DEVICE_TABLES:
+            self._connection.execute(
+                'DELETE FROM ' + table + ' WHERE modem_id = ? AND '
+                'device_id = ?', (modem_id, device_id))
+        if not device_id:
+            self._connection.execute(
+                'DELETE FROM modems WHERE modem_id = ?', (modem_id,))
+
+    ###################################################################
+    #
+    # Row level updates
+    #
+    ###################################################################
+
+    def _apply_entries(self, journal_lines):
+        for line in journal_lines:
+            entry = json.loads(line)
+            modem_id = entry['modem']
+            device_id = entry['device'] or ''
+            if entry['op'] == 'rename_modem':
+                self._rename_modem(entry['old'], modem_id)
+            elif entry['op'] == 'delete_device':
+                self._delete_device(modem_id, device_id)
+            elif entry['op'] == 'add_device':
+                self._update_attributes(modem_id, device_id, {})
+            elif entry['op'] == 'attr':
+                self._update_attributes(modem_id, device_id,
+                                        {entry['name']: entry['value']})
+            elif entry['op'] == 'group_attr':
+                self._update_group(modem_id, device_id, entry['group'],
+                                   _group_values(entry))
+            elif entry['op'] == 'aldb':
+                self._set_aldb_record(modem_id, device_id, entry['key'],
+                                      entry['raw'])
+            elif entry['op'] == 'clear_aldb':
+                self._connection.execute(
+                    'DELETE FROM aldb_records WHERE modem_id = ? AND '
+                    'device_id = ?', (modem_id, device_id))
+            elif entry['op'] == 'link':
+                self._set_user_link(modem_id, device_id, entry['controller'],
+                                    entry['group'], entry['data'])
+            elif entry['op'] == 'delete_link':
+                self._connection.execute(
+                    'DELETE FROM user_links WHERE modem_id = ? AND '
+                    'device_id = ? AND controller_id = ? AND '
+                    'group_number = ? AND data_1 = ? AND data_2 = ? AND '
+                    'data_3 = ?',
+                    (modem_id, device_id, entry['controller'],
+                     int(entry['group']), entry['data']['data_1'],
+                     entry['data']['data_2'], entry['data']['data_3']))
+            if entry['op'] == 'delete_device':
+                self._written.pop((modem_id, device_id), None)
+            elif (modem_id, device_id) in self._written:
+                # Keep the copy in step with the rows
+                _replay_entry(self._written[(modem_id, device_id)][1], entry)
+
+    def _rename_modem(self, old_id, new_id):
+        for table in ('modems',) + self.DEVICE_TABLES:
+            self._connection.execute(
+                'UPDATE ' + table + ' SET modem_id = ? WHERE modem_id = ?',
+                (new_id, old_id))
+        for modem_id, device_id in list(self._written):
+            if modem_id in (old_id, new_id):
+                del self._written[(modem_id, device_id)]
+
+    def _get_attributes(self, modem_id, device_id):
+        if device_id:
+            row = self._connection.execute(
+                'SELECT attributes FROM devices WHERE modem_id = ? AND '
+                'device_id = ?', (modem_id, device_id)).fetchone()
+        else:
+            row = self._connection.execute(
+                'SELECT attributes FROM modems WHERE modem_id = ?',
+                (modem_id,)).fetchone()
+        ret = {}
+        if row is not None:
+            ret = json.loads(row[0])
+        return ret
+
+    def _set_attributes(self, modem_id, device_id, attributes):
+        attributes = json.dumps(attributes, sort_keys=True)
+        if device_id:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO devices VALUES (?, ?, ?)',
+                (modem_id, device_id, attributes))
+        else:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO modems VALUES (?, ?)',
+                (modem_id, attributes))
+
+    def _update_attributes(self, modem_id, device_id, changes):
+        attributes = self._get_attributes(modem_id, device_id)
+        attributes.update(changes)
+        self._set_attributes(modem_id, device_id, attributes)
+
+    def _update_group(self, modem_id, device_id, group_number, changes):
+        row = self._connection.execute(
+            'SELECT attributes FROM groups WHERE modem_id = ? AND '
+            'device_id = ? AND group_number = ?',
+            (modem_id, device_id, int(group_number))).fetchone()
+        attributes = {}
+        if row is not None:
+            attributes = json.loads(row[0])
+        attributes.update(changes)
+        self._connection.execute(
+            'INSERT OR REPLACE INTO groups VALUES (?, ?, ?, ?)',
+            (modem_id, device_id, int(group_number),
+             json.dumps(attributes, sort_keys=True)))
+
+    def _set_aldb_record(self, modem_id, device_id, key, raw):
+        if isinstance(raw, str):
+            raw_bytes = bytes.fromhex(raw)
+        else:
+            # A view into the ALDB file of JSONStorage, when migrating
+            raw_bytes = bytes(raw)
+        self._connection.execute(
+            'INSERT OR REPLACE INTO aldb_records VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (modem_id, device_id, key, raw_bytes.hex().upper(), raw_bytes[0],
+             raw_bytes[1], raw_bytes[2:5].hex().upper()))
+
+    def _set_user_link(self, modem_id, device_id, controller_id,
+                       group_number, data):
+        self._connection.execute(
+            'INSERT OR REPLACE INTO user_links '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (modem_id, device_id, controller_id, int(group_number),
+             data['data_1'], data['data_2'], data['data_3'],
+             data.get('controller_key'), data.get('responder_key')))
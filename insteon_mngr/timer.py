@@ -0,0 +1,106 @@
+'''A timer wheel used by each modem to track its deadlines.'''
+import threading
+import time
+
+
+class Timer(object):
+    '''A handle to a scheduled callback, returned by TimerWheel.schedule()'''
+    __slots__ = ('deadline', 'callback', '_slot')
+
+    def __init__(self, deadline, callback):
+        self.deadline = deadline
+        self.callback = callback
+        self._slot = None
+
+    @property
+    def active(self):
+        '''True until the timer fires or is cancelled'''
+        return self._slot is not None
+
+
+class TimerWheel(object):
+    '''A hashed timer wheel.  Each slot covers resolution seconds and holds
+    the timers due in that slot on any revolution of the wheel, so
+    scheduling and cancelling a timer are both O(1).  Timers are fired by
+    calling advance(), which only visits the slots passed since it was last
+    called.
+
+    Callbacks are called by advance() in the thread processing the modem,
+    they are never called while the wheel is locked so they may schedule
+    or cancel other timers.'''
+
+    def __init__(self, resolution=0.01, slot_count=512):
+        self._resolution = resolution
+        self._slots = [set() for _ in range(slot_count)]
+        self._tick = self._to_tick(time.time())
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._count
+
+    def schedule(self, deadline, callback):
+        '''Calls callback once deadline, a time.time() value, has passed.
+        Returns a Timer which can be passed to cancel()'''
+        timer = Timer(deadline, callback)
+        with self._lock:
+            tick = max(self._to_tick(deadline), self._tick)
+            timer._slot = self._slots[tick % len(self._slots)]
+            timer._slot.add(timer)
+            self._count += 1
+        return timer
+
+    def cancel(self, timer):
+        '''Stops timer from firing, does nothing if it has already fired'''
+        with self._lock:
+            if timer is not None and timer._slot is not None:
+                timer._slot.discard(timer)
+                timer._slot = None
+                self._count -= 1
+
+    def advance(self, now=None):
+        '''Fires all of the timers whose deadline has passed'''
+        if now is None:
+            now = time.time()
+        due = []
+        with self._lock:
+            now_tick = self._to_tick(now)
+            # Slots before now_tick are finished with, now_tick itself may
+            # still hold timers due later in the tick
+            passed = min(now_tick - self._tick, len(self._slots) - 1)
+            for tick in range(now_tick - passed, now_tick + 1):
+                slot = self._slots[tick % len(self._slots)]
+                slot_due = [timer for timer in slot if timer.deadline <= now]
+                for timer in slot_due:
+                    slot.discard(timer)
+                    timer._slot = None
+                self._count -= len(slot_due)
+                due.extend(slot_due)
+            self._tick = max(self._tick, now_tick)
+        due.sort(key=lambda timer: timer.deadline)
+        for timer in due:
+            timer.callback()
+        return len(due)
+
+    def next_deadline(self):
+        '''Returns the deadline of the next timer to fire, or None if there
+        are no timers.  Timers more than a revolution of the wheel away are
+        not searched for, the end of the revolution is returned instead.'''
+        ret = None
+        with self._lock:
+            if self._count > 0:
+                slot_count = len(self._slots)
+                for tick in range(self._tick, self._tick + slot_count):
+                    slot_end = (tick + 1) * self._resolution
+                    for timer in self._slots[tick % slot_count]:
+                        if (timer.deadline < slot_end and
+                                (ret is None or timer.deadline < ret)):
+                            ret = timer.deadline
+                    if ret is not None:
+                        break
+                if ret is None:
+                    ret = (self._tick + slot_count) * self._resolution
+        return ret
+
+    def _to_tick(self, value):
+        return int(value / self._resolution)
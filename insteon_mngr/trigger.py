@@ -1,16 +1,32 @@
+import time
+
+# Seconds after which a trigger that has not fired is removed
+TRIGGER_TIMEOUT = 300
+
+
 class Trigger_Manager(object):
 
     def __init__(self, parent):
         self._parent = parent
         self._triggers = {}
+        self._expiry_timers = {}
 
     def add_trigger(self, trigger_name, trigger_obj):
         '''The trigger_name must be unique to each trigger_obj.  Using the same
         name will cause the prior trigger to be overwritten in the trigger
         manager'''
         self._triggers[trigger_name] = trigger_obj
-
-    # TODO remove expired triggers?
+        timers = self._parent.timers
+        timers.cancel(self._expiry_timers.pop(trigger_name, None))
+        if trigger_obj.timeout is not None:
+            self._expiry_timers[trigger_name] = timers.schedule(
+                time.time() + trigger_obj.timeout,
+                lambda: self._expire_trigger(trigger_name))
+
+    def _expire_trigger(self, trigger_name):
+        del self._expiry_timers[trigger_name]
+        print('trigger', trigger_name, 'expired')
+        del self._triggers[trigger_name]
 
     def test_triggers(self, msg):
         if msg.allow_trigger:
@@ -25,6 +41,8 @@ class Trigger_Manager(object):
                 trigger = self._triggers[trigger_key]
                 trigger_function = trigger.trigger_function
                 del self._triggers[trigger_key]
+                self._parent.timers.cancel(
+                    self._expiry_timers.pop(trigger_key, None))
                 trigger_function()
 
     def delete_matching_attr(self, msg_name, attributes=None):
@@ -41,6 +59,7 @@ class PLMTrigger(object):
         self._trigger_function = lambda: None
         self._name = None
         self._plm = plm
+        self._timeout = TRIGGER_TIMEOUT
 
     @property
     def trigger_function(self):
@@ -55,6 +74,16 @@ class PLMTrigger(object):
     def attributes(self):
         return self._attributes
 
+    @property
+    def timeout(self):
+        '''Seconds to wait for a matching message before the trigger is
+        removed, None waits forever'''
+        return self._timeout
+
+    @timeout.setter
+    def timeout(self, value):
+        self._timeout = value
+
     def match_msg(self, msg):
         '''Returns true if message matches the attributes defined for the trigger
         else returns false'''
@@ -96,6 +125,8 @@ class InsteonTrigger(PLMTrigger):
         if attributes is not None:
             self._attributes.update(attributes)
         self._trigger_function = lambda: None
+        self._name = None
+        self._timeout = TRIGGER_TIMEOUT
 
     def _set_dev_from_addr(self, device):
         self._attributes['from_addr_hi'] = device.dev_addr_hi
@@ -113,9 +113,13 @@ class UserLink(object):
 
     def set_controller_key(self, key):
         self._controller_key = key
+        self._core.user_links.update(self)
+        self._device.journal_user_link(self)
 
     def set_responder_key(self, key):
         self._responder_key = key
+        self._core.user_links.update(self)
+        self._device.journal_user_link(self)
 
     def edit(self, controller, data):
         '''Edits the user link'''
@@ -125,9 +129,12 @@ class UserLink(object):
             device.add_user_link(controller, data, self.uid)
             self._device.delete_user_link(self.uid)
         else:
+            # The link is saved under its data, so remove the old entry
+            self._device.journal_user_link(self, 'delete_link')
             self._data_1 = data['data_1']
             self._data_2 = data['data_2']
             self._data_3 = data['data_3']
+            self._device.journal_user_link(self)
         self.fix()
 
     def fix(self):
@@ -140,12 +147,12 @@ class UserLink(object):
         responder_sequence = None
         if self._is_controller_correct() is False:
             if self._adoptable_controller_key() is not None:
-                self._controller_key = self._adoptable_controller_key()
+                self.set_controller_key(self._adoptable_controller_key())
             else:
                 controller_sequence = self.controller_group.create_controller_link_sequence(self)
         if self._is_responder_correct() is False:
             if self._adoptable_responder_key() is not None:
-                self._responder_key = self._adoptable_responder_key()
+                self.set_responder_key(self._adoptable_responder_key())
             else:
                 responder_sequence = self.responder_group.create_responder_link_sequence(self)
         if responder_sequence is not None and controller_sequence is not None:
@@ -252,8 +259,11 @@ class UserLink(object):
 
     def _is_responder_correct(self):
         ret = False
+        record = None
         if (self._responder_key is not None):
-            responder = self._device.aldb.get_record(self._responder_key).parse_record()
+            record = self._device.aldb.peek_record(self._responder_key)
+        if record is not None:
+            responder = record.parse_record()
             if (responder['in_use'] == True and
                     responder['responder'] == True and
                     responder['group'] == self._group_number and
@@ -269,8 +279,12 @@ class UserLink(object):
 
     def _is_controller_correct(self):
         ret = False
+        record = None
         if (self._controller_key is not None):
-            controller = self.controller_device.root.aldb.get_record(self._controller_key).parse_record()
+            record = self.controller_device.root.aldb.peek_record(
+                self._controller_key)
+        if record is not None:
+            controller = record.parse_record()
             if (controller['in_use'] == True and
                     controller['controller'] == True and
                     controller['group'] == self._group_number and
@@ -0,0 +1,122 @@
+'''The registry of every user_link in the core.'''
+
+# The kinds of index key, see UserLinkRegistry._index_keys()
+_CONTROLLER_DEVICE = 0
+_CONTROLLER_GROUP = 1
+_CONTROLLER_KEY = 2
+_RESPONDER_KEY = 3
+
+
+class UserLinkRegistry(object):
+    '''Every user_link of the core by its uid, indexed by its controller
+    device, its controller group and the records it uses, so that finding
+    the user_links of a group or record does not search every device.
+
+    The user_links are still held by their responder device, which adds
+    them here as they are loaded or added and removes them when they are
+    deleted.  update() has to be called whenever the controller_key or
+    responder_key of a user_link changes.  Lookups return the user_links in
+    the order they were filed.'''
+
+    def __init__(self):
+        self._links = {}
+        # Index key to a dict, used as an ordered set, of uids
+        self._indexes = {}
+        # uid to the index keys the user_link is filed under
+        self._filed = {}
+
+    def __len__(self):
+        return len(self._links)
+
+    def add(self, user_link):
+        '''Adds user_link, replacing any other user_link with its uid'''
+        previous = self._links.get(user_link.uid)
+        if previous is not None:
+            self.remove(previous)
+        self._links[user_link.uid] = user_link
+        self._index(user_link)
+
+    def remove(self, user_link):
+        '''Removes user_link.  Does nothing if it is not registered, which
+        includes when another user_link has since been added with its uid,
+        as happens when a user_link is moved to another responder.'''
+        if self._links.get(user_link.uid) is user_link:
+            self._unindex(user_link.uid)
+            del self._links[user_link.uid]
+
+    def update(self, user_link):
+        '''Files user_link again, after its keys have changed'''
+        if self._links.get(user_link.uid) is user_link:
+            self._unindex(user_link.uid)
+            self._index(user_link)
+
+    def find(self, uid):
+        '''Returns the user_link with uid or None'''
+        return self._links.get(uid)
+
+    def get_all(self):
+        '''Returns a dict of every user_link keyed by uid'''
+        return self._links.copy()
+
+    def get_by_controller_device(self, controller_id):
+        '''Returns a dict of the user_links controlled by any group of the
+        device with the address controller_id'''
+        return self._lookup((_CONTROLLER_DEVICE, controller_id.upper()))
+
+    def get_by_controller_group(self, controller_id, group_number):
+        '''Returns a dict of the user_links controlled by group_number of
+        the device with the address controller_id'''
+        return self._lookup((_CONTROLLER_GROUP, controller_id.upper(),
+                             group_number))
+
+    def get_by_controller_key(self, controller_id, group_number, key):
+        '''Returns the first user_link of the group which uses the controller
+        record at key, or None'''
+        return self._first((_CONTROLLER_KEY, controller_id.upper(),
+                            group_number, key))
+
+    def get_by_responder_key(self, responder_id, key):
+        '''Returns the first user_link which uses the record at key on the
+        responder with the address responder_id, or None'''
+        return self._first((_RESPONDER_KEY, responder_id.upper(), key))
+
+    def _lookup(self, index_key):
+        ret = {}
+        for uid in self._indexes.get(index_key, ()):
+            ret[uid] = self._links[uid]
+        return ret
+
+    def _first(self, index_key):
+        ret = None
+        for uid in self._indexes.get(index_key, ()):
+            ret = self._links[uid]
+            break
+        return ret
+
+    def _index(self, user_link):
+        index_keys = self._index_keys(user_link)
+        for index_key in index_keys:
+            self._indexes.setdefault(index_key, {})[user_link.uid] = None
+        self._filed[user_link.uid] = index_keys
+
+    def _unindex(self, uid):
+        for index_key in self._filed.pop(uid, ()):
+            uids = self._indexes[index_key]
+            del uids[uid]
+            if not uids:
+                del self._indexes[index_key]
+
+    @staticmethod
+    def _index_keys(user_link):
+        controller_id = user_link.controller_id
+        group_number = user_link.controller_group_number
+        ret = [(_CONTROLLER_DEVICE, controller_id),
+               (_CONTROLLER_GROUP, controller_id, group_number)]
+        if user_link.controller_key is not None:
+            ret.append((_CONTROLLER_KEY, controller_id, group_number,
+                        user_link.controller_key))
+        if user_link.responder_key is not None:
+            ret.append((_RESPONDER_KEY,
+                        user_link.responder_device.dev_addr_str,
+                        user_link.responder_key))
+        return ret
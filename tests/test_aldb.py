@@ -0,0 +1,243 @@
+import random
+import unittest
+# append parent directory to import path
+import env
+# now we can import the lib module
+from insteon_mngr.aldb import ALDB, ALDBRecord, LinkIndex
+from insteon_mngr.modem import Modem_ALDB
+
+
+class FakeCore(object):
+    def __init__(self):
+        self.link_index = LinkIndex()
+        self.link_generation = 0
+
+    def links_changed(self):
+        self.link_generation += 1
+
+
+class FakeDevice(object):
+    def __init__(self, core=None):
+        self.core = core
+        self.entries = []
+
+    def journal(self, entry):
+        self.entries.append(entry)
+
+    def mark_dirty(self):
+        pass
+
+
+class MyTest(unittest.TestCase):
+    def setUp(self):
+        self.device = FakeDevice()
+        self.aldb = ALDB(self.device)
+        self.aldb.load_aldb_records({
+            '0FFF': 'E201AABBCCFF1C01',
+            '0FF7': memoryview(bytearray.fromhex('A2011122330000FF')),
+            '0FEF': '0000000000000000'})
+
+    def test_views(self):
+        record = self.aldb.get_record('0FFF')
+        self.assertEqual(record, self.aldb.get_record(0x0FFF))
+        self.assertEqual(record.key, '0FFF')
+        self.assertEqual(record.position, 0x0FFF)
+        self.assertNotEqual(record, self.aldb.get_record('0FF7'))
+        self.assertEqual(len({record, self.aldb.get_record('0FFF')}), 1)
+        self.assertEqual(len(self.aldb), 3)
+
+    def test_raw_is_a_copy(self):
+        record = self.aldb.get_record('0FFF')
+        raw = record.raw
+        raw[0] = 0x00
+        self.assertEqual(record.raw[0], 0xE2)
+        record.raw = raw
+        self.assertEqual(self.aldb.get_record('0FFF').raw[0], 0x00)
+        self.assertEqual(self.device.entries[-1],
+                         {'op': 'aldb', 'key': '0FFF',
+                          'raw': '0001AABBCCFF1C01'})
+
+    def test_edit_record_byte(self):
+        self.aldb.get_record('0FF7').edit_record_byte(7, 0x03)
+        self.assertEqual(self.aldb.get_all_records_str()['0FF7'],
+                         'A201112233000003')
+        self.assertEqual(self.device.entries[-1]['raw'], 'A201112233000003')
+
+    def test_parsed_cached(self):
+        record = self.aldb.get_record('0FFF')
+        parsed = record.parse_record()
+        self.assertIs(parsed['controller'], True)
+        self.assertEqual(parsed.group, 1)
+        self.assertIs(self.aldb.get_record('0FFF').parse_record(), parsed)
+        with self.assertRaises(KeyError):
+            parsed['missing']
+        record.edit_record_byte(1, 0x05)
+        self.assertEqual(record.parse_record()['group'], 5)
+        record.edit_record(bytearray.fromhex('A2031122330000FF'))
+        parsed = record.parse_record()
+        self.assertEqual((parsed['group'], parsed['responder']), (3, True))
+
+    def test_wrong_length(self):
+        with self.assertRaises(ValueError):
+            self.aldb.get_record('0FFF').raw = bytearray(7)
+        self.assertEqual(len(self.aldb._buffer), 3 * 8)
+
+    def test_new_record(self):
+        record = self.aldb.get_record('0FE7')
+        self.assertTrue(record.is_empty_aldb())
+        # Not saved until it is written
+        self.assertEqual(self.device.entries, [])
+        self.assertEqual(list(self.aldb.get_all_records()),
+                         ['0FFF', '0FF7', '0FEF', '0FE7'])
+        record.raw = bytearray.fromhex('A2014455660000FF')
+        self.assertEqual(self.device.entries,
+                         [{'op': 'aldb', 'key': '0FE7',
+                           'raw': 'A2014455660000FF'}])
+
+    def test_peek_record(self):
+        self.assertEqual(self.aldb.peek_record('0FFF'),
+                         self.aldb.get_record('0FFF'))
+        self.assertIsNone(self.aldb.peek_record('0FE7'))
+        self.assertFalse(self.aldb.has_record('0FE7'))
+        self.assertEqual(self.device.entries, [])
+
+    def test_matching_records(self):
+        records = self.aldb.get_matching_records({'controller': True,
+                                                  'group': 1})
+        self.assertEqual([record.key for record in records], ['0FFF'])
+
+    def test_first_empty_addr(self):
+        self.assertEqual(self.aldb.get_first_empty_addr(), '0FEF')
+        self.aldb.get_record('0FEF').raw = bytearray.fromhex(
+            'A2011122330000FF')
+        self.assertEqual(self.aldb.get_first_empty_addr(), '0FE7')
+
+    def test_free_slots_match_scan(self):
+        generator = random.Random(7)
+        for _ in range(200):
+            position = 0x0FFF - 8 * generator.randrange(40)
+            flags = generator.choice((0x00, 0xA2, 0xE2))
+            self.aldb.get_record(position).edit_record_byte(0, flags)
+            empty = [key for key, raw in self.aldb.get_all_records().items()
+                     if not raw[0] & 0x80]
+            if empty:
+                expected = max(empty, key=lambda key: int(key, 16))
+            else:
+                expected = '{:04X}'.format(
+                    min(int(key, 16) for key in self.aldb.aldb) - 8)
+            self.assertEqual(self.aldb.get_first_empty_addr(), expected)
+
+    def test_link_sequence(self):
+        sequence = object()
+        self.aldb.get_record('0FFF').link_sequence = sequence
+        self.assertIs(self.aldb.get_record('0FFF').link_sequence, sequence)
+        self.assertIsNone(self.aldb.get_record('0FF7').link_sequence)
+
+    def test_clear(self):
+        self.aldb.clear_all_records()
+        self.assertEqual(len(self.aldb), 0)
+        self.assertIsNone(self.aldb.get_first_empty_addr())
+        self.assertEqual(self.aldb.get_all_records(), {})
+
+    def brute_force(self, attributes):
+        ret = []
+        for record in self.aldb.aldb.values():
+            parsed = record.parse_record()
+            if all(parsed[name] == value
+                   for name, value in attributes.items()):
+                ret.append(record.key)
+        return ret
+
+    def test_indexes_match_scan(self):
+        generator = random.Random(4)
+        def random_record():
+            return bytearray([generator.choice((0x00, 0x82, 0xA2, 0xE2)),
+                              generator.randrange(3), 0x11, 0x22,
+                              generator.randrange(2), 0xFF, 0x1C, 0x01])
+        for position in range(0x0FFF, 0x0D00, -8):
+            self.aldb.get_record(position).raw = random_record()
+        for _ in range(50):
+            # Changes after indexing must be seen by the indexes
+            record = self.aldb.get_record(generator.choice(
+                list(self.aldb._slots)))
+            if generator.random() < 0.5:
+                record.raw = random_record()
+            else:
+                record.edit_record_byte(generator.randrange(5),
+                                        generator.randrange(256))
+        searches = [
+            {}, {'in_use': True}, {'controller': True, 'group': 1},
+            {'responder': True, 'group': 2, 'in_use': True},
+            {'group': 0, 'dev_addr_hi': 0x11, 'dev_addr_mid': 0x22,
+             'dev_addr_low': 1},
+            {'in_use': True, 'controller': False, 'group': 1,
+             'dev_addr_hi': 0x11, 'dev_addr_mid': 0x22, 'dev_addr_low': 0,
+             'data_1': 0xFF},
+            {'dev_addr_hi': 0x11, 'dev_addr_mid': 0x22, 'dev_addr_low': 1}]
+        for attributes in searches:
+            self.assertEqual(
+                [record.key
+                 for record in self.aldb.get_matching_records(attributes)],
+                self.brute_force(attributes))
+
+    def test_modem_keys(self):
+        aldb = Modem_ALDB(self.device)
+        aldb.load_aldb_records({'0001': 'E2011122330000FF',
+                                '0009': 'E2011122330000FF'})
+        self.assertEqual(aldb.get_first_empty_addr(), '0010')
+        aldb.get_record('0010')
+        self.assertEqual(aldb.get_first_empty_addr(), '0011')
+        self.assertEqual(aldb.get_record(9), aldb.get_record('0009'))
+        self.assertTrue(aldb.have_aldb_cache())
+        self.assertIsInstance(aldb.aldb['0001'], ALDBRecord)
+
+
+class LinkIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.core = FakeCore()
+        self.first = ALDB(FakeDevice(self.core))
+        self.second = ALDB(FakeDevice(self.core))
+        self.first.load_aldb_records({'0FFF': 'E201AABBCCFF1C01',
+                                      '0FF7': 'A201AABBCCFF1C01'})
+        self.second.load_aldb_records({'0FFF': 'A201AABBCC000001'})
+
+    def linked(self, group=1):
+        return [(record.device, record.key) for record in
+                self.core.link_index.get_records((0xAA, 0xBB, 0xCC), group)]
+
+    def test_records_from_every_aldb(self):
+        self.assertEqual(self.linked(), [(self.first.device, '0FFF'),
+                                         (self.first.device, '0FF7'),
+                                         (self.second.device, '0FFF')])
+
+    def test_updated_on_change(self):
+        self.first.get_record('0FF7').edit_record_byte(1, 0x02)
+        self.second.get_record('0FFF').raw = bytearray(8)
+        self.assertEqual(self.linked(), [(self.first.device, '0FFF')])
+        self.assertEqual(self.linked(2), [(self.first.device, '0FF7')])
+
+    def test_generation(self):
+        generation = self.core.link_generation
+        # Reads change nothing
+        self.first.get_record('0FEF')
+        self.first.peek_record('0FE7')
+        self.assertEqual(self.core.link_generation, generation)
+        self.first.get_record('0FEF').raw = bytearray.fromhex(
+            'A201AABBCC000001')
+        self.assertEqual(self.core.link_generation, generation + 1)
+        # Bytes count once the record is complete
+        for byte_pos in range(8):
+            self.first.get_record('0FEF').edit_record_byte(byte_pos, 0x00)
+        self.assertEqual(self.core.link_generation, generation + 1)
+        self.first.record_bytes_stored()
+        self.assertEqual(self.core.link_generation, generation + 2)
+
+    def test_detach_and_clear(self):
+        self.first.detach()
+        self.assertEqual(self.linked(), [(self.second.device, '0FFF')])
+        self.second.clear_all_records()
+        self.assertEqual(self.core.link_index._records, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
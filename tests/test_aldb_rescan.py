@@ -0,0 +1,104 @@
+import unittest
+# append parent directory to import path
+import env
+# now we can import the lib module
+from insteon_mngr.aldb import ALDB
+from insteon_mngr.sequences.common import (ALDBRescan, RESCAN_CONTINUE,
+                                           RESCAN_DONE, RESCAN_FULL)
+
+
+class FakeDevice(object):
+    core = None
+
+    def journal(self, entry):
+        pass
+
+    def mark_dirty(self):
+        pass
+
+
+class MyTest(unittest.TestCase):
+    def setUp(self):
+        self.aldb = ALDB(FakeDevice())
+        self.aldb.load_aldb_records({
+            '0FFF': 'E201AABBCCFF1C01',
+            '0FF7': '2201112233000000',
+            '0FEF': 'A2011122330000FF',
+            '0FE7': '0000000000000000'})
+
+    def test_empty_cache(self):
+        rescan = ALDBRescan(ALDB(FakeDevice()))
+        self.assertFalse(rescan.possible)
+
+    def test_starts_at_first_empty_record(self):
+        rescan = ALDBRescan(self.aldb)
+        self.assertTrue(rescan.possible)
+        self.assertEqual(rescan.start_key, '0FF7')
+
+    def test_link_in_deleted_record(self):
+        rescan = ALDBRescan(self.aldb)
+        self.aldb.get_record('0FF7').raw = bytes.fromhex('A2014455660000FF')
+        self.assertEqual(rescan.record_read('0FF7'), RESCAN_CONTINUE)
+        # The cached highwater mark is still to be read
+        self.assertEqual(rescan.record_read('0FEF'), RESCAN_CONTINUE)
+        self.assertEqual(rescan.record_read('0FE7'), RESCAN_DONE)
+
+    def test_links_in_deleted_record_and_at_highwater(self):
+        rescan = ALDBRescan(self.aldb)
+        self.aldb.get_record('0FF7').raw = bytes.fromhex('A2014455660000FF')
+        self.aldb.get_record('0FE7').raw = bytes.fromhex('A2017788990000FF')
+        self.assertEqual(rescan.record_read('0FF7'), RESCAN_CONTINUE)
+        self.assertEqual(rescan.record_read('0FEF'), RESCAN_CONTINUE)
+        self.assertEqual(rescan.record_read('0FE7'), RESCAN_CONTINUE)
+        # Not in the cache, the new highwater mark
+        self.aldb.get_record('0FDF')
+        self.assertEqual(rescan.record_read('0FDF'), RESCAN_DONE)
+
+    def test_link_at_highwater(self):
+        self.aldb.get_record('0FF7').raw = bytes.fromhex('E201AABBCCFF1C02')
+        rescan = ALDBRescan(self.aldb)
+        self.assertEqual(rescan.start_key, '0FE7')
+        self.aldb.get_record('0FE7').raw = bytes.fromhex('A2014455660000FF')
+        self.assertEqual(rescan.record_read('0FE7'), RESCAN_CONTINUE)
+        # Not in the cache, a new highwater mark
+        self.aldb.get_record('0FDF')
+        self.assertEqual(rescan.record_read('0FDF'), RESCAN_DONE)
+
+    def test_two_holes(self):
+        self.aldb.clear_all_records()
+        self.aldb.load_aldb_records({
+            '0FFF': 'E201AABBCCFF1C01',
+            '0FF7': '2201112233000000',
+            '0FEF': 'A2011122330000FF',
+            '0FE7': '2201112233000000',
+            '0FDF': 'E201445566000001',
+            '0FD7': '0000000000000000'})
+        rescan = ALDBRescan(self.aldb)
+        self.assertEqual(rescan.start_key, '0FF7')
+        self.aldb.get_record('0FF7').raw = bytes.fromhex('A2014455660000FF')
+        self.assertEqual(rescan.record_read('0FF7'), RESCAN_CONTINUE)
+        # Unchanged, but the hole below may hold another new link
+        self.assertEqual(rescan.record_read('0FEF'), RESCAN_CONTINUE)
+        self.aldb.get_record('0FE7').raw = bytes.fromhex('A2017788990000FF')
+        self.assertEqual(rescan.record_read('0FE7'), RESCAN_CONTINUE)
+        self.assertEqual(rescan.record_read('0FDF'), RESCAN_CONTINUE)
+        self.assertEqual(rescan.record_read('0FD7'), RESCAN_DONE)
+
+    def test_second_hole_unchanged(self):
+        self.aldb.get_record('0FE7').raw = bytes.fromhex('2201112233000000')
+        self.aldb.get_record('0FDF').raw = bytes.fromhex('0000000000000000')
+        rescan = ALDBRescan(self.aldb)
+        self.aldb.get_record('0FF7').raw = bytes.fromhex('A2014455660000FF')
+        self.assertEqual(rescan.record_read('0FF7'), RESCAN_CONTINUE)
+        self.assertEqual(rescan.record_read('0FEF'), RESCAN_CONTINUE)
+        self.assertEqual(rescan.record_read('0FE7'), RESCAN_CONTINUE)
+        self.assertEqual(rescan.record_read('0FDF'), RESCAN_DONE)
+
+    def test_changed_elsewhere(self):
+        rescan = ALDBRescan(self.aldb)
+        self.aldb.get_record('0FFF').raw = bytes.fromhex('2201AABBCCFF1C01')
+        self.assertEqual(rescan.record_read('0FF7'), RESCAN_FULL)
+
+
+if __name__ == '__main__':
+    unittest.main()
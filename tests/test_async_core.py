@@ -0,0 +1,147 @@
+import asyncio
+import contextlib
+import io
+import tempfile
+import unittest
+# append parent directory to import path
+import env
+# now we can import the lib module
+from insteon_mngr import AsyncInsteonCore
+from insteon_mngr.modem import Modem
+
+
+def plm_ack(msg):
+    return bytes(msg) + b'\x06'
+
+
+def plm_nak(msg):
+    return bytes(msg) + b'\x15'
+
+
+def device_ack(msg):
+    '''The direct ack sent by the device addressed by the insteon msg'''
+    return (b'\x02\x50' + bytes(msg[2:5]) + bytes.fromhex('AABBCC') +
+            b'\x2B' + bytes(msg[6:8]))
+
+
+class LoopbackModem(Modem):
+    '''A modem without hardware, each message written is passed to
+    responder, which returns the bytes the modem sends back'''
+
+    def __init__(self, core):
+        super().__init__(core, device_id='AABBCC')
+        self.attribute('type', 'loopback')
+        self.written = []
+        self.responder = plm_ack
+
+    def _read_from_port(self):
+        pass
+
+    def _write_to_port(self, msg):
+        self.written.append(bytes(msg))
+        self._read_buffer.extend(self.responder(msg))
+        self.wake()
+
+
+class AsyncCoreTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.errors = []
+        asyncio.get_running_loop().set_exception_handler(
+            lambda loop, context: self.errors.append(context))
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.core = AsyncInsteonCore(config_path=tempfile.mkdtemp(),
+                                         web_server=False)
+            self.modem = LoopbackModem(self.core)
+            self.core._modems.append(self.modem)
+            # Fully cached and recently checked, so it is not initialized
+            self.device = self.modem.add_device('112233', attributes={
+                'engine_version': 2, 'dev_cat': 1, 'sub_cat': 32,
+                'firmware': 65, 'base_group_number': 1,
+                'aldb_delta_checked': 2 ** 40})
+        self.task = asyncio.get_running_loop().create_task(self.core.run())
+
+    async def asyncTearDown(self):
+        self.core.close()
+        await asyncio.wait_for(self.task, 5)
+        self.assertEqual(self.errors, [])
+
+    async def result(self, future):
+        return await asyncio.wait_for(future, 5)
+
+    async def test_plm_ack(self):
+        future = self.core.send_command(self.modem, 'cancel_cleanup')
+        self.assertTrue(await self.result(future))
+        self.assertEqual(self.modem.written, [bytes.fromhex('0274')])
+
+    async def test_unknown_command(self):
+        future = self.core.send_command(self.device, 'no_such_command')
+        self.assertFalse(await self.result(future))
+
+    async def test_device_ack(self):
+        future = self.core.set_state(self.device.base_group, 'ON')
+        # The PLM ack alone does not resolve an insteon message
+        await asyncio.sleep(.1)
+        self.assertEqual(len(self.modem.written), 1)
+        self.assertFalse(future.done())
+        self.modem._read_buffer.extend(device_ack(self.modem.written[0]))
+        self.modem.wake()
+        self.assertTrue(await self.result(future))
+        self.assertEqual(self.device.base_group.state, 0xFF)
+
+    async def test_device_ack_in_order(self):
+        self.modem.responder = lambda msg: plm_ack(msg) + device_ack(msg)
+        futures = [self.core.send_command(self.device, 'on'),
+                   self.core.send_command(self.device, 'light_status_request')]
+        self.assertEqual(await self.result(asyncio.gather(*futures)),
+                         [True, True])
+        self.assertEqual([msg[6] for msg in self.modem.written], [0x11, 0x19])
+
+    async def test_nak_is_retried(self):
+        responses = [plm_nak, plm_ack]
+        self.modem.responder = lambda msg: responses.pop(0)(msg)
+        future = self.core.send_command(self.modem, 'cancel_cleanup')
+        self.assertTrue(await self.result(future))
+        self.assertEqual(len(self.modem.written), 2)
+
+    async def test_failure(self):
+        self.modem.set_ack_time(10)
+        self.modem.responder = lambda msg: b''
+        future = self.core.send_command(self.modem, 'cancel_cleanup')
+        self.assertFalse(await self.result(future))
+        # Sent once then retried three times
+        self.assertEqual(len(self.modem.written), 4)
+
+    async def test_cancelled(self):
+        self.modem.set_ack_time(10)
+        self.modem.responder = lambda msg: b''
+        future = self.core.send_command(self.modem, 'cancel_cleanup')
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for(future, 0)
+        self.assertTrue(future.cancelled())
+        # The message failing afterwards is ignored and the modem carries on
+        self.modem.responder = plm_ack
+        future = self.core.send_command(self.modem, 'cancel_cleanup')
+        self.assertTrue(await self.result(future))
+
+    async def test_query_aldb(self):
+        def responder(msg):
+            ret = plm_nak(msg)
+            if msg == bytes.fromhex('0269'):
+                ret = plm_ack(msg) + bytes.fromhex('0257E2014455660000FF')
+            return ret
+        self.modem.responder = responder
+        future = self.core.query_aldb(self.modem)
+        self.assertTrue(await self.result(future))
+        self.assertEqual(self.modem.aldb.get_all_records_str(),
+                         {'0001': 'E2014455660000FF'})
+        self.assertIsNotNone(self.modem.get_device_by_addr('445566'))
+
+    async def test_query_aldb_failure(self):
+        self.modem.set_ack_time(10)
+        self.modem.responder = lambda msg: b''
+        future = self.core.query_aldb(self.modem)
+        self.assertFalse(await self.result(future))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,169 @@
+import unittest
+# append parent directory to import path
+import env
+# now we can import the lib module
+from insteon_mngr.insteon_device import Device_ALDB
+from insteon_mngr.sequences.i2_device import ScanDeviceALDBi2
+from insteon_mngr.timer import TimerWheel
+from insteon_mngr.trigger import Trigger_Manager
+
+
+class FakeMessage(object):
+    def __init__(self):
+        self.raw = {}
+
+    def insert_bytes_into_raw(self, values):
+        self.raw.update(values)
+
+
+class FakeRcvdMessage(object):
+    '''An extended read_aldb response from the device'''
+    allow_trigger = True
+    message_type = 'direct'
+    msg_length = 'extended'
+
+    def __init__(self, device, key):
+        self.insteon_msg = self
+        self.parsed_attributes = {
+            'from_addr_hi': device.dev_addr_hi,
+            'from_addr_mid': device.dev_addr_mid,
+            'from_addr_low': device.dev_addr_low,
+            'plm_cmd': 0x51,
+            'cmd_1': 0x2F,
+            'usr_3': int(key[:2], 16),
+            'usr_4': int(key[2:], 16)}
+
+    def get_byte_by_name(self, name):
+        return self.parsed_attributes[name]
+
+
+class FakePLM(object):
+    def __init__(self):
+        self.timers = TimerWheel()
+        self.trigger_mngr = Trigger_Manager(self)
+
+
+class FakeSendHandler(object):
+    msg_schema = {'read_aldb': {'cmd_1': {'default': 0x2F},
+                                'msg_length': 'extended'}}
+
+    def __init__(self, device):
+        self._device = device
+
+    def i2_get_aldb(self, dev_bytes):
+        message = self._device.create_message('read_aldb')
+        message.insert_bytes_into_raw(dev_bytes)
+        self._device.queue_device_msg(message)
+
+
+class FakeDevice(object):
+    core = None
+    dev_addr_hi, dev_addr_mid, dev_addr_low = 0x11, 0x22, 0x33
+    dev_addr_str = '112233'
+
+    def __init__(self):
+        self.plm = FakePLM()
+        self.aldb = Device_ALDB(self)
+        self.send_handler = FakeSendHandler(self)
+        # The scan asks for the aldb_delta once it is done
+        self.base_group = self
+        self.device = self
+        self.last_rcvd_msg = None
+        self.sent = []
+        self.commands = []
+
+    def journal(self, entry):
+        pass
+
+    def mark_dirty(self):
+        pass
+
+    def attribute(self, name):
+        # pylint: disable=W0613
+        return 0x02
+
+    def create_message(self, command_name):
+        # pylint: disable=W0613
+        return FakeMessage()
+
+    def queue_device_msg(self, message):
+        self.sent.append(message.raw)
+
+    def send_command(self, command_name):
+        self.commands.append(command_name)
+
+    def receive_record(self, key, raw):
+        '''The device answers the request for the record at key'''
+        self.aldb.get_record(key).raw = bytes.fromhex(raw)
+        self.last_rcvd_msg = FakeRcvdMessage(self, key)
+        self.plm.trigger_mngr.test_triggers(self.last_rcvd_msg)
+
+
+class MyTest(unittest.TestCase):
+    def setUp(self):
+        self.device = FakeDevice()
+        self.scan = ScanDeviceALDBi2(device=self.device)
+        self.scan.start()
+
+    def stream(self, key, raw):
+        self.device.aldb.get_record(key).raw = bytes.fromhex(raw)
+        self.device.aldb.stream_handler(key)
+
+    def stream_stops(self):
+        self.device.plm.timers.advance(self.device.plm.timers.next_deadline())
+
+    @property
+    def requested(self):
+        '''The records requested one at a time, after the bulk request'''
+        return [(raw['msb'] << 8) + raw['lsb']
+                for raw in self.device.sent[1:]]
+
+    @property
+    def finished(self):
+        return self.device.commands == ['light_status_request']
+
+    def test_requests_all_records(self):
+        self.assertEqual(self.device.sent, [
+            {'msb': 0x00, 'lsb': 0x00, 'num_records': 0x00}])
+        self.assertIsNotNone(self.device.aldb.stream_handler)
+
+    def test_complete_stream(self):
+        self.stream('0FFF', 'E201AABBCCFF1C01')
+        self.stream('0FF7', 'A2011122330000FF')
+        self.stream('0FEF', '0000000000000000')
+        self.assertIsNone(self.device.aldb.stream_handler)
+        self.assertEqual(self.requested, [])
+        self.assertTrue(self.finished)
+
+    def test_gaps_requested(self):
+        self.stream('0FFF', 'E201AABBCCFF1C01')
+        self.stream('0FE7', 'A2011122330000FF')
+        self.stream('0FDF', '0000000000000000')
+        self.assertEqual(self.requested, [0x0FF7])
+        self.device.receive_record('0FF7', '2201AABBCC000001')
+        self.assertEqual(self.requested, [0x0FF7, 0x0FEF])
+        self.assertFalse(self.finished)
+        self.device.receive_record('0FEF', '2201AABBCC000001')
+        self.assertTrue(self.finished)
+
+    def test_stream_stops(self):
+        self.stream('0FFF', 'E201AABBCCFF1C01')
+        self.stream('0FEF', 'A2011122330000FF')
+        self.stream_stops()
+        self.assertIsNone(self.device.aldb.stream_handler)
+        self.assertEqual(self.requested, [0x0FF7])
+        # Then reads on from the last record streamed
+        self.device.receive_record('0FF7', '2201AABBCC000001')
+        self.assertEqual(self.requested, [0x0FF7, 0x0FE7])
+        self.device.receive_record('0FE7', '0000000000000000')
+        self.assertTrue(self.finished)
+
+    def test_no_stream(self):
+        self.stream_stops()
+        self.assertEqual(self.requested, [0x0FFF])
+        self.device.receive_record('0FFF', 'E201AABBCCFF1C01')
+        self.assertEqual(self.requested, [0x0FFF, 0x0FF7])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,30 @@
+import unittest
+# append parent directory to import path
+import env
+# now we can import the lib module
+from insteon_mngr.catalog import DeviceCatalog
+
+
+class MyTest(unittest.TestCase):
+    def setUp(self):
+        self.catalog = DeviceCatalog()
+
+    def test_lazy(self):
+        self.assertIsNone(self.catalog._categories)
+        self.assertIsNone(self.catalog._models)
+
+    def test_category(self):
+        self.assertEqual(self.catalog.category(0x01)['type'], 'dimmer')
+        self.assertIsNone(self.catalog.category(0xFE))
+
+    def test_model(self):
+        self.assertEqual(self.catalog.model(0x00, 0x05)['name'], 'RemoteLinc')
+        self.assertEqual(self.catalog.model(0x05, 0x04)['key'], '000024')
+        self.assertIsNone(self.catalog.model(0xFE, 0xFE))
+        # Every entry in the data file is indexed
+        self.assertEqual(len(self.catalog._model_index),
+                         len(self.catalog.models))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import unittest
+# append parent directory to import path
+import env
+# now we can import the lib module
+from insteon_mngr.base_objects import Root
+from insteon_mngr.plm_message import PLM_Message
+from insteon_mngr.scheduler import MessageScheduler
+from insteon_mngr.init_scheduler import InitScheduler
+
+
+class FakePLM(object):
+    def __init__(self):
+        self.scheduler = MessageScheduler()
+        self.init_scheduler = InitScheduler(self)
+
+    def wake(self):
+        pass
+
+
+class FakeGroup(object):
+    def __init__(self, group_number):
+        self.group_number = group_number
+
+
+class MyTest(unittest.TestCase):
+    def setUp(self):
+        self.plm = FakePLM()
+        self.root = Root(None, self.plm)
+        self.group = FakeGroup(1)
+
+    def state_msg(self, group, cmd_2):
+        msg = PLM_Message(self.plm,
+                          plm_cmd='all_link_send',
+                          plm_bytes={'group': group.group_number,
+                                     'cmd_1': 0x11, 'cmd_2': cmd_2})
+        msg.state_group = group
+        return msg
+
+    def test_latest_state_kept(self):
+        dropped = 0
+        for level in range(10):
+            dropped += self.root.queue_device_msg(
+                self.state_msg(self.group, level))
+        last = self.state_msg(self.group, 0xFF)
+        dropped += self.root.queue_device_msg(last)
+        self.assertEqual(dropped, 10)
+        self.assertEqual(self.root.out_queue, [last])
+
+    def test_other_messages_kept(self):
+        other_group = FakeGroup(2)
+        plain = PLM_Message(self.plm, plm_cmd='all_link_send',
+                            plm_bytes={'group': 1, 'cmd_1': 0x11,
+                                       'cmd_2': 0x00})
+        other = self.state_msg(other_group, 0x00)
+        self.root.queue_device_msg(plain)
+        self.root.queue_device_msg(self.state_msg(self.group, 0x00))
+        self.root.queue_device_msg(other)
+        last = self.state_msg(self.group, 0xFF)
+        self.assertEqual(self.root.queue_device_msg(last), 1)
+        # In the place of the message it replaced
+        self.assertEqual(self.root.out_queue, [plain, last, other])
+
+    def test_callbacks_moved(self):
+        calls = []
+        first = self.state_msg(self.group, 0x00)
+        first.plm_success_callback = lambda: calls.append('first')
+        first.msg_failure_callback = lambda: calls.append('first failed')
+        second = self.state_msg(self.group, 0xFF)
+        second.plm_success_callback = lambda: calls.append('second')
+        self.root.queue_device_msg(first)
+        self.root.queue_device_msg(second)
+        second.plm_ack = True
+        self.assertEqual(calls, ['first', 'second'])
+        second.failed = True
+        self.assertEqual(calls, ['first', 'second', 'first failed'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,202 @@
+import unittest
+# append parent directory to import path
+import env
+# now we can import the lib module
+from insteon_mngr.insteon_device import Device_ALDB
+from insteon_mngr.sequences import CompactDeviceALDB, WriteALDBRecord
+from insteon_mngr.sequences.compaction import ALDBCompactionPlan
+from insteon_mngr.timer import TimerWheel
+
+
+class FakeWrite(WriteALDBRecord):
+    '''Writes the record to the cache as soon as it is started, unless its
+    condition no longer holds by then'''
+    def __init__(self, device):
+        super().__init__()
+        self._device = device
+
+    def start(self):
+        # Whatever happened while the write was queued
+        self._device.before_write()
+        if not self.is_writable():
+            self._on_failure()
+        else:
+            self._device.writes.append((self.key, self.raw))
+            self._device.aldb.get_record(self.key).raw = self.raw
+            self._on_success()
+
+
+class FakeSendHandler(object):
+    def __init__(self, device):
+        self._device = device
+
+    def get_status(self, success=None, failure=None):
+        # pylint: disable=W0613
+        self._device.before_status()
+        success()
+
+    def write_record(self, key=None, raw=None):
+        ret = FakeWrite(self._device)
+        ret.key = key
+        ret.raw = raw
+        return ret
+
+
+class FakePLM(object):
+    def __init__(self):
+        self.timers = TimerWheel()
+
+
+class FakeUserLink(object):
+    def __init__(self, controller_key, responder_key):
+        self.controller_key = controller_key
+        self.responder_key = responder_key
+
+    def set_controller_key(self, key):
+        self.controller_key = key
+
+    def set_responder_key(self, key):
+        self.responder_key = key
+
+
+class FakeCore(object):
+    link_index = None
+
+    def __init__(self):
+        self.controller_links = {}
+
+    def links_changed(self):
+        pass
+
+    def get_user_links_for_this_controller_device(self, controller_device):
+        # pylint: disable=W0613
+        return self.controller_links
+
+
+class FakeDevice(object):
+    dev_addr_str = '112233'
+
+    def __init__(self):
+        self.core = FakeCore()
+        self.plm = FakePLM()
+        self.aldb = Device_ALDB(self)
+        self.send_handler = FakeSendHandler(self)
+        self.writes = []
+        self.user_links = {}
+        self.before_status = lambda: None
+        self.before_write = lambda: None
+
+    def journal(self, entry):
+        pass
+
+    def mark_dirty(self):
+        pass
+
+    def get_all_user_links(self):
+        return self.user_links
+
+
+class MyTest(unittest.TestCase):
+    def setUp(self):
+        self.device = FakeDevice()
+        self.device.aldb.load_aldb_records({
+            '0FFF': 'E201AABBCC000001',
+            '0FF7': '2201AABBCC000001',
+            '0FEF': 'A201AABBCCFF1F01',
+            '0FE7': '2201445566000001',
+            '0FDF': 'E202445566000002',
+            '0FD7': '0000000000000000'})
+
+    def run_compaction(self):
+        sequence = CompactDeviceALDB(device=self.device)
+        sequence.start()
+        while not sequence.is_complete:
+            self.device.plm.timers.advance(
+                self.device.plm.timers.next_deadline())
+        return sequence
+
+    def test_plan(self):
+        plan = ALDBCompactionPlan(self.device.aldb)
+        self.assertEqual(plan.moves, [('0FDF', '0FF7')])
+        self.assertEqual(plan.highwater, '0FE7')
+
+    def test_plan_not_needed(self):
+        self.device.aldb.clear_all_records()
+        self.device.aldb.load_aldb_records({
+            '0FFF': 'E201AABBCC000001',
+            '0FF7': '0000000000000000'})
+        plan = ALDBCompactionPlan(self.device.aldb)
+        self.assertFalse(plan.is_needed)
+
+    def test_trailing_deleted_records(self):
+        self.device.aldb.get_record('0FF7').raw = bytes.fromhex(
+            'A201AABBCC000001')
+        self.device.aldb.get_record('0FDF').raw = bytes.fromhex(
+            '2202445566000002')
+        plan = ALDBCompactionPlan(self.device.aldb)
+        self.assertEqual(plan.moves, [])
+        self.assertEqual(plan.highwater, '0FE7')
+
+    def test_compaction(self):
+        responder = FakeUserLink(None, '0FDF')
+        controller = FakeUserLink('0FDF', None)
+        other = FakeUserLink('0FFF', '0FEF')
+        self.device.user_links = {1: responder, 2: other}
+        self.device.core.controller_links = {3: controller}
+        sequence = self.run_compaction()
+        self.assertTrue(sequence.is_success)
+        # Only the flags of the highwater mark change
+        self.assertEqual(self.device.writes, [
+            ('0FF7', bytes.fromhex('E202445566000002')),
+            ('0FE7', bytes.fromhex('0001445566000001'))])
+        self.assertEqual(self.device.aldb.get_all_records_str(), {
+            '0FFF': 'E201AABBCC000001',
+            '0FF7': 'E202445566000002',
+            '0FEF': 'A201AABBCCFF1F01',
+            '0FE7': '0001445566000001'})
+        self.assertEqual(responder.responder_key, '0FF7')
+        self.assertEqual(controller.controller_key, '0FF7')
+        self.assertEqual((other.controller_key, other.responder_key),
+                         ('0FFF', '0FEF'))
+
+    def test_stops_if_changed(self):
+        sequence = CompactDeviceALDB(device=self.device)
+        sequence.start()
+        # A new record written below the highwater mark meanwhile
+        self.device.aldb.get_record('0FE7').raw = bytes.fromhex(
+            'A201778899000001')
+        while not sequence.is_complete:
+            self.device.plm.timers.advance(
+                self.device.plm.timers.next_deadline())
+        self.assertFalse(sequence.is_success)
+        self.assertEqual(len(self.device.writes), 1)
+        self.assertTrue(self.device.aldb.has_record('0FDF'))
+
+    def test_rescanned_before_planning(self):
+        def new_link():
+            # Found by the rescan the status request starts
+            self.device.aldb.get_record('0FF7').raw = bytes.fromhex(
+                'A201778899000001')
+        self.device.before_status = new_link
+        sequence = self.run_compaction()
+        self.assertTrue(sequence.is_success)
+        self.assertEqual(self.device.writes, [
+            ('0FE7', bytes.fromhex('E202445566000002')),
+            ('0FDF', bytes.fromhex('0002445566000002'))])
+        self.assertEqual(self.device.aldb.get_record('0FF7').raw,
+                         bytes.fromhex('A201778899000001'))
+
+    def test_target_checked_when_written(self):
+        def new_link():
+            self.device.aldb.get_record('0FF7').raw = bytes.fromhex(
+                'A201778899000001')
+        self.device.before_write = new_link
+        sequence = self.run_compaction()
+        self.assertFalse(sequence.is_success)
+        self.assertEqual(self.device.writes, [])
+        self.assertEqual(self.device.aldb.get_record('0FF7').raw,
+                         bytes.fromhex('A201778899000001'))
+
+
+if __name__ == '__main__':
+    unittest.main()
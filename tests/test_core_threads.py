@@ -0,0 +1,116 @@
+import contextlib
+import io
+import tempfile
+import threading
+import unittest
+from unittest import mock
+# append parent directory to import path
+import env
+# now we can import the lib module
+from insteon_mngr import Insteon_Core
+from insteon_mngr import core as core_module
+from insteon_mngr.modem import Modem
+
+
+class LoopbackModem(Modem):
+    '''A modem without hardware, which records the threads processing it.
+    If hold is set, each read waits until it is released.'''
+
+    def __init__(self, core, device_id):
+        super().__init__(core, device_id=device_id)
+        self.attribute('type', 'loopback')
+        self.threads = []
+        self.processed = threading.Event()
+        self.holding = threading.Event()
+        self.hold = None
+
+    def _read_from_port(self):
+        self.threads.append(threading.current_thread())
+        self.processed.set()
+        if self.hold is not None:
+            self.holding.set()
+            self.hold.wait(5)
+
+    def _write_to_port(self, msg):
+        pass
+
+
+class CoreThreadTest(unittest.TestCase):
+    def setUp(self):
+        # Only a wake, never the idle timeout, processes a modem again
+        patcher = mock.patch.object(core_module, 'MAX_IDLE_WAIT', 60)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.core = Insteon_Core(config_path=tempfile.mkdtemp(),
+                                     web_server=False)
+            self.modem_a = LoopbackModem(self.core, 'AABBCC')
+            self.modem_b = LoopbackModem(self.core, 'DDEEFF')
+        self.core._modems.extend([self.modem_a, self.modem_b])
+        self.core.wake()
+        self.assertTrue(self.modem_a.processed.wait(5))
+        self.assertTrue(self.modem_b.processed.wait(5))
+
+    def tearDown(self):
+        for modem in (self.modem_a, self.modem_b):
+            if modem.hold is not None:
+                modem.hold.set()
+        self.core.close()
+
+    def wait_for_both(self):
+        self.modem_a.processed.clear()
+        self.modem_b.processed.clear()
+        self.core.wake()
+        self.assertTrue(self.modem_a.processed.wait(5))
+        self.assertTrue(self.modem_b.processed.wait(5))
+
+    def test_thread_per_modem(self):
+        self.wait_for_both()
+        self.wait_for_both()
+        threads_a = set(self.modem_a.threads)
+        threads_b = set(self.modem_b.threads)
+        self.assertEqual(len(threads_a), 1)
+        self.assertEqual(len(threads_b), 1)
+        self.assertNotEqual(threads_a, threads_b)
+        self.assertNotIn(threading.current_thread(), threads_a | threads_b)
+
+    def test_wake_modem(self):
+        self.modem_a.processed.clear()
+        self.modem_b.processed.clear()
+        self.core.wake(self.modem_a)
+        self.assertTrue(self.modem_a.processed.wait(5))
+        self.assertFalse(self.modem_b.processed.wait(.2))
+        self.modem_a.processed.clear()
+        self.core.wake(self.modem_b)
+        self.assertTrue(self.modem_b.processed.wait(5))
+        self.assertFalse(self.modem_a.processed.wait(.2))
+
+    def test_journal_waits_for_processing(self):
+        self.modem_a.hold = threading.Event()
+        self.core.wake(self.modem_a)
+        self.assertTrue(self.modem_a.holding.wait(5))
+        self.core._writer.flush()
+        length = self.core._writer.journal_length
+        journaling = threading.Thread(
+            target=self.modem_b.attribute, args=['name', 'Garage'])
+        journaling.start()
+        journaling.join(.2)
+        self.assertTrue(journaling.is_alive())
+        self.assertEqual(self.core._writer.journal_length, length)
+        self.modem_a.hold.set()
+        journaling.join(5)
+        self.assertFalse(journaling.is_alive())
+        self.core._writer.flush()
+        self.assertEqual(self.core._writer.journal_length, length + 1)
+
+    def test_processing_waits_for_lock(self):
+        # As held by the web interface while answering a request
+        with self.core.lock:
+            self.modem_a.processed.clear()
+            self.core.wake(self.modem_a)
+            self.assertFalse(self.modem_a.processed.wait(.2))
+        self.assertTrue(self.modem_a.processed.wait(5))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+import unittest
+# append parent directory to import path
+import env
+# now we can import the lib module
+from insteon_mngr.insteon_device import Device_ALDB
+from insteon_mngr.sequences.i1_device import ScanDeviceALDBi1
+
+
+class FakeCore(object):
+    link_index = None
+
+    def __init__(self):
+        self.link_generation = 0
+
+    def links_changed(self):
+        self.link_generation += 1
+
+
+class FakeDevice(object):
+    def __init__(self):
+        self.core = FakeCore()
+        self.aldb = Device_ALDB(self)
+
+    def journal(self, entry):
+        pass
+
+    def mark_dirty(self):
+        pass
+
+    def attribute(self, name):
+        # pylint: disable=W0613
+        return 0x00
+
+
+class ByteScan(ScanDeviceALDBi1):
+    '''Answers the requests from memory, a dict of address to byte, rather
+    than sending them'''
+    def __init__(self, device, memory):
+        super().__init__(device=device)
+        self.memory = memory
+        self.msbs_sent = []
+        self.peeks = []
+        self.finished = False
+        self._pending = None
+
+    def _i1_start_aldb_entry_query(self, msb, lsb):
+        self.msbs_sent.append(msb)
+        self._device.aldb.address_msb = msb
+        self._send_peek_request(lsb)
+
+    def _send_peek_request(self, lsb):
+        self._peeks_sent += 1
+        self._pending = lsb
+
+    def _finish(self):
+        self.finished = True
+
+    def run(self):
+        self.start()
+        while not self.finished:
+            msb = self._device.aldb.address_msb
+            lsb = self._pending
+            self.peeks.append((msb << 8) + lsb)
+            self._device.aldb.store_peeked_byte(
+                msb, lsb, self.memory.get((msb << 8) + lsb, 0x00))
+            self._get_byte_address()
+
+
+def memory_of(records):
+    ret = {}
+    for key, raw in records.items():
+        for offset, byte in enumerate(bytes.fromhex(raw)):
+            ret[int(key, 16) - 7 + offset] = byte
+    return ret
+
+
+class MyTest(unittest.TestCase):
+    def setUp(self):
+        self.device = FakeDevice()
+        self.records = {
+            '0FFF': 'E201AABBCCFF1C01',
+            '0FF7': '2201112233000000',
+            '0FEF': 'A2011122330000FF',
+            '0FE7': '0000000000000000'}
+        self.scan = ByteScan(self.device, memory_of(self.records))
+        self.progress = []
+        self.scan.add_progress_callback(
+            lambda records, peeks: self.progress.append((records, peeks)))
+
+    def test_scan(self):
+        self.scan.run()
+        self.assertEqual(self.device.aldb.get_all_records_str(), {
+            '0FFF': 'E201AABBCCFF1C01',
+            '0FF7': '2200000000000000',
+            '0FEF': 'A2011122330000FF',
+            '0FE7': '0000000000000000'})
+        # Only the flags of records not in use are read
+        self.assertEqual(len(self.scan.peeks), 8 + 1 + 8 + 1)
+        self.assertEqual(self.scan.peeks[8], 0x0FF0)
+        self.assertEqual(self.scan.msbs_sent, [0x0F])
+        self.assertEqual(self.progress, [(1, 8), (2, 9), (3, 17), (4, 18)])
+        # Once for clearing the cache, then once per record not per byte
+        self.assertEqual(self.device.core.link_generation, 1 + 4)
+
+    def test_msb_not_resent(self):
+        self.device.aldb.address_msb = 0x0F
+        self.scan.run()
+        self.assertEqual(self.scan.msbs_sent, [])
+
+    def test_crosses_msb(self):
+        records = {'0F07': 'E201AABBCCFF1C01', '0EFF': '0000000000000000'}
+        memory = memory_of(records)
+        for key in range(0x0FFF, 0x0F07, -8):
+            memory[key - 7] = 0x22
+        scan = ByteScan(self.device, memory)
+        scan.run()
+        self.assertEqual(scan.msbs_sent, [0x0F, 0x0E])
+        self.assertEqual(scan.peeks[-1], 0x0EF8)
+
+
+if __name__ == '__main__':
+    unittest.main()
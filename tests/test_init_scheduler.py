@@ -0,0 +1,115 @@
+import time
+import unittest
+# append parent directory to import path
+import env
+# now we can import the lib module
+from insteon_mngr.init_scheduler import (InitScheduler, INIT_TIMEOUT,
+                                         MAX_CONCURRENT_INITS, REVALIDATE_AGE)
+from insteon_mngr.timer import TimerWheel
+
+
+class FakeModem(object):
+    def __init__(self):
+        self.timers = TimerWheel()
+
+
+class FakeSendHandler(object):
+    def __init__(self):
+        self.callbacks = None
+
+    def get_status(self, success=None, failure=None):
+        self.callbacks = (success, failure)
+
+
+class FakeDevice(object):
+    '''A device with everything cached, so its initialization only
+    requests the status'''
+    def __init__(self, name, checked=None):
+        self.dev_addr_str = name
+        self.dev_cat = 0x01
+        self.sub_cat = 0x20
+        self.firmware = 0x41
+        self.stale = True
+        self.send_handler = FakeSendHandler()
+        self._attributes = {'engine_version': 0x02,
+                            'aldb_delta_checked': checked}
+
+    def attribute(self, name, value=None):
+        if value is not None:
+            self._attributes[name] = value
+        return self._attributes.get(name)
+
+    @property
+    def started(self):
+        return self.send_handler.callbacks is not None
+
+    def finish(self, success=True):
+        self.send_handler.callbacks[0 if success else 1]()
+
+
+class MyTest(unittest.TestCase):
+    def setUp(self):
+        self.modem = FakeModem()
+        self.scheduler = InitScheduler(self.modem)
+
+    def add_devices(self, count):
+        ret = [FakeDevice(str(number)) for number in range(count)]
+        for device in ret:
+            self.scheduler.add(device)
+        return ret
+
+    def test_concurrency_capped(self):
+        devices = self.add_devices(MAX_CONCURRENT_INITS + 3)
+        self.assertEqual(self.scheduler.running,
+                         devices[:MAX_CONCURRENT_INITS])
+        self.assertEqual(len(self.scheduler), 3)
+        devices[0].finish()
+        self.assertFalse(devices[0].stale)
+        self.assertIsNotNone(devices[0].attribute('aldb_delta_checked'))
+        self.assertTrue(devices[MAX_CONCURRENT_INITS].started)
+
+    def test_touched_device_first(self):
+        devices = self.add_devices(MAX_CONCURRENT_INITS + 3)
+        self.scheduler.touch(devices[-1])
+        devices[0].finish(success=False)
+        self.assertTrue(devices[0].stale)
+        self.assertTrue(devices[-1].started)
+        self.assertFalse(devices[MAX_CONCURRENT_INITS].started)
+
+    def test_recently_validated_skipped(self):
+        recent = FakeDevice('recent', checked=time.time() - 60)
+        old = FakeDevice('old', checked=time.time() - REVALIDATE_AGE - 60)
+        self.assertFalse(self.scheduler.add(recent))
+        self.assertFalse(recent.stale)
+        self.assertFalse(recent.started)
+        self.assertTrue(self.scheduler.add(old))
+        self.assertTrue(old.started)
+
+    def test_timeout_frees_slot(self):
+        devices = self.add_devices(MAX_CONCURRENT_INITS + 1)
+        self.modem.timers.advance(time.time() + INIT_TIMEOUT + 1)
+        self.assertTrue(devices[-1].started)
+        # A late answer from a timed out device is still recorded, without
+        # starting another
+        devices[0].finish()
+        self.assertFalse(devices[0].stale)
+        self.assertIsNotNone(devices[0].attribute('aldb_delta_checked'))
+        self.assertEqual(self.scheduler.running, devices[-1:])
+
+    def test_late_answer_after_discard(self):
+        devices = self.add_devices(1)
+        self.modem.timers.advance(time.time() + INIT_TIMEOUT + 1)
+        self.scheduler.discard(devices[0])
+        devices[0].finish()
+        self.assertTrue(devices[0].stale)
+        self.assertIsNone(devices[0].attribute('aldb_delta_checked'))
+
+    def test_discard(self):
+        devices = self.add_devices(MAX_CONCURRENT_INITS + 1)
+        self.scheduler.discard(devices[0])
+        self.assertEqual(self.scheduler.running, devices[1:])
+        self.assertEqual(len(self.modem.timers), MAX_CONCURRENT_INITS)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,157 @@
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+# append parent directory to import path
+import env
+# now we can import the lib module
+from insteon_mngr import Insteon_Core
+from insteon_mngr.link_status import LinkStatusEngine
+from insteon_mngr.storage import JSONStorage
+
+
+class FakeRecord(object):
+    def __init__(self, key, defined_link=None):
+        self.key = key
+        self.defined_link = defined_link
+        self.classified = 0
+
+    def get_defined_link(self):
+        return self.defined_link
+
+    def classify(self, user_link):
+        self.classified += 1
+        if user_link is None:
+            ret = 'undefined'
+        else:
+            ret = 'good ' + user_link
+        return ret
+
+
+class FakeALDB(object):
+    def __init__(self, records):
+        self.aldb = {record.key: record for record in records}
+
+
+class FakeDevice(object):
+    def __init__(self, records):
+        self.aldb = FakeALDB(records)
+
+
+class FakeModem(FakeDevice):
+    def __init__(self, records, devices):
+        super().__init__(records)
+        self._devices = devices
+
+    def get_all_devices(self):
+        return self._devices
+
+
+class FakeCore(object):
+    def __init__(self, modems):
+        self.link_generation = 0
+        self._modems = modems
+
+    def get_all_modems(self):
+        return self._modems
+
+
+class MyTest(unittest.TestCase):
+    def setUp(self):
+        self.controller = FakeRecord('0FFF')
+        self.responder = FakeRecord('0FF7')
+        self.device = FakeDevice([self.controller, self.responder])
+        self.modem_record = FakeRecord('4095')
+        self.modem = FakeModem([self.modem_record], [self.device])
+        self.core = FakeCore([self.modem])
+        self.engine = LinkStatusEngine(self.core)
+
+    def test_classifies_every_record(self):
+        self.assertEqual(self.engine.get_statuses(), {
+            self.controller: 'undefined',
+            self.responder: 'undefined',
+            self.modem_record: 'undefined'})
+
+    def test_uses_defined_links(self):
+        self.controller.defined_link = 'a'
+        self.modem_record.defined_link = 'b'
+        self.assertEqual(self.engine.status(self.controller), 'good a')
+        self.assertEqual(self.engine.status(self.responder), 'undefined')
+        self.assertEqual(self.engine.status(self.modem_record), 'good b')
+
+    def test_memoized_until_generation_changes(self):
+        self.engine.status(self.controller)
+        self.engine.status(self.responder)
+        self.engine.get_statuses()
+        self.assertEqual(self.controller.classified, 1)
+        self.assertEqual(self.responder.classified, 1)
+        self.controller.defined_link = 'a'
+        self.assertEqual(self.engine.status(self.controller), 'undefined')
+        self.core.link_generation += 1
+        self.assertEqual(self.engine.status(self.controller), 'good a')
+        self.assertEqual(self.controller.classified, 2)
+
+    def test_record_outside_core(self):
+        record = FakeRecord('0FEF', defined_link='d')
+        self.assertEqual(self.engine.status(record), 'good d')
+        self.assertNotIn(record, self.engine.get_statuses())
+
+
+class CoreTest(unittest.TestCase):
+    '''Checks which changes to a real core advance link_generation'''
+    def setUp(self):
+        config_path = tempfile.mkdtemp()
+        JSONStorage(os.path.join(config_path, 'config.json')).save({
+            'modems': {'AABBCC': {
+                'type': 'plm', 'port': '/dev/nonexistent',
+                'aldb': {'0001': 'E2011122330000FF'},
+                'devices': {'112233': {
+                    'engine_version': 2, 'dev_cat': 1, 'sub_cat': 32,
+                    'firmware': 65, 'base_group_number': 1,
+                    'aldb': {'0FFF': 'A201AABBCCFF1C01',
+                             '0FF7': '0000000000000000'},
+                    'user_links': {'AABBCC': {'1': [{
+                        'data_1': 0xFF, 'data_2': 0x1C, 'data_3': 0x01,
+                        'controller_key': '0001',
+                        'responder_key': '0FFF'}]}}}}}}})
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.core = Insteon_Core(config_path=config_path,
+                                     web_server=False)
+        self.device = self.core.get_device_by_addr('112233')
+
+    def tearDown(self):
+        self.core.close()
+
+    def test_state_keeps_statuses(self):
+        with self.core.lock:
+            self.core.link_status.get_statuses()
+            statuses = self.core.link_status._statuses
+            generation = self.core.link_generation
+            self.device.base_group.set_cached_state(0xFF)
+            self.device.attribute('hop_array', [1, 2])
+            self.assertEqual(self.core.link_generation, generation)
+            # Not worked out again
+            self.core.link_status.get_statuses()
+            self.assertIs(self.core.link_status._statuses, statuses)
+
+    def test_user_link_lookup(self):
+        with self.core.lock:
+            record = self.device.aldb.get_record('0FFF')
+            user_link = record.get_defined_link()
+            self.assertIs(self.core.user_links.find(user_link.uid), user_link)
+            self.assertEqual(record.status(), 'good')
+            user_link.set_responder_key('0FF7')
+            self.assertIsNone(record.get_defined_link())
+            self.assertEqual(record.status(), 'undefined')
+
+    def test_record_write_advances(self):
+        with self.core.lock:
+            generation = self.core.link_generation
+            self.device.aldb.get_record('0FF7').raw = bytes.fromhex(
+                'E201AABBCC000001')
+            self.assertGreater(self.core.link_generation, generation)
+
+
+if __name__ == '__main__':
+    unittest.main()
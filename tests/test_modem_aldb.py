@@ -0,0 +1,87 @@
+import unittest
+# append parent directory to import path
+import env
+# now we can import the lib module
+from insteon_mngr.modem import Modem_ALDB
+from insteon_mngr.sequences import ReadModemALDB
+
+
+class FakeMessage(object):
+    def __init__(self, command):
+        self.command = command
+        self.msg_failure_callback = None
+
+
+class FakeModem(object):
+    core = None
+
+    def __init__(self):
+        self.aldb = Modem_ALDB(self)
+        self.aldb_reader = None
+        self.sent = []
+        self.devices_added = []
+
+    def journal(self, entry):
+        pass
+
+    def mark_dirty(self):
+        pass
+
+    def create_message(self, command):
+        return FakeMessage(command)
+
+    def send_immediately(self, message):
+        self.sent.append(message)
+
+    def add_device(self, device_id):
+        self.devices_added.append(device_id)
+
+
+class MyTest(unittest.TestCase):
+    def setUp(self):
+        self.modem = FakeModem()
+        self.modem.aldb.load_aldb_records({'0001': 'E2011122330000FF'})
+        self.reader = ReadModemALDB(modem=self.modem)
+        self.successes = []
+        self.reader.add_success_callback(lambda: self.successes.append(True))
+        self.future = self.reader.start()
+
+    def commands(self):
+        return [message.command for message in self.modem.sent]
+
+    def test_reads_all_records(self):
+        self.assertIs(self.modem.aldb_reader, self.reader)
+        self.reader.record_received(bytes.fromhex('E201AABBCC000000'))
+        self.reader.record_received(bytes.fromhex('A201AABBCC000000'))
+        self.reader.record_received(bytes.fromhex('E2024455660000FF'))
+        self.assertEqual(self.commands(), [
+            'all_link_first_rec', 'all_link_next_rec', 'all_link_next_rec',
+            'all_link_next_rec'])
+        # The cache is only replaced at the end
+        self.assertEqual(len(self.modem.aldb), 1)
+        self.assertFalse(self.future.done())
+        self.reader.end_received()
+        self.assertEqual(self.modem.aldb.get_all_records_str(), {
+            '0001': 'E201AABBCC000000',
+            '0002': 'A201AABBCC000000',
+            '0003': 'E2024455660000FF'})
+        self.assertEqual(self.modem.devices_added, ['AABBCC', '445566'])
+        self.assertIsNone(self.modem.aldb_reader)
+        self.assertTrue(self.future.result(0))
+        self.assertEqual(self.successes, [True])
+
+    def test_empty(self):
+        self.reader.end_received()
+        self.assertEqual(len(self.modem.aldb), 0)
+        self.assertTrue(self.future.result(0))
+
+    def test_failure(self):
+        self.reader.record_received(bytes.fromhex('E201AABBCC000000'))
+        self.modem.sent[-1].msg_failure_callback()
+        self.assertFalse(self.future.result(0))
+        self.assertIsNone(self.modem.aldb_reader)
+        self.assertEqual(self.successes, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
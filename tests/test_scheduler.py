@@ -0,0 +1,85 @@
+import unittest
+# append parent directory to import path
+import env
+# now we can import the lib module
+from insteon_mngr.scheduler import (MessageScheduler, PRIORITY_INTERACTIVE,
+                                    PRIORITY_STATUS, PRIORITY_BACKGROUND)
+
+
+class FakeMsg(object):
+    def __init__(self, creation_time, priority):
+        self.creation_time = creation_time
+        self.priority = priority
+        self.insteon_msg = None
+        self.plm_cmd_type = None
+
+
+class FakeDevice(object):
+    def __init__(self, *msgs):
+        self.out_queue = list(msgs)
+
+
+class MyTest(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = MessageScheduler()
+
+    def test_empty(self):
+        self.assertFalse(self.scheduler.has_messages())
+        self.assertIsNone(self.scheduler.next_device())
+
+    def test_priority_before_age(self):
+        background = FakeDevice(FakeMsg(100, PRIORITY_BACKGROUND))
+        interactive = FakeDevice(FakeMsg(101, PRIORITY_INTERACTIVE))
+        self.scheduler.update(background)
+        self.scheduler.update(interactive)
+        self.assertTrue(self.scheduler.has_messages())
+        self.assertIs(self.scheduler.next_device(), interactive)
+
+    def test_aging(self):
+        status = FakeDevice(FakeMsg(100, PRIORITY_STATUS))
+        interactive = FakeDevice(FakeMsg(105, PRIORITY_INTERACTIVE))
+        self.scheduler.update(interactive)
+        self.scheduler.update(status)
+        self.assertIs(self.scheduler.next_device(), status)
+
+    def test_update_after_pop(self):
+        first = FakeDevice(FakeMsg(100, PRIORITY_STATUS),
+                           FakeMsg(110, PRIORITY_BACKGROUND))
+        second = FakeDevice(FakeMsg(105, PRIORITY_STATUS))
+        self.scheduler.update(first)
+        self.scheduler.update(second)
+        self.assertIs(self.scheduler.next_device(), first)
+        first.out_queue.pop(0)
+        self.scheduler.update(first)
+        self.assertIs(self.scheduler.next_device(), second)
+        second.out_queue.pop(0)
+        self.scheduler.update(second)
+        self.assertIs(self.scheduler.next_device(), first)
+        first.out_queue.pop(0)
+        self.scheduler.update(first)
+        self.assertFalse(self.scheduler.has_messages())
+
+    def test_last_device_kept_within_class(self):
+        first = FakeDevice(FakeMsg(100, PRIORITY_STATUS))
+        second = FakeDevice(FakeMsg(105, PRIORITY_STATUS))
+        self.scheduler.update(first)
+        self.scheduler.update(second)
+        self.assertIs(self.scheduler.next_device(second), second)
+
+    def test_last_device_yields_to_higher_class(self):
+        last = FakeDevice(FakeMsg(100, PRIORITY_BACKGROUND))
+        interactive = FakeDevice(FakeMsg(101, PRIORITY_INTERACTIVE))
+        self.scheduler.update(last)
+        self.scheduler.update(interactive)
+        self.assertIs(self.scheduler.next_device(last), interactive)
+
+    def test_discard(self):
+        device = FakeDevice(FakeMsg(100, PRIORITY_INTERACTIVE))
+        self.scheduler.update(device)
+        self.scheduler.discard(device)
+        self.assertFalse(self.scheduler.has_messages())
+        self.assertIsNone(self.scheduler.next_device(device))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,260 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+# append parent directory to import path
+import env
+# now we can import the lib module
+from insteon_mngr.storage import (JSONStorage, SQLiteStorage, StorageWriter,
+                                  pack_aldb, replay_journal, unpack_aldb,
+                                  ALDB_MAGIC)
+
+STATE = {'modems': {'AABBCC': {
+    'type': 'plm',
+    'port': '/dev/ttyUSB0',
+    'aldb': {'0001': 'E2011122330000FF'},
+    'groups': {'1': {'name': 'scene'}},
+    'user_links': {},
+    'devices': {'112233': {
+        'dev_cat': 1,
+        'aldb': {'0FFF': 'A201AABBCCFF1C01', '0FF7': '0000000000000000'},
+        'groups': {'1': {'name': 'kitchen'}},
+        'user_links': {'AABBCC': {'1': [
+            {'data_1': 255, 'data_2': 28, 'data_3': 1,
+             'controller_key': '0001', 'responder_key': '0FFF'}]}}}}}}}
+
+
+class MyTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'config.json')
+        self.storage = JSONStorage(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_missing_file(self):
+        self.assertEqual(self.storage.load(), {})
+
+    def test_round_trip(self):
+        data = {'modems': {'AABBCC': {'type': 'plm', 'aldb': {}}}}
+        self.storage.save(data)
+        self.assertEqual(self.storage.load(), data)
+        # No temporary files are left behind
+        self.assertEqual(sorted(os.listdir(self.directory)),
+                         ['config.aldb', 'config.journal', 'config.json'])
+
+    def test_unserializable_keeps_prior_file(self):
+        self.storage.save({'modems': {}})
+        self.storage.save({'modems': object()})
+        self.assertEqual(self.storage.load(), {'modems': {}})
+        self.assertEqual(sorted(os.listdir(self.directory)),
+                         ['config.aldb', 'config.journal', 'config.json'])
+
+    def test_corrupt_file(self):
+        with open(self.path, 'w') as outfile:
+            outfile.write('{"modems": ')
+        self.assertEqual(self.storage.load(), {})
+
+    def test_replay(self):
+        data = {'modems': {'AABBCC': {'type': 'plm', 'devices': {
+            '112233': {'aldb': {'0FFF': '0000000000000000'}}}}}}
+        link = {'data_1': 1, 'data_2': 2, 'data_3': 3,
+                'controller_key': None, 'responder_key': None}
+        entries = [
+            {'op': 'attr', 'modem': 'AABBCC', 'device': '112233',
+             'name': 'name', 'value': 'kitchen'},
+            {'op': 'group_attr', 'modem': 'AABBCC', 'device': None,
+             'group': 5, 'name': 'name', 'value': 'scene'},
+            {'op': 'group_attr', 'modem': 'AABBCC', 'device': '112233',
+             'group': 1, 'values': {'state': 'ON', 'state_time': 10}},
+            {'op': 'aldb', 'modem': 'AABBCC', 'device': '112233',
+             'key': '0FFF', 'raw': 'E2011122330000FF'},
+            {'op': 'link', 'modem': 'AABBCC', 'device': '112233',
+             'controller': 'AABBCC', 'group': 5, 'data': link},
+            {'op': 'add_device', 'modem': 'AABBCC', 'device': '445566'},
+            {'op': 'delete_device', 'modem': 'AABBCC', 'device': '445566'},
+        ]
+        replay_journal(data, entries)
+        # Replaying again changes nothing
+        expected = json.loads(json.dumps(data))
+        replay_journal(data, entries)
+        self.assertEqual(data, expected)
+        device = data['modems']['AABBCC']['devices']['112233']
+        self.assertEqual(device['name'], 'kitchen')
+        self.assertEqual(device['aldb']['0FFF'], 'E2011122330000FF')
+        self.assertEqual(device['groups']['1'],
+                         {'state': 'ON', 'state_time': 10})
+        self.assertEqual(device['user_links'], {'AABBCC': {'5': [link]}})
+        self.assertEqual(
+            data['modems']['AABBCC']['groups']['5']['name'], 'scene')
+        self.assertNotIn('445566', data['modems']['AABBCC']['devices'])
+        replay_journal(data, [
+            {'op': 'delete_link', 'modem': 'AABBCC', 'device': '112233',
+             'controller': 'AABBCC', 'group': 5, 'data': link},
+            {'op': 'rename_modem', 'modem': 'DDEEFF', 'device': None,
+             'old': 'AABBCC'}])
+        self.assertEqual(list(data['modems']), ['DDEEFF'])
+        device = data['modems']['DDEEFF']['devices']['112233']
+        self.assertEqual(device['user_links'], {'AABBCC': {'5': []}})
+
+    def test_journal_replayed_on_load(self):
+        self.storage.save({'modems': {'AABBCC': {'type': 'plm'}}})
+        self.storage.append([json.dumps(
+            {'op': 'attr', 'modem': 'AABBCC', 'device': None,
+             'name': 'port', 'value': '/dev/ttyUSB0'})])
+        with open(self.storage.journal_path, 'a') as outfile:
+            # A partial entry left by a crash
+            outfile.write('{"op": "at')
+        self.assertEqual(self.storage.load(), {'modems': {'AABBCC': {
+            'type': 'plm', 'port': '/dev/ttyUSB0', 'devices': {}}}})
+
+    def test_writer(self):
+        writer = StorageWriter(self.storage)
+        for count in range(5):
+            writer.submit({'count': count})
+        writer.flush()
+        self.assertEqual(self.storage.load(), {'count': 4})
+
+    def test_writer_compacts_journal(self):
+        writer = StorageWriter(self.storage)
+        entry = {'op': 'attr', 'modem': 'AABBCC', 'device': None,
+                 'name': 'type', 'value': 'plm'}
+        writer.append(json.dumps(entry))
+        writer.flush()
+        self.assertEqual(writer.journal_length, 1)
+        writer.submit({'modems': {'AABBCC': {'type': 'plm'}}})
+        writer.append(json.dumps(dict(entry, name='port', value='COM1')))
+        writer.flush()
+        # Only the entry made after the snapshot remains
+        self.assertEqual(writer.journal_length, 1)
+        with open(self.storage.journal_path) as infile:
+            self.assertEqual(len(infile.readlines()), 1)
+        self.assertEqual(self.storage.load()['modems']['AABBCC']['port'],
+                         'COM1')
+
+
+    def test_aldb_saved_as_binary(self):
+        self.storage.save(json.loads(json.dumps(STATE)))
+        with open(self.path) as infile:
+            self.assertNotIn('E2011122330000FF', infile.read())
+        self.assertEqual(os.path.getsize(self.storage.aldb_path),
+                         len(ALDB_MAGIC) + 2 * 10 + 3 * 10)
+        data = self.storage.load()
+        modem = data['modems']['AABBCC']
+        device = modem['devices']['112233']
+        self.assertEqual(bytes(modem['aldb']['0001']).hex().upper(),
+                         'E2011122330000FF')
+        self.assertEqual(sorted(device['aldb']), ['0FF7', '0FFF'])
+        # Records are writable without changing the file
+        device['aldb']['0FFF'][0] = 0x22
+        self.assertEqual(self.storage.load()['modems']['AABBCC']['devices'][
+            '112233']['aldb']['0FFF'][0], 0xA2)
+
+    def test_aldb_journal_replayed_over_binary(self):
+        self.storage.save(json.loads(json.dumps(STATE)))
+        self.storage.append([json.dumps(
+            {'op': 'aldb', 'modem': 'AABBCC', 'device': '112233',
+             'key': '0FF7', 'raw': 'E201AABBCCFF1C01'})])
+        device = self.storage.load()['modems']['AABBCC']['devices']['112233']
+        self.assertEqual(device['aldb']['0FF7'], 'E201AABBCCFF1C01')
+        self.assertEqual(bytes(device['aldb']['0FFF']).hex().upper(),
+                         'A201AABBCCFF1C01')
+
+    def test_pack_aldb_keys(self):
+        packed = bytearray(ALDB_MAGIC)
+        packed.extend(pack_aldb('AABBCC', 'AABBCC',
+                                {'0010': '0000000000000000'}))
+        packed.extend(pack_aldb('AABBCC', '112233',
+                                {'0010': '0000000000000000'}))
+        aldbs = unpack_aldb(packed)
+        # Modem positions are decimal, device positions are addresses
+        self.assertEqual(list(aldbs[('AABBCC', 'AABBCC')]), ['0010'])
+        self.assertEqual(list(aldbs[('AABBCC', '112233')]), ['0010'])
+        self.assertEqual(packed[len(ALDB_MAGIC) + 10:][:2], b'\x00\x0A')
+
+
+class SQLiteTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'config.json')
+        self.storage = SQLiteStorage(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_empty(self):
+        self.assertEqual(self.storage.load(), {})
+
+    def test_round_trip(self):
+        self.storage.load()
+        self.storage.save(STATE)
+        self.assertEqual(SQLiteStorage(self.path).load(), STATE)
+
+    def test_migrate_from_json(self):
+        JSONStorage(self.path).save(STATE)
+        self.assertEqual(self.storage.load(), STATE)
+        self.assertTrue(os.path.exists(self.storage.path))
+
+    def test_row_updates(self):
+        self.storage.load()
+        self.storage.save(STATE)
+        link = {'data_1': 255, 'data_2': 28, 'data_3': 1,
+                'controller_key': '0001', 'responder_key': '0FFF'}
+        entries = [
+            {'op': 'attr', 'modem': 'AABBCC', 'device': '112233',
+             'name': 'name', 'value': 'lamp'},
+            {'op': 'group_attr', 'modem': 'AABBCC', 'device': None,
+             'group': 1, 'name': 'name', 'value': 'all'},
+            {'op': 'group_attr', 'modem': 'AABBCC', 'device': '112233',
+             'group': 1, 'values': {'state': 'ON', 'state_time': 10}},
+            {'op': 'aldb', 'modem': 'AABBCC', 'device': '112233',
+             'key': '0FF7', 'raw': 'E201AABBCC000001'},
+            {'op': 'delete_link', 'modem': 'AABBCC', 'device': '112233',
+             'controller': 'AABBCC', 'group': 1, 'data': link},
+            {'op': 'add_device', 'modem': 'AABBCC', 'device': '445566'},
+        ]
+        self.storage.append([json.dumps(entry) for entry in entries])
+        expected = json.loads(json.dumps(STATE))
+        replay_journal(expected, entries)
+        for device in expected['modems']['AABBCC']['devices'].values():
+            for name in ('aldb', 'groups', 'user_links'):
+                device.setdefault(name, {})
+        expected['modems']['AABBCC']['devices']['112233']['user_links'] = {}
+        self.assertEqual(SQLiteStorage(self.path).load(), expected)
+
+    def test_journaled_device_not_rewritten(self):
+        deleted = []
+        self.storage._delete_device = lambda *ids: deleted.append(ids)
+        self.storage.load()
+        self.storage.save(STATE)
+        deleted[:] = []
+        entries = [{'op': 'attr', 'modem': 'AABBCC', 'device': '112233',
+                    'name': 'name', 'value': 'lamp'}]
+        self.storage.append([json.dumps(entry) for entry in entries])
+        # The next snapshot of the device already has the change
+        state = replay_journal(json.loads(json.dumps(STATE)), entries)
+        self.storage.save(state)
+        self.assertEqual(deleted, [])
+        self.assertEqual(SQLiteStorage(self.path).load(), state)
+
+    def test_modem_without_type(self):
+        self.storage.load()
+        entries = [{'op': 'attr', 'modem': 'AABBCC', 'device': None,
+                    'name': 'port', 'value': '/dev/ttyUSB0'}]
+        self.storage.append([json.dumps(entry) for entry in entries])
+        with self.assertRaises(ValueError):
+            SQLiteStorage(self.path).load()
+
+    def test_deleted_devices_removed(self):
+        self.storage.load()
+        self.storage.save(STATE)
+        state = json.loads(json.dumps(STATE))
+        del state['modems']['AABBCC']['devices']['112233']
+        self.storage.save(state)
+        self.assertEqual(SQLiteStorage(self.path).load(), state)
+
+
+if __name__ == '__main__':
+    unittest.main()
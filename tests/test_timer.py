@@ -0,0 +1,77 @@
+import unittest
+# append parent directory to import path
+import env
+# now we can import the lib module
+from insteon_mngr.timer import TimerWheel
+
+
+class MyTest(unittest.TestCase):
+    def setUp(self):
+        self.fired = []
+        self.wheel = TimerWheel(resolution=0.01, slot_count=16)
+        self.now = self.wheel._tick * 0.01
+
+    def schedule(self, delay, name):
+        return self.wheel.schedule(self.now + delay,
+                                   lambda: self.fired.append(name))
+
+    def test_fires_in_order(self):
+        self.schedule(0.05, 'second')
+        self.schedule(0.02, 'first')
+        self.assertEqual(self.wheel.advance(self.now + 0.01), 0)
+        self.assertEqual(self.wheel.advance(self.now + 0.06), 2)
+        self.assertEqual(self.fired, ['first', 'second'])
+        self.assertEqual(len(self.wheel), 0)
+
+    def test_partial_tick(self):
+        self.schedule(0.018, 'timer')
+        self.wheel.advance(self.now + 0.012)
+        self.assertEqual(self.fired, [])
+        self.wheel.advance(self.now + 0.019)
+        self.assertEqual(self.fired, ['timer'])
+
+    def test_cancel(self):
+        timer = self.schedule(0.02, 'cancelled')
+        self.wheel.cancel(timer)
+        self.assertFalse(timer.active)
+        self.wheel.advance(self.now + 1)
+        self.assertEqual(self.fired, [])
+        # Cancelling a fired or cancelled timer does nothing
+        self.wheel.cancel(timer)
+        self.assertEqual(len(self.wheel), 0)
+
+    def test_later_revolution(self):
+        # 16 slots of 10ms is a revolution of 0.16 seconds
+        self.schedule(0.25, 'later')
+        self.wheel.advance(self.now + 0.12)
+        self.wheel.advance(self.now + 0.20)
+        self.assertEqual(self.fired, [])
+        self.wheel.advance(self.now + 0.25)
+        self.assertEqual(self.fired, ['later'])
+
+    def test_long_gap(self):
+        self.schedule(0.03, 'first')
+        self.schedule(0.09, 'second')
+        self.wheel.advance(self.now + 10)
+        self.assertEqual(self.fired, ['first', 'second'])
+
+    def test_next_deadline(self):
+        self.assertIsNone(self.wheel.next_deadline())
+        self.schedule(0.5, 'far')
+        self.assertAlmostEqual(self.wheel.next_deadline(), self.now + 0.16,
+                               places=3)
+        self.schedule(0.043, 'near')
+        self.assertAlmostEqual(self.wheel.next_deadline(), self.now + 0.043,
+                               places=3)
+
+    def test_callback_can_schedule(self):
+        self.wheel.schedule(self.now + 0.01,
+                            lambda: self.schedule(0.02, 'rescheduled'))
+        self.wheel.advance(self.now + 0.015)
+        self.assertEqual(len(self.wheel), 1)
+        self.wheel.advance(self.now + 0.025)
+        self.assertEqual(self.fired, ['rescheduled'])
+
+
+if __name__ == '__main__':
+    unittest.main()
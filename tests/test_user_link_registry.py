@@ -0,0 +1,80 @@
+import unittest
+# append parent directory to import path
+import env
+# now we can import the lib module
+from insteon_mngr.user_link_registry import UserLinkRegistry
+
+
+class FakeDevice(object):
+    def __init__(self, dev_addr_str):
+        self.dev_addr_str = dev_addr_str
+
+
+class FakeUserLink(object):
+    def __init__(self, uid, controller_id, group_number, controller_key,
+                 responder_device, responder_key):
+        self.uid = uid
+        self.controller_id = controller_id
+        self.controller_group_number = group_number
+        self.controller_key = controller_key
+        self.responder_device = responder_device
+        self.responder_key = responder_key
+
+
+class MyTest(unittest.TestCase):
+    def setUp(self):
+        self.registry = UserLinkRegistry()
+        self.responder = FakeDevice('112233')
+        self.first = FakeUserLink(1, 'AABBCC', 1, '0FFF',
+                                  self.responder, '0FF7')
+        self.second = FakeUserLink(2, 'AABBCC', 2, None,
+                                   self.responder, None)
+        self.registry.add(self.first)
+        self.registry.add(self.second)
+
+    def test_lookups(self):
+        self.assertIs(self.registry.find(1), self.first)
+        self.assertIsNone(self.registry.find(3))
+        self.assertEqual(self.registry.get_by_controller_device('aabbcc'),
+                         {1: self.first, 2: self.second})
+        self.assertEqual(self.registry.get_by_controller_group('AABBCC', 2),
+                         {2: self.second})
+        self.assertIs(self.registry.get_by_controller_key('AABBCC', 1, '0FFF'),
+                      self.first)
+        self.assertIsNone(
+            self.registry.get_by_controller_key('AABBCC', 2, '0FFF'))
+        self.assertIs(self.registry.get_by_responder_key('112233', '0FF7'),
+                      self.first)
+
+    def test_update(self):
+        self.first.responder_key = '0FEF'
+        self.registry.update(self.first)
+        self.assertIsNone(
+            self.registry.get_by_responder_key('112233', '0FF7'))
+        self.assertIs(self.registry.get_by_responder_key('112233', '0FEF'),
+                      self.first)
+
+    def test_remove(self):
+        self.registry.remove(self.first)
+        self.assertEqual(len(self.registry), 1)
+        self.assertEqual(self.registry.get_by_controller_device('AABBCC'),
+                         {2: self.second})
+        self.assertIsNone(
+            self.registry.get_by_controller_key('AABBCC', 1, '0FFF'))
+
+    def test_moved_to_another_responder(self):
+        # The copy is added with the same uid before the original is
+        # deleted, see UserLink.edit()
+        moved = FakeUserLink(1, 'AABBCC', 1, '0FFF',
+                             FakeDevice('445566'), None)
+        self.registry.add(moved)
+        self.registry.remove(self.first)
+        self.assertIs(self.registry.find(1), moved)
+        self.assertIsNone(
+            self.registry.get_by_responder_key('112233', '0FF7'))
+        self.assertIs(self.registry.get_by_controller_key('AABBCC', 1, '0FFF'),
+                      moved)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import unittest
+# append parent directory to import path
+import env
+# now we can import the lib module
+from insteon_mngr.insteon_device import Device_ALDB
+from insteon_mngr.sequences import WriteALDBRecordi2
+from insteon_mngr.sequences.write_planner import ALDBWritePlanner
+
+
+class FakeDevice(object):
+    core = None
+
+    def __init__(self, address):
+        self.dev_addr_hi, self.dev_addr_mid, self.dev_addr_low = address
+        self.aldb = Device_ALDB(self)
+
+    def journal(self, entry):
+        pass
+
+    def mark_dirty(self):
+        pass
+
+
+class FakeGroup(object):
+    def __init__(self, device, group_number):
+        self.device = device
+        self.group_number = group_number
+
+
+class MyTest(unittest.TestCase):
+    def setUp(self):
+        self.device = FakeDevice((0x11, 0x22, 0x33))
+        self.device.aldb.load_aldb_records({
+            '0FFF': 'E201AABBCC000001',
+            '0FF7': '2201AABBCC000001',
+            '0FEF': 'A201AABBCCFF1F01',
+            '0FE7': '0000000000000000'})
+        self.group = FakeGroup(self.device, 1)
+        self.other = FakeGroup(FakeDevice((0xAA, 0xBB, 0xCC)), 1)
+        self.planner = ALDBWritePlanner(self.device.aldb)
+
+    def write(self, key=None, data1=0x00, controller=True):
+        ret = WriteALDBRecordi2(group=self.group)
+        if key is not None:
+            ret.key = key
+        ret.controller = controller
+        ret.linked_group = self.other
+        ret.data1 = data1
+        ret.data3 = 0x01
+        return ret
+
+    def delete(self, key):
+        ret = WriteALDBRecordi2(group=self.group)
+        ret.key = key
+        ret.in_use = False
+        return ret
+
+    def test_identical_skipped(self):
+        same = self.write('0FFF')
+        changed = self.write('0FFF', data1=0x03)
+        deleted = self.delete('0FF7')
+        needed, finished = self.planner.plan([same, changed, deleted])
+        self.assertEqual(needed, [changed])
+        self.assertEqual(finished, [same, deleted])
+
+    def test_adopts_existing_record(self):
+        new = self.write()
+        needed, finished = self.planner.plan([new])
+        self.assertEqual(needed, [])
+        self.assertEqual(finished, [new])
+        self.assertEqual(new.key, '0FFF')
+
+    def test_fills_empty_records(self):
+        first = self.write(data1=0x01)
+        second = self.write(data1=0x02)
+        third = self.write(data1=0x03)
+        needed, finished = self.planner.plan([first, second, third])
+        self.assertEqual(finished, [])
+        self.assertEqual([sequence.key for sequence in needed],
+                         ['0FF7', '0FE7', '0FDF'])
+
+    def test_writes_over_deletes(self):
+        deleted = self.delete('0FEF')
+        new = self.write(data1=0x05)
+        deletions = []
+        deleted.add_success_callback(lambda: deletions.append(True))
+        needed, finished = self.planner.plan([deleted, new])
+        self.assertEqual(needed, [new])
+        self.assertEqual(new.key, '0FEF')
+        new._on_success()
+        self.assertEqual(deletions, [True])
+
+    def test_grouped_by_msb(self):
+        low = self.write('0EFF', data1=0x01)
+        high = self.write('0FFF', data1=0x02)
+        lower = self.write('0EF7', data1=0x03)
+        needed, finished = self.planner.plan([low, high, lower], msb=0x0E)
+        self.assertEqual(needed, [low, lower, high])
+        needed, finished = self.planner.plan([low, high, lower])
+        self.assertEqual(needed, [high, low, lower])
+
+
+if __name__ == '__main__':
+    unittest.main()